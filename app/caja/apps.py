@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class CajaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'caja'
+
+    def ready(self):
+        # Acumulados del turno de caja
+        import caja.signals  # noqa: F401
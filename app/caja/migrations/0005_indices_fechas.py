@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0004_gasto_sesion_caja_hostal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gasto',
+            name='fecha',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
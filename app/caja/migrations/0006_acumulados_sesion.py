@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0005_indices_fechas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='num_facturas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='total_gastos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='ventas_efectivo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='ventas_tarjeta',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='sesioncaja',
+            name='ventas_transferencia',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
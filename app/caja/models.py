@@ -11,11 +11,79 @@ class SesionCaja(models.Model):
     diferencia = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     estado = models.BooleanField(default=True, verbose_name="¿Caja Abierta?") # True = Abierta, False = Cerrada
 
+    # Acumulados del turno: los mantienen caja/signals.py al crear / borrar facturas y gastos
+    ventas_efectivo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ventas_tarjeta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ventas_transferencia = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    num_facturas = models.PositiveIntegerField(default=0)
+    total_gastos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    CAMPOS_ACUMULADOS = ('ventas_efectivo', 'ventas_tarjeta', 'ventas_transferencia', 'num_facturas', 'total_gastos')
+
+    # Factura.metodo_pago_sri -> campo acumulado (otras formas de pago cuentan como efectivo)
+    CAMPO_POR_FORMA_PAGO = {
+        '01': 'ventas_efectivo',
+        '16': 'ventas_tarjeta',
+        '19': 'ventas_tarjeta',
+        '20': 'ventas_transferencia',
+    }
+
+    @property
+    def ventas_total(self):
+        return self.ventas_efectivo + self.ventas_tarjeta + self.ventas_transferencia
+
+    @property
+    def saldo_esperado(self):
+        # Base de la diferencia al cerrar: inicial + ventas del sistema - gastos
+        return self.monto_inicial + self.ventas_total - self.total_gastos
+
+    @property
+    def efectivo_esperado(self):
+        # Solo informativo: inicial + cobros en efectivo - gastos
+        return self.monto_inicial + self.ventas_efectivo - self.total_gastos
+
+    @classmethod
+    def campo_por_forma_pago(cls, metodo_pago_sri):
+        return cls.CAMPO_POR_FORMA_PAGO.get(metodo_pago_sri, 'ventas_efectivo')
+
+    @classmethod
+    def abierta(cls, bloquear=False):
+        """
+        Turno abierto. Con bloquear=True (dentro de una transacción) se toma la
+        fila como el cierre: si la caja se está cerrando se espera, y al
+        liberarse ya no cuenta como abierta.
+        """
+        consulta = cls.objects.select_for_update() if bloquear else cls.objects
+        return consulta.filter(estado=True).first()
+
+    @property
+    def titular_numeracion(self):
+        """Dueño de los bloques de secuenciales que apartó este turno (core/contadores.py)."""
+        return f'caja:{self.pk}'
+
+    def liberar_numeracion(self):
+        """Al cerrar, unificar o eliminar el turno: sus secuenciales sin usar no deben quedar como huecos."""
+        from core.contadores import liberar_bloques
+        return liberar_bloques(self.titular_numeracion)
+
+    def recalcular_totales(self):
+        """Recalcula los acumulados desde las facturas y gastos vinculados (para corregir desajustes)."""
+        from django.db.models import Count, Sum
+        valores = dict.fromkeys(set(self.CAMPO_POR_FORMA_PAGO.values()), 0)
+        valores['num_facturas'] = 0
+        for fila in self.facturas.values('metodo_pago_sri').annotate(importe=Sum('total'), cantidad=Count('id')):
+            valores[self.campo_por_forma_pago(fila['metodo_pago_sri'])] += fila['importe'] or 0
+            valores['num_facturas'] += fila['cantidad']
+        valores['total_gastos'] = self.gastos.aggregate(total=Sum('monto'))['total'] or 0
+        SesionCaja.objects.filter(pk=self.pk).update(**valores)
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+
 class Gasto(models.Model):
     MODULO_CHOICES = [('restaurante', 'Restaurante'), ('hostal', 'Hostal')]
     descripcion = models.CharField(max_length=255, verbose_name="Descripción del Gasto")
     monto = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Monto Gastado")
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name="Registrado por")
     modulo = models.CharField(max_length=20, choices=MODULO_CHOICES, default='restaurante')
     sesion_caja = models.ForeignKey(SesionCaja, on_delete=models.CASCADE, null=True, blank=True, related_name='gastos')
@@ -0,0 +1,45 @@
+# 📁 caja/signals.py
+# Mantiene los acumulados del turno (SesionCaja) con deltas: la pantalla de caja
+# y el cierre leen una fila en vez de sumar facturas y gastos.
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from pedidos.models import Factura
+from .models import Gasto, SesionCaja
+
+
+def _sumar(sesion_id, **deltas):
+    if sesion_id:
+        SesionCaja.objects.filter(pk=sesion_id).update(
+            **{campo: F(campo) + valor for campo, valor in deltas.items()}
+        )
+
+
+def _aplicar_factura(factura, signo):
+    campo = SesionCaja.campo_por_forma_pago(factura.metodo_pago_sri)
+    _sumar(factura.sesion_caja_id, **{campo: signo * Decimal(str(factura.total)), 'num_facturas': signo})
+
+
+@receiver(post_save, sender=Factura)
+def factura_creada(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _aplicar_factura(instance, 1)
+
+
+@receiver(post_delete, sender=Factura)
+def factura_eliminada(sender, instance, **kwargs):
+    _aplicar_factura(instance, -1)
+
+
+@receiver(post_save, sender=Gasto)
+def gasto_creado(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _sumar(instance.sesion_caja_id, total_gastos=Decimal(str(instance.monto)))
+
+
+@receiver(post_delete, sender=Gasto)
+def gasto_eliminado(sender, instance, **kwargs):
+    _sumar(instance.sesion_caja_id, total_gastos=-Decimal(str(instance.monto)))
@@ -0,0 +1,164 @@
+import threading
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import BloqueNumeracion
+from pedidos.models import DetallePedido, Factura, Pedido, Producto
+from usuarios.models import Usuario
+from .models import Gasto, SesionCaja
+
+
+class AcumuladosCajaTest(TestCase):
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create_user(username='gerente_caja', email='gerente_caja@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.caja = SesionCaja.objects.create(usuario=self.gerente, monto_inicial='20.00')
+        self.cafe = Producto.objects.create(nombre="Café", precio='2.50', stock=50)
+
+    def _cobrar(self, cantidad, metodo_sri='01', **extra):
+        pedido = Pedido.objects.create(estado='entregado')
+        DetallePedido.objects.create(pedido=pedido, producto=self.cafe, cantidad=cantidad)
+        return Factura.objects.create(
+            pedido=pedido, subtotal=pedido.total, total=pedido.total, metodo_pago_sri=metodo_sri,
+            razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999', **extra)
+
+    def test_facturas_y_gastos_se_acumulan_en_el_turno(self):
+        self._cobrar(4)
+        tarjeta = self._cobrar(2, metodo_sri='19')
+        # Las facturas del hostal no cuentan en la caja del restaurante
+        Factura.objects.create(origen='hostal', subtotal=50, total=50, razon_social='X', ruc_ci='9999999999999')
+        Gasto.objects.create(descripcion='Hielo', monto='3.00', usuario=self.gerente, sesion_caja=self.caja)
+
+        self.caja.refresh_from_db()
+        self.assertEqual(tarjeta.sesion_caja, self.caja)
+        self.assertEqual((self.caja.ventas_efectivo, self.caja.ventas_tarjeta), (Decimal('10.00'), Decimal('5.00')))
+        self.assertEqual((self.caja.num_facturas, self.caja.total_gastos), (2, Decimal('3.00')))
+
+        tarjeta.pedido.delete()
+        self.caja.refresh_from_db()
+        self.assertEqual((self.caja.ventas_tarjeta, self.caja.num_facturas), (Decimal('0.00'), 1))
+
+        antes = (self.caja.ventas_efectivo, self.caja.total_gastos)
+        self.caja.recalcular_totales()
+        self.assertEqual((self.caja.ventas_efectivo, self.caja.total_gastos), antes)
+
+    def test_pantalla_y_cierre_sin_recorrer_facturas(self):
+        for _ in range(3):
+            self._cobrar(2)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('caja:gestion_caja'))
+        self.assertEqual(respuesta.context['ventas_actuales'], Decimal('15.00'))
+        self.assertFalse([q for q in consultas if 'pedidos_factura' in q['sql'] or 'caja_gasto' in q['sql']])
+
+        self.client.post(reverse('caja:gestion_caja'), {'action': 'cerrar', 'monto_fisico': '34.00'})
+        self.caja.refresh_from_db()
+        self.assertFalse(self.caja.estado)
+        self.assertEqual(self.caja.monto_final_sistema, Decimal('15.00'))
+        self.assertEqual(self.caja.diferencia, Decimal('-1.00'))
+
+    def test_unificar_suma_acumulados(self):
+        self._cobrar(2)
+        SesionCaja.objects.filter(pk=self.caja.pk).update(estado=False)
+        segunda = SesionCaja.objects.create(usuario=self.gerente, monto_inicial='5.00')
+        factura = self._cobrar(4)
+
+        self.client.post(reverse('caja:unificar_cajas'))
+        self.caja.refresh_from_db()
+        self.assertFalse(SesionCaja.objects.filter(pk=segunda.pk).exists())
+        self.assertEqual((self.caja.ventas_efectivo, self.caja.num_facturas), (Decimal('15.00'), 2))
+        factura.refresh_from_db()
+        self.assertEqual(factura.sesion_caja, self.caja)
+
+    def test_reservar_secuenciales_solo_gerente_o_cajero(self):
+        """Cada número reservado es un secuencial SRI consumido: solo el cajero del turno o un gerente piden bloques"""
+        for rol in ('cocina', 'mesero'):
+            self.client.force_login(Usuario.objects.create_user(
+                username=f'{rol}_numeracion', email=f'{rol}_numeracion@test.com', password='x', rol=rol))
+            respuesta = self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 500})
+            self.assertEqual(respuesta.status_code, 403)
+        self.assertFalse(BloqueNumeracion.objects.exists())
+
+        SesionCaja.objects.filter(pk=self.caja.pk).update(usuario=Usuario.objects.get(username='mesero_numeracion'))
+        respuesta = self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 2})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(BloqueNumeracion.objects.exists())
+
+    def test_reservar_secuenciales_para_la_caja(self):
+        respuesta = self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 2})
+        self.assertEqual(respuesta.json(), {'establecimiento': '001', 'punto_emision': '001',
+                                            'desde': '000000001', 'hasta': '000000002'})
+        # Las facturas del turno salen del bloque y luego siguen con el contador
+        numeros = [self._cobrar(1, tipo_comprobante='factura').secuencial for _ in range(3)]
+        self.assertEqual(numeros, ['000000001', '000000002', '000000003'])
+        self.assertEqual(self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 5000}).status_code, 400)
+
+    def test_al_cerrar_la_caja_sus_secuenciales_sin_usar_no_quedan_como_huecos(self):
+        self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 5})
+        self.assertEqual(self._cobrar(1, tipo_comprobante='factura').secuencial, '000000001')
+        self.client.post(reverse('caja:gestion_caja'), {'action': 'cerrar', 'monto_fisico': '22.50'})
+        # Nadie numeró después del bloque: el resto vuelve al contador
+        hostal = {'origen': 'hostal', 'subtotal': 1, 'total': 1, 'razon_social': 'X', 'ruc_ci': '9999999999999'}
+        self.assertEqual(Factura.objects.create(**hostal).secuencial, '000000002')
+
+        segunda = SesionCaja.objects.create(usuario=self.gerente, monto_inicial='0')
+        self.client.post(reverse('caja:reservar_secuenciales'), {'cantidad': 3})  # 3, 4 y 5
+        self.assertEqual(Factura.objects.create(**hostal).secuencial, '000000006')
+        self.client.post(reverse('caja:gestion_caja'), {'action': 'cerrar', 'monto_fisico': '0'})
+        # El contador ya avanzó: el bloque queda libre y se entrega antes de seguir
+        numeros = [Factura.objects.create(**hostal).secuencial for _ in range(4)]
+        self.assertEqual(numeros, ['000000003', '000000004', '000000005', '000000007'])
+        segunda.refresh_from_db()
+        self.assertFalse(segunda.estado)
+
+    def test_diferencia_contra_todas_las_ventas(self):
+        """La diferencia sigue siendo inicial + ventas del sistema - gastos; el desglose por método es aparte"""
+        self._cobrar(4)                  # 10.00 en efectivo
+        self._cobrar(2, metodo_sri='19')  # 5.00 con tarjeta
+        Gasto.objects.create(descripcion='Hielo', monto='3.00', usuario=self.gerente, sesion_caja=self.caja)
+        respuesta = self.client.get(reverse('caja:gestion_caja'))
+        self.assertEqual(respuesta.context['saldo_actual'], Decimal('32.00'))
+        self.assertEqual(respuesta.context['caja_abierta'].efectivo_esperado, Decimal('27.00'))
+
+        self.client.post(reverse('caja:gestion_caja'), {'action': 'cerrar', 'monto_fisico': '31.00'})
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.diferencia, Decimal('-1.00'))
+
+        self.client.post(reverse('caja:editar_caja_modal', args=[self.caja.id]), {
+            'monto_inicial': '20.00', 'monto_final_sistema': '15.00', 'monto_final_fisico': '33.00'})
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.diferencia, Decimal('1.00'))
+
+
+class CierreConcurrenteTest(TransactionTestCase):
+
+    def test_factura_durante_el_cierre_no_se_suma_a_la_caja_cerrada(self):
+        gerente = Usuario.objects.create_user(username='gerente_cierre', email='gerente_cierre@test.com', password='x', rol='gerente')
+        caja = SesionCaja.objects.create(usuario=gerente, monto_inicial='0')
+        creadas = []
+
+        def cobrar():
+            try:
+                creadas.append(Factura.objects.create(razon_social='X', ruc_ci='9999999999999', subtotal=5, total=5,
+                                                      tipo_comprobante='nota_entrega'))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            # Mismo bloqueo que el cierre en gestion_caja
+            cerrando = SesionCaja.objects.select_for_update().get(pk=caja.pk)
+            hilo = threading.Thread(target=cobrar)
+            hilo.start()
+            hilo.join(0.5)
+            self.assertTrue(hilo.is_alive())  # la factura espera a que termine el cierre
+            cerrando.estado = False
+            cerrando.save()
+        hilo.join(5)
+
+        caja.refresh_from_db()
+        self.assertIsNone(creadas[0].sesion_caja)
+        self.assertEqual(caja.num_facturas, 0)
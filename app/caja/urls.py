@@ -11,6 +11,7 @@ urlpatterns = [
     path('detalle/<int:session_id>/', views.detalle_caja_modal, name='detalle_caja_modal'),
     path('editar/<int:session_id>/', views.editar_caja_modal, name='editar_caja_modal'),
     path('eliminar/<int:session_id>/', views.eliminar_caja, name='eliminar_caja'),
+    path('secuenciales/reservar/', views.reservar_secuenciales, name='reservar_secuenciales'),
     path('unificar/', views.unificar_cajas, name='unificar_cajas'),
 ]
 
@@ -1,6 +1,13 @@
+from decimal import Decimal
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db import transaction
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from core.decorators import gerente_required
+from core.periodos import periodo_dia
 from django.utils import timezone
 from .models import SesionCaja, Gasto
 
@@ -86,14 +93,13 @@ def gestion_gastos_restaurante(request):
 def gestion_gastos_hostal(request):
     return _gestion_gastos_logica(request, 'hostal')
 
-from pedidos.models import Factura, Pedido
-from django.db.models import Sum
+from pedidos.models import Pedido
 from django.contrib import messages
 
 @login_required
 def gestion_caja(request):
     # Buscar si hay alguna caja abierta (compartida entre todos)
-    caja_abierta = SesionCaja.objects.filter(estado=True).first()
+    caja_abierta = SesionCaja.objects.filter(estado=True).select_related('usuario').first()
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -113,57 +119,44 @@ def gestion_caja(request):
             
         elif action == 'cerrar':
             if caja_abierta:
-                dinero_fisico = float(request.POST.get('monto_fisico'))
-                
-                # Calcular ventas del sistema DESDE que abrió la caja (Todas las ventas)
-                ventas_sistema = Factura.objects.filter(
-                    fecha_emision__gte=caja_abierta.fecha_apertura
-                ).aggregate(Sum('total'))['total__sum'] or 0
-                
-                # Calcular gastos de esta sesión
-                gastos_caja = caja_abierta.gastos.aggregate(Sum('monto'))['monto__sum'] or 0
+                dinero_fisico = Decimal(request.POST.get('monto_fisico'))
                 
-                caja_abierta.monto_final_sistema = ventas_sistema
-                caja_abierta.monto_final_fisico = dinero_fisico
-                # Diferencia = Efectivo Real - (Efectivo Esperado: Inicial + Ventas - Gastos)
-                efectivo_esperado = float(caja_abierta.monto_inicial) + float(ventas_sistema) - float(gastos_caja)
-                caja_abierta.diferencia = float(dinero_fisico) - efectivo_esperado
-                caja_abierta.fecha_cierre = timezone.now()
-                caja_abierta.estado = False
-                caja_abierta.save()
+                with transaction.atomic():
+                    # Bloqueamos el turno: ninguna factura / gasto se suma a mitad del cierre
+                    caja_abierta = SesionCaja.objects.select_for_update().get(pk=caja_abierta.pk)
+                    # Ventas del sistema DESDE que abrió la caja: acumulados del turno
+                    caja_abierta.monto_final_sistema = caja_abierta.ventas_total
+                    caja_abierta.monto_final_fisico = dinero_fisico
+                    # Diferencia = Efectivo Real - (Efectivo Esperado: Inicial + Ventas - Gastos)
+                    caja_abierta.diferencia = dinero_fisico - caja_abierta.saldo_esperado
+                    caja_abierta.fecha_cierre = timezone.now()
+                    caja_abierta.estado = False
+                    caja_abierta.save()
+                    caja_abierta.liberar_numeracion()
                 
                 messages.success(request, f"Caja cerrada. Diferencia: ${caja_abierta.diferencia}")
                 return redirect('caja:gestion_caja')
 
-    # Historial de cajas
+    # Historial de cajas (los gastos del turno ya vienen acumulados en total_gastos)
     historial = []
     if request.user.rol in ['gerente', 'admin']:
         # Gerente ve TODAS las cajas (para auditar cierres de meseros)
-        historial = SesionCaja.objects.annotate(
-            total_gastos=Sum('gastos__monto')
-        ).all().order_by('-fecha_apertura')[:20]
+        historial = SesionCaja.objects.select_related('usuario').order_by('-fecha_apertura')[:20]
     elif request.user.rol == 'mesero':
         # Mesero no ve historial (según requerimiento anterior)
         historial = []
     else:
         # Default (otros roles si los hubiera): ven lo suyo
-        historial = SesionCaja.objects.filter(usuario=request.user).annotate(
-            total_gastos=Sum('gastos__monto')
-        ).order_by('-fecha_apertura')[:10]
+        historial = SesionCaja.objects.filter(usuario=request.user).select_related('usuario').order_by('-fecha_apertura')[:10]
     
-    # Calcular ventas y gastos actuales si la caja está abierta
+    # Ventas y gastos actuales si la caja está abierta (acumulados, sin recorrer facturas)
     ventas_actuales = 0
     gastos_actuales = 0
     saldo_actual = 0
     if caja_abierta:
-        # Gastos vinculados a esta sesión
-        gastos_actuales = caja_abierta.gastos.aggregate(Sum('monto'))['monto__sum'] or 0
-
-        # Ventas acumuladas globales del sistema
-        ventas_actuales = Factura.objects.filter(
-            fecha_emision__gte=caja_abierta.fecha_apertura
-        ).aggregate(Sum('total'))['total__sum'] or 0
-        saldo_actual = float(caja_abierta.monto_inicial) + float(ventas_actuales) - float(gastos_actuales)
+        gastos_actuales = caja_abierta.total_gastos
+        ventas_actuales = caja_abierta.ventas_total
+        saldo_actual = caja_abierta.saldo_esperado
 
     return render(request, 'caja/gestion_caja.html', {
         'caja_abierta': caja_abierta,
@@ -175,19 +168,14 @@ def gestion_caja(request):
 
 @login_required
 def detalle_caja_modal(request, session_id):
-    from pedidos.models import Factura
     sesion = get_object_or_404(SesionCaja, id=session_id)
     
-    # Rango de tiempo de la sesión
-    fecha_fin = sesion.fecha_cierre or timezone.now()
-    ventas = Factura.objects.filter(
-        fecha_emision__gte=sesion.fecha_apertura,
-        fecha_emision__lte=fecha_fin
-    ).select_related('pedido__mesero', 'cliente').order_by('-fecha_emision')
+    # Facturas cobradas en este turno
+    ventas = sesion.facturas.select_related('pedido__mesero', 'cliente').order_by('-fecha_emision')
     
     # Gastos vinculados
     gastos = sesion.gastos.all().select_related('usuario').order_by('-fecha')
-    total_gastos = gastos.aggregate(Sum('monto'))['monto__sum'] or 0
+    total_gastos = sesion.total_gastos
     
     return render(request, 'caja/modals/detalle_caja.html', {
         'sesion': sesion,
@@ -200,6 +188,7 @@ def detalle_caja_modal(request, session_id):
 @gerente_required
 def eliminar_caja(request, session_id):
     caja = get_object_or_404(SesionCaja, id=session_id)
+    caja.liberar_numeracion()
     caja.delete()
     messages.success(request, "Registro de caja eliminado.")
     return redirect('caja:gestion_caja')
@@ -209,18 +198,19 @@ def eliminar_caja(request, session_id):
 def editar_caja_modal(request, session_id):
     sesion = get_object_or_404(SesionCaja, id=session_id)
     if request.method == 'POST':
-        sesion.monto_inicial = request.POST.get('monto_inicial')
-        sesion.monto_final_sistema = request.POST.get('monto_final_sistema') or None
-        sesion.monto_final_fisico = request.POST.get('monto_final_fisico') or None
+        sistema = request.POST.get('monto_final_sistema')
+        fisico = request.POST.get('monto_final_fisico')
+        sesion.monto_inicial = Decimal(request.POST.get('monto_inicial'))
+        sesion.monto_final_sistema = Decimal(sistema) if sistema else None
+        sesion.monto_final_fisico = Decimal(fisico) if fisico else None
         
-        # Recalcular Diferencia if possible
+        # Recalcular Diferencia if possible (inicial + ventas del sistema - gastos)
         if sesion.monto_final_fisico and sesion.monto_final_sistema:
-            from django.db.models import Sum
-            gastos = sesion.gastos.aggregate(Sum('monto'))['monto__sum'] or 0
-            esperado = float(sesion.monto_inicial) + float(sesion.monto_final_sistema) - float(gastos)
-            sesion.diferencia = float(sesion.monto_final_fisico) - esperado
+            esperado = sesion.monto_inicial + sesion.monto_final_sistema - sesion.total_gastos
+            sesion.diferencia = sesion.monto_final_fisico - esperado
             
-        sesion.save()
+        # Solo los campos del formulario: los acumulados se mantienen con F() en paralelo
+        sesion.save(update_fields=['monto_inicial', 'monto_final_sistema', 'monto_final_fisico', 'diferencia'])
         messages.success(request, "Caja actualizada.")
         return redirect('caja:gestion_caja')
 
@@ -236,8 +226,13 @@ def unificar_cajas(request):
         fechas = SesionCaja.objects.annotate(dia=TruncDate('fecha_apertura')).values('dia').distinct()
         
         for f in fechas:
-            cajas_dia = SesionCaja.objects.filter(fecha_apertura__date=f['dia']).order_by('fecha_apertura')
-            if cajas_dia.count() > 1:
+            with transaction.atomic():
+                # Bloqueo: una factura cobrada en este momento no puede perderse al sumar acumulados
+                cajas_dia = list(SesionCaja.objects.select_for_update().filter(
+                    periodo_dia(f['dia']).filtro('fecha_apertura')
+                ).order_by('fecha_apertura'))
+                if len(cajas_dia) < 2:
+                    continue
                 principal = cajas_dia[0]
                 otras = cajas_dia[1:]
                 
@@ -245,17 +240,57 @@ def unificar_cajas(request):
                     principal.monto_inicial += c.monto_inicial
                     principal.monto_final_sistema = (principal.monto_final_sistema or 0) + (c.monto_final_sistema or 0)
                     principal.monto_final_fisico = (principal.monto_final_fisico or 0) + (c.monto_final_fisico or 0)
-                    # Re-vincular gastos
+                    # Sumar los acumulados del turno
+                    for campo in SesionCaja.CAMPOS_ACUMULADOS:
+                        setattr(principal, campo, getattr(principal, campo) + getattr(c, campo))
+                    # Re-vincular gastos y facturas (update() no dispara señales: los acumulados ya se sumaron)
                     c.gastos.update(sesion_caja=principal)
+                    c.facturas.update(sesion_caja=principal)
+                    c.liberar_numeracion()
                     c.delete()
                 
                 # Recalcular diferencia de la principal
-                gastos_tot = principal.gastos.aggregate(Sum('monto'))['monto__sum'] or 0
                 if principal.monto_final_fisico is not None:
-                    esperado = float(principal.monto_inicial) + float(principal.monto_final_sistema or 0) - float(gastos_tot)
-                    principal.diferencia = float(principal.monto_final_fisico) - esperado
+                    esperado = principal.monto_inicial + (principal.monto_final_sistema or 0) - principal.total_gastos
+                    principal.diferencia = principal.monto_final_fisico - esperado
                 
                 principal.save()
         
         messages.success(request, "Se han unificado todas las cajas por día correctamente.")
     return redirect('caja:gestion_caja')
+
+
+MAX_SECUENCIALES_RESERVADOS = 500
+
+@login_required
+@require_POST
+def reservar_secuenciales(request):
+    """
+    Aparta un bloque de secuenciales SRI para la caja abierta (ráfagas sin
+    conexión): las facturas de este turno consumen primero de ese bloque.
+    Solo el cajero que abrió el turno o un gerente pueden reservar.
+    """
+    from core.contadores import clave_factura, reservar_bloque
+    caja_abierta = SesionCaja.abierta()
+    if not caja_abierta:
+        return JsonResponse({'error': 'No hay una caja abierta'}, status=400)
+    if caja_abierta.usuario_id != request.user.id and request.user.rol not in ['gerente', 'admin']:
+        raise PermissionDenied
+    try:
+        cantidad = int(request.POST.get('cantidad', 50))
+    except ValueError:
+        return JsonResponse({'error': 'Cantidad inválida'}, status=400)
+    if not 1 <= cantidad <= MAX_SECUENCIALES_RESERVADOS:
+        return JsonResponse({'error': f'La cantidad debe estar entre 1 y {MAX_SECUENCIALES_RESERVADOS}'}, status=400)
+
+    establecimiento = request.POST.get('establecimiento', '001')
+    punto_emision = request.POST.get('punto_emision', '001')
+    if not all(len(c) == 3 and c.isdigit() for c in (establecimiento, punto_emision)):
+        return JsonResponse({'error': 'Establecimiento y punto de emisión son de 3 dígitos'}, status=400)
+    bloque = reservar_bloque(clave_factura(establecimiento, punto_emision), cantidad, caja_abierta.titular_numeracion)
+    return JsonResponse({
+        'establecimiento': establecimiento,
+        'punto_emision': punto_emision,
+        'desde': f'{bloque.desde:09d}',
+        'hasta': f'{bloque.hasta:09d}',
+    })
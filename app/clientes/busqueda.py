@@ -0,0 +1,59 @@
+# 📁 clientes/busqueda.py
+# Búsqueda de clientes del POS (se dispara en cada tecla del modal de cobro).
+# - RUC/CI: búsqueda por prefijo, usa el índice `_like` (varchar_pattern_ops)
+#   que Django crea en Postgres para el campo único.
+# - Nombres: `icontains` genera UPPER(nombres::text) LIKE ..., que en Postgres
+#   con pg_trgm usa el índice GIN trigram de la migración 0003; sin la extensión
+#   (o en otra base) es la misma consulta sin índice.
+# Los resultados se ordenan: RUC exacto, RUC por prefijo, nombre que empieza
+# con el texto y luego por parecido (similitud trigram si está disponible).
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Cliente
+
+LIMITE_RESULTADOS = 5
+
+
+@lru_cache(maxsize=None)
+def trigram_disponible():
+    """True si la base tiene pg_trgm instalado (se consulta una vez por proceso)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def filtro_busqueda(texto):
+    """Q de la búsqueda; un texto solo de dígitos busca únicamente por RUC/CI."""
+    texto = texto.strip()
+    por_identificacion = Q(cedula_o_ruc__startswith=texto)
+    if texto.isdigit():
+        return por_identificacion
+    return por_identificacion | Q(nombres__icontains=texto)
+
+
+def buscar_clientes(texto, limite=LIMITE_RESULTADOS):
+    """Clientes que coinciden con `texto`, los más relevantes primero."""
+    texto = texto.strip()
+    if not texto:
+        return Cliente.objects.none()
+
+    clientes = Cliente.objects.filter(filtro_busqueda(texto)).annotate(
+        prioridad=Case(
+            When(cedula_o_ruc=texto, then=Value(0)),
+            When(cedula_o_ruc__startswith=texto, then=Value(1)),
+            When(nombres__istartswith=texto, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
+    )
+    orden = ['prioridad']
+    if trigram_disponible():
+        from django.contrib.postgres.search import TrigramSimilarity
+        clientes = clientes.annotate(similitud=TrigramSimilarity('nombres', texto))
+        orden.append('-similitud')
+    return clientes.order_by(*orden, 'nombres')[:limite]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:17
+
+from django.db import migrations
+
+
+def crear_indice_trigram(apps, schema_editor):
+    # Índice GIN trigram sobre la misma expresión que genera `nombres__icontains`.
+    # Si el servidor no trae pg_trgm (contrib) se omite: la búsqueda sigue funcionando sin índice
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS cliente_nombres_trgm_idx ON clientes_cliente '
+        'USING gin ((UPPER("nombres"::text)) gin_trgm_ops)'
+    )
+
+
+def borrar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS cliente_nombres_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_tipo_identificacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_trigram, borrar_indice_trigram),
+    ]
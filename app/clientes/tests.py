@@ -1,3 +1,34 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from usuarios.models import Usuario
+from .busqueda import buscar_clientes
+from .models import Cliente
+
+
+class BusquedaClientesTest(TestCase):
+
+    def setUp(self):
+        Cliente.objects.create(cedula_o_ruc='0912345678', nombres='Ana María Torres')
+        Cliente.objects.create(cedula_o_ruc='0912345678001', nombres='Torres Importaciones S.A.')
+        Cliente.objects.create(cedula_o_ruc='1799999999', nombres='Mariana Anaya')
+        Cliente.objects.create(cedula_o_ruc='0100000912', nombres='Pedro Gómez')
+
+    def test_identificacion_por_prefijo_y_exacta_primero(self):
+        resultados = [c.cedula_o_ruc for c in buscar_clientes('0912345678')]
+        self.assertEqual(resultados, ['0912345678', '0912345678001'])
+        self.assertEqual(list(buscar_clientes('0100')), list(Cliente.objects.filter(nombres='Pedro Gómez')))
+        # Solo prefijo: "912" aparece dentro de otros RUC pero no al inicio
+        self.assertEqual(buscar_clientes('912').count(), 0)
+
+    def test_nombre_que_empieza_con_el_texto_va_primero(self):
+        resultados = [c.nombres for c in buscar_clientes('torres')]
+        self.assertEqual(resultados, ['Torres Importaciones S.A.', 'Ana María Torres'])
+        self.assertEqual(buscar_clientes('   ').count(), 0)
+
+    def test_vista_parcial(self):
+        usuario = Usuario.objects.create_user(username='mesero_busqueda', email='mesero_busqueda@test.com', password='x', rol='mesero')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('clientes:buscar'), {'q': 'ana'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([c.nombres for c in respuesta.context['clientes']], ['Ana María Torres', 'Mariana Anaya'])
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ConfiguracionSRI
+from .models import BloqueNumeracion, ConfiguracionSRI, Contador
 
 @admin.register(ConfiguracionSRI)
 class ConfiguracionSRIAdmin(admin.ModelAdmin):
@@ -13,3 +13,24 @@ class ConfiguracionSRIAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(Contador)
+class ContadorAdmin(admin.ModelAdmin):
+    list_display = ('clave', 'valor')
+    search_fields = ('clave',)
+    # Solo lectura: los números los entrega core/contadores.py
+    readonly_fields = ('clave', 'valor')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(BloqueNumeracion)
+class BloqueNumeracionAdmin(admin.ModelAdmin):
+    list_display = ('clave', 'asignado_a', 'desde', 'hasta', 'siguiente', 'creado')
+    list_filter = ('clave',)
+    readonly_fields = ('clave', 'asignado_a', 'desde', 'hasta', 'siguiente', 'creado')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,115 @@
+# 📁 core/benchmark.py
+# Escenario de hora pico (almuerzo) contra un servidor levantado aparte.
+# Cada actor es un hilo con su propia sesión HTTP (keep-alive):
+#   - meseros: abren su mesa, agregan productos, envían a cocina y revisan notificaciones
+#   - pantallas de cocina: resincronizan con If-None-Match y terminan pedidos
+#   - agente de impresión: consulta trabajos y reporta el resultado
+#   - cajeros: cobran los pedidos enviados
+# Se mide la latencia de cada endpoint; el resumen da p50/p95/p99 y peticiones
+# por segundo, y se guarda en JSON para comparar una corrida con otra.
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por rango más cercano; None si no hay valores."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Metricas:
+    """Latencias por endpoint, compartidas entre los hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencias = defaultdict(list)
+        self._errores = defaultdict(int)
+
+    def registrar(self, endpoint, segundos, ok=True):
+        with self._lock:
+            self._latencias[endpoint].append(segundos)
+            if not ok:
+                self._errores[endpoint] += 1
+
+    def resumen(self, duracion):
+        filas = []
+        with self._lock:
+            for endpoint in sorted(self._latencias):
+                ms = [s * 1000 for s in self._latencias[endpoint]]
+                filas.append({
+                    'endpoint': endpoint,
+                    'peticiones': len(ms),
+                    'errores': self._errores[endpoint],
+                    'p50_ms': round(percentil(ms, 50), 1),
+                    'p95_ms': round(percentil(ms, 95), 1),
+                    'p99_ms': round(percentil(ms, 99), 1),
+                    'rps': round(len(ms) / duracion, 2) if duracion else 0,
+                })
+        return filas
+
+
+class Cliente:
+    """Sesión HTTP autenticada de un actor; cada llamada queda medida en `metricas`."""
+
+    def __init__(self, base_url, metricas, cookies=None, csrf=None):
+        import requests  # solo lo necesita el benchmark
+        self.base_url = base_url.rstrip('/')
+        self.metricas = metricas
+        self.http = requests.Session()
+        self.http.cookies.update(cookies or {})
+        if csrf:
+            self.http.headers['X-CSRFToken'] = csrf
+
+    def pedir(self, endpoint, metodo, ruta, esperado=(200,), **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        kwargs.setdefault('timeout', 30)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.http.request(metodo, self.base_url + ruta, **kwargs)
+        except Exception:
+            self.metricas.registrar(endpoint, time.perf_counter() - inicio, ok=False)
+            return None
+        self.metricas.registrar(endpoint, time.perf_counter() - inicio, ok=respuesta.status_code in esperado)
+        return respuesta
+
+
+def correr(actores, duracion):
+    """
+    Lanza cada actor (callable que recibe el instante de fin) en su hilo y
+    espera a que terminen. Devuelve los segundos reales que duró la prueba.
+    """
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    hilos = [threading.Thread(target=actor, args=(fin,), daemon=True) for actor in actores]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(duracion + 60)
+    return time.monotonic() - inicio
+
+
+def comparar(actual, anterior):
+    """Filas de `actual` con la variación de p95 y rps respecto de una corrida guardada."""
+    previas = {f['endpoint']: f for f in anterior}
+    for fila in actual:
+        previa = previas.get(fila['endpoint'])
+        if previa and previa['p95_ms']:
+            fila['p95_delta_pct'] = round((fila['p95_ms'] - previa['p95_ms']) / previa['p95_ms'] * 100, 1)
+        if previa and previa['rps']:
+            fila['rps_delta_pct'] = round((fila['rps'] - previa['rps']) / previa['rps'] * 100, 1)
+    return actual
+
+
+def guardar(ruta, resultado):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
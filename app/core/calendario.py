@@ -0,0 +1,80 @@
+# 📁 core/calendario.py
+# Utilidades para los feeds JSON de FullCalendar: ventana de fechas [start, end)
+# y respuestas condicionales (ETag / Last-Modified) calculadas con una sola consulta.
+import datetime
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import condition
+
+from .periodos import inicio_dia
+
+# Sin start/end (cliente viejo o llamada manual) no se devuelve todo el historial
+DIAS_ATRAS_DEFECTO = 31
+DIAS_ADELANTE_DEFECTO = 62
+
+
+def _parsear_limite(valor):
+    if not valor:
+        return None
+    # FullCalendar envía ISO 8601 ("2025-03-01T00:00:00-05:00") o solo la fecha;
+    # el "+" del offset puede llegar convertido en espacio por el querystring
+    valor = valor.strip().replace(' ', '+')
+    try:
+        momento = parse_datetime(valor)
+    except ValueError:
+        momento = None
+    if momento is None:
+        try:
+            fecha = parse_date(valor[:10])
+        except ValueError:
+            return None
+        if fecha is None:
+            return None
+        momento = datetime.datetime.combine(fecha, datetime.time.min)
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+def rango_calendario(request):
+    """Ventana (inicio, fin) pedida por FullCalendar; fin es exclusivo."""
+    if not hasattr(request, '_rango_calendario'):
+        inicio = _parsear_limite(request.GET.get('start'))
+        fin = _parsear_limite(request.GET.get('end'))
+        if inicio is None or fin is None or fin <= inicio:
+            hoy = inicio_dia(timezone.localdate())
+            inicio = hoy - datetime.timedelta(days=DIAS_ATRAS_DEFECTO)
+            fin = hoy + datetime.timedelta(days=DIAS_ADELANTE_DEFECTO)
+        request._rango_calendario = (inicio, fin)
+    return request._rango_calendario
+
+
+def feed_calendario(consulta, **agregados_extra):
+    """
+    Decorador para vistas de feed: responde 304 si nada cambió en la ventana.
+
+    `consulta(inicio, fin)` devuelve el queryset de la ventana (con `updated_at`).
+    La huella es cantidad de filas + último `updated_at` + `agregados_extra`
+    (p. ej. Sum('items__cantidad') para detectar cambios en los items; los
+    agregados sobre relaciones multiplican las filas, por eso el conteo es DISTINCT).
+    """
+    def huella(request, *args, **kwargs):
+        if not hasattr(request, '_huella_calendario'):
+            inicio, fin = rango_calendario(request)
+            request._huella_calendario = consulta(inicio, fin).aggregate(
+                conteo=Count('id', distinct=True), ultimo=Max('updated_at'), **agregados_extra)
+        return request._huella_calendario
+
+    def etag(request, *args, **kwargs):
+        datos = huella(request)
+        inicio, fin = rango_calendario(request)
+        partes = [inicio.isoformat(), fin.isoformat()] + [str(datos[clave]) for clave in sorted(datos)]
+        return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:20]
+
+    def ultima_modificacion(request, *args, **kwargs):
+        return huella(request)['ultimo']
+
+    return condition(etag_func=etag, last_modified_func=ultima_modificacion)
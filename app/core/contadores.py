@@ -0,0 +1,97 @@
+# 📁 core/contadores.py
+# Numeración correlativa sin huecos ni reintentos:
+#   - Secuencial SRI de facturas, por (establecimiento, punto de emisión)
+#   - Número de trabajo de impresión, por día
+# Cada número sale de un solo INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+# sobre la fila del contador: Postgres bloquea esa fila hasta el fin de la
+# transacción, así dos cajeros nunca reciben el mismo número y, si la factura
+# no llega a guardarse, el rollback devuelve el número (no quedan huecos).
+# Con claves distintas (otro punto de emisión, otro día) no hay espera.
+#
+# Una caja puede apartar un bloque de números (reservar_bloque) para ráfagas
+# sin conexión; siguiente_numero() consume primero de sus bloques. Al cerrarse
+# la caja, liberar_bloques() devuelve lo que no usó al contador o, si el
+# contador ya avanzó, deja el resto LIBRE para el próximo que numere.
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import BloqueNumeracion, Contador
+
+_TABLA_CONTADOR = Contador._meta.db_table
+_TABLA_BLOQUE = BloqueNumeracion._meta.db_table
+LIBRE = 'libre'
+
+
+def clave_factura(establecimiento, punto_emision):
+    return f'factura:{establecimiento}-{punto_emision}'
+
+
+def clave_trabajo(dia):
+    return f'impresion:{dia:%Y%m%d}'
+
+
+def siguiente(clave, cantidad=1):
+    """Avanza el contador `cantidad` números y devuelve el último (el bloque es [n - cantidad + 1, n])."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_TABLA_CONTADOR} (clave, valor) VALUES (%s, %s) '
+            f'ON CONFLICT (clave) DO UPDATE SET valor = {_TABLA_CONTADOR}.valor + EXCLUDED.valor '
+            f'RETURNING valor',
+            [clave, cantidad],
+        )
+        return cursor.fetchone()[0]
+
+
+def siguiente_numero(clave, asignado_a=None):
+    """
+    Próximo número de `clave`: del bloque apartado para `asignado_a` si le
+    quedan, luego de los bloques libres y si no del contador. Todo en una
+    sola consulta.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            WITH bloque AS (
+                UPDATE {_TABLA_BLOQUE} SET siguiente = siguiente + 1
+                WHERE id = (
+                    SELECT id FROM {_TABLA_BLOQUE}
+                    WHERE clave = %s AND asignado_a IN (%s, %s) AND siguiente <= hasta
+                    ORDER BY asignado_a = %s, id LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING siguiente - 1 AS numero
+            ), contador AS (
+                INSERT INTO {_TABLA_CONTADOR} (clave, valor)
+                SELECT %s, 1 WHERE NOT EXISTS (SELECT 1 FROM bloque)
+                ON CONFLICT (clave) DO UPDATE SET valor = {_TABLA_CONTADOR}.valor + 1
+                RETURNING valor AS numero
+            )
+            SELECT numero FROM bloque UNION ALL SELECT numero FROM contador
+            ''',
+            [clave, asignado_a, LIBRE, LIBRE, clave],
+        )
+        return cursor.fetchone()[0]
+
+
+def reservar_bloque(clave, cantidad, asignado_a):
+    """Aparta `cantidad` números consecutivos de `clave` para `asignado_a`."""
+    hasta = siguiente(clave, cantidad)
+    desde = hasta - cantidad + 1
+    return BloqueNumeracion.objects.create(clave=clave, asignado_a=asignado_a, desde=desde, hasta=hasta, siguiente=desde)
+
+
+def liberar_bloques(asignado_a):
+    """
+    Números sin usar de los bloques de `asignado_a` (caja que se cierra): si
+    nadie numeró después, vuelven al contador; si no, quedan libres y
+    siguiente_numero() los entrega antes de seguir con el contador.
+    """
+    with transaction.atomic():
+        bloques = list(BloqueNumeracion.objects.select_for_update()
+                       .filter(asignado_a=asignado_a, siguiente__lte=F('hasta')))
+        for bloque in bloques:
+            if Contador.objects.filter(clave=bloque.clave, valor=bloque.hasta).update(valor=bloque.siguiente - 1):
+                bloque.hasta = bloque.siguiente - 1
+            else:
+                bloque.asignado_a = LIBRE
+        BloqueNumeracion.objects.bulk_update(bloques, ['hasta', 'asignado_a'])
+    return len(bloques)
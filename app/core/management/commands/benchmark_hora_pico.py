@@ -0,0 +1,179 @@
+import random
+import secrets
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from caja.models import SesionCaja
+from core.benchmark import Cliente, Metricas, cargar, comparar, correr, guardar
+from pedidos.models import Mesa, Pedido, Producto
+from usuarios.models import Usuario
+
+MESA_BASE = 9000  # mesas propias del benchmark
+EN_CURSO = ('confirmado', 'listo', 'entregado')
+
+
+class Command(BaseCommand):
+    help = ('Simula la hora pico del almuerzo (meseros, cocina, agente de impresión y cajeros) contra '
+            'un servidor levantado y reporta p50/p95/p99 y peticiones por segundo por endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor a medir')
+        parser.add_argument('--duracion', type=float, default=60, help='Segundos de prueba')
+        parser.add_argument('--meseros', type=int, default=8)
+        parser.add_argument('--cocinas', type=int, default=2, help='Pantallas de cocina')
+        parser.add_argument('--cajeros', type=int, default=2)
+        parser.add_argument('--pausa', type=float, default=0.5, help='Segundos entre acciones de una persona')
+        parser.add_argument('--sondeo', type=float, default=2.0, help='Segundos entre sondeos de cocina y agente')
+        parser.add_argument('--semilla', type=int)
+        parser.add_argument('--salida', help='Guarda el resultado en este JSON')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior para ver la variación')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.options = options
+        self.productos = list(Producto.objects.filter(disponible=True, stock__gt=0).values_list('id', flat=True)[:200])
+        if not self.productos:
+            raise CommandError('No hay productos disponibles: genere datos con generar_datos_carga')
+        anterior = cargar(options['comparar']) if options['comparar'] else None
+
+        metricas = Metricas()
+        meseros = [self._usuario(f'bench_mesero_{i}', 'mesero') for i in range(options['meseros'])]
+        self.mesas = [Mesa.objects.get_or_create(numero=MESA_BASE + i, defaults={'capacidad': 4})[0].id
+                      for i in range(len(meseros))]
+        if not SesionCaja.objects.filter(estado=True).exists():
+            SesionCaja.objects.create(usuario=meseros[0] if meseros else self._usuario('bench_cajero_0', 'mesero'), monto_inicial=0)
+
+        actores = [self._mesero(self._cliente(metricas, u), mesa) for u, mesa in zip(meseros, self.mesas)]
+        actores += [self._cocina(self._cliente(metricas, self._usuario(f'bench_cocina_{i}', 'cocina')))
+                    for i in range(options['cocinas'])]
+        actores += [self._cajero(self._cliente(metricas, self._usuario(f'bench_cajero_{i}', 'mesero')),
+                                 self.mesas[i::options['cajeros']])
+                    for i in range(options['cajeros'])]
+        actores.append(self._agente(Cliente(options['url'], metricas)))
+
+        self.stdout.write(f"⏱️  {len(actores)} actores durante {options['duracion']:g}s contra {options['url']}")
+        duracion = correr(actores, options['duracion'])
+        filas = metricas.resumen(duracion)
+        if anterior:
+            filas = comparar(filas, anterior['endpoints'])
+        self._imprimir(filas, duracion)
+
+        if options['salida']:
+            guardar(options['salida'], {
+                'fecha': timezone.now().isoformat(),
+                'parametros': {k: options[k] for k in ('url', 'duracion', 'meseros', 'cocinas', 'cajeros', 'pausa', 'sondeo')},
+                'duracion': round(duracion, 2),
+                'endpoints': filas,
+            })
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultado guardado en {options['salida']}"))
+
+    # --- Preparación ---
+
+    def _usuario(self, username, rol):
+        usuario, creado = Usuario.objects.get_or_create(
+            username=username, defaults={'email': f'{username}@bench.local', 'rol': rol})
+        if creado:
+            usuario.set_unusable_password()
+            usuario.save()
+        return usuario
+
+    def _cliente(self, metricas, usuario):
+        """Cliente con una sesión ya iniciada (sin pasar por el login ni axes)."""
+        sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+        sesion[SESSION_KEY] = str(usuario.pk)
+        sesion[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.create()
+        csrf = secrets.token_hex(16)  # secreto sin enmascarar de 32 caracteres
+        return Cliente(self.options['url'], metricas,
+                       cookies={settings.SESSION_COOKIE_NAME: sesion.session_key, settings.CSRF_COOKIE_NAME: csrf},
+                       csrf=csrf)
+
+    def _pausa(self, segundos):
+        time.sleep(segundos * self.rng.uniform(0.5, 1.5))
+
+    # --- Actores (cada uno corre en su hilo hasta `fin`) ---
+
+    def _mesero(self, cliente, mesa_id):
+        def actor(fin):
+            try:
+                while time.monotonic() < fin:
+                    cliente.pedir('detalle_mesa', 'GET', f'/pedidos/mesa/{mesa_id}/')
+                    pedido = Pedido.objects.filter(mesa_id=mesa_id, estado__in=('borrador',) + EN_CURSO).values('id', 'estado').first()
+                    if pedido and pedido['estado'] == 'borrador':
+                        for producto_id in self.rng.sample(self.productos, min(len(self.productos), self.rng.randint(1, 4))):
+                            self._pausa(self.options['pausa'])
+                            cliente.pedir('agregar_producto', 'POST', f'/pedidos/agregar/{producto_id}/',
+                                          data={'pedido_id': pedido['id']}, headers={'HX-Request': 'true'})
+                        cliente.pedir('confirmar_pedido', 'POST', f"/pedidos/confirmar/{pedido['id']}/",
+                                      esperado=(204, 302), headers={'HX-Request': 'true'})
+                    # Mientras la mesa come, el mesero sondea sus notificaciones
+                    while time.monotonic() < fin and Pedido.objects.filter(mesa_id=mesa_id, estado__in=EN_CURSO).exists():
+                        cliente.pedir('check_notificaciones', 'GET', '/pedidos/check_notificaciones/')
+                        self._pausa(self.options['sondeo'])
+            finally:
+                connection.close()
+        return actor
+
+    def _cocina(self, cliente):
+        def actor(fin):
+            etag = None
+            try:
+                while time.monotonic() < fin:
+                    respuesta = cliente.pedir('actualizar_cocina', 'GET', '/pedidos/cocina/actualizar/', esperado=(200, 304),
+                                              headers={'If-None-Match': etag} if etag else {})
+                    if respuesta is not None and respuesta.status_code == 200:
+                        etag = respuesta.headers.get('ETag')
+                    listo = Pedido.objects.filter(mesa_id__in=self.mesas, estado='confirmado').order_by('fecha_confirmado').values_list('id', flat=True).first()
+                    if listo:
+                        cliente.pedir('terminar_pedido', 'GET', f'/pedidos/cocina/terminar/{listo}/', esperado=(302,))
+                    self._pausa(self.options['sondeo'])
+            finally:
+                connection.close()
+        return actor
+
+    def _cajero(self, cliente, mesas):
+        def actor(fin):
+            try:
+                while time.monotonic() < fin:
+                    por_cobrar = Pedido.objects.filter(mesa_id__in=mesas, estado__in=('listo', 'entregado')).values_list('id', flat=True).first()
+                    if por_cobrar:
+                        cliente.pedir('procesar_pago', 'POST', f'/pedidos/pedido/{por_cobrar}/pagar/',
+                                      data={'tipo_documento': 'nota_entrega', 'metodo_pago_sri': '01', 'efectivo_recibido': '100'},
+                                      headers={'HX-Request': 'true'})
+                    self._pausa(self.options['pausa'] * 2)
+            finally:
+                connection.close()
+        return actor
+
+    def _agente(self, cliente):
+        def actor(fin):
+            while time.monotonic() < fin:
+                respuesta = cliente.pedir('agente_trabajos', 'GET', '/api/printer/agente/trabajos/')
+                trabajos = respuesta.json().get('trabajos', []) if respuesta is not None and respuesta.ok else []
+                for trabajo in trabajos:
+                    cliente.pedir('agente_resultado', 'POST', '/api/printer/agente/resultado/',
+                                  json={'trabajo_id': trabajo['id'], 'success': True})
+                self._pausa(self.options['sondeo'] / 2)
+        return actor
+
+    # --- Reporte ---
+
+    def _imprimir(self, filas, duracion):
+        columnas = f"{'Endpoint':<22}{'Peticiones':>11}{'Errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}"
+        self.stdout.write(columnas)
+        self.stdout.write('-' * len(columnas))
+        for f in filas:
+            linea = (f"{f['endpoint']:<22}{f['peticiones']:>11}{f['errores']:>9}"
+                     f"{f['p50_ms']:>9.1f}{f['p95_ms']:>9.1f}{f['p99_ms']:>9.1f}{f['rps']:>8.2f}")
+            if 'p95_delta_pct' in f:
+                linea += f"   p95 {f['p95_delta_pct']:+.1f}%"
+            self.stdout.write(linea)
+        total = sum(f['peticiones'] for f in filas)
+        self.stdout.write(f'Total: {total} peticiones en {duracion:.1f}s ({total / duracion:.1f} req/s)')
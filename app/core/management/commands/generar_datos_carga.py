@@ -0,0 +1,302 @@
+import datetime
+import random
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.contadores import clave_factura, siguiente
+from hostal.models import Habitacion, Huesped, Reserva, TipoHabitacion
+from hostal.ocupacion import invalidar_ocupacion
+from inventario.costeo import invalidar_costeo
+from inventario.models import Insumo, Receta
+from pedidos.models import CategoriaProducto, DetallePedido, Factura, Mesa, Pedido, Producto
+from pedidos.services.menu import invalidar_menu
+from pedidos.services.ventas import reconstruir_resumenes
+from printer.models import Printer, PrintJob
+from usuarios.models import Usuario
+
+LOTE = 2000
+DIAS_POR_BLOQUE = 7
+
+CATEGORIAS = ['Desayunos', 'Almuerzos', 'Platos Fuertes', 'Sánduches', 'Ensaladas', 'Sopas',
+              'Bebidas Calientes', 'Jugos', 'Batidos', 'Postres', 'Panadería', 'Cervezas']
+PLATOS = ['Seco de Pollo', 'Encebollado', 'Bolón', 'Tigrillo', 'Churrasco', 'Locro', 'Ceviche',
+          'Café Pasado', 'Capuchino', 'Jugo de Mora', 'Humita', 'Tamal', 'Empanada', 'Tres Leches']
+INSUMOS = ['Arroz', 'Pollo', 'Carne', 'Verde', 'Queso', 'Huevo', 'Leche', 'Café', 'Papa', 'Cebolla',
+           'Tomate', 'Harina', 'Azúcar', 'Mora', 'Aceite', 'Pescado', 'Camarón', 'Maíz', 'Fréjol', 'Limón']
+
+# Pedidos por hora de servicio (7h a 21h): pico de almuerzo de 12h a 14h
+HORAS_SERVICIO = list(range(7, 22))
+PESO_HORA = [3, 4, 4, 3, 3, 8, 12, 10, 5, 3, 3, 4, 5, 4, 2]
+
+
+@contextmanager
+def fechas_manuales(*modelos):
+    """Desactiva auto_now / auto_now_add para insertar el historial con sus fechas."""
+    campos = [c for m in modelos for c in m._meta.concrete_fields if getattr(c, 'auto_now', False) or getattr(c, 'auto_now_add', False)]
+    originales = [(c, c.auto_now, c.auto_now_add) for c in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Genera datos sintéticos de volumen (menú, recetas, años de pedidos, facturas, '
+            'reservas e impresiones) para pruebas de carga. No usar en producción.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--insumos', type=int, default=500)
+        parser.add_argument('--dias', type=int, default=730, help='Días de historial de ventas')
+        parser.add_argument('--pedidos-por-dia', type=int, default=150)
+        parser.add_argument('--habitaciones', type=int, default=30)
+        parser.add_argument('--hasta', help='Último día del historial YYYY-MM-DD (por defecto ayer)')
+        parser.add_argument('--semilla', type=int, help='Semilla aleatoria (mismos datos en cada corrida)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        hasta = timezone.localdate() - datetime.timedelta(days=1)
+        if options['hasta']:
+            hasta = parse_date(options['hasta'])
+            if hasta is None:
+                raise CommandError(f"Fecha inválida para --hasta: {options['hasta']}")
+        desde = hasta - datetime.timedelta(days=max(options['dias'], 1) - 1)
+
+        with transaction.atomic():
+            insumos = self._insumos(options['insumos'])
+            productos = self._productos(options['productos'])
+            recetas = self._recetas(productos, insumos)
+        self.stdout.write(f'🍽️  {len(productos)} productos, {len(insumos)} insumos, {recetas} líneas de receta')
+
+        pedidos = self._historial_ventas(desde, hasta, options['pedidos_por_dia'], productos)
+        self.stdout.write(f'🧾 {pedidos} pedidos pagados del {desde} al {hasta}')
+
+        reservas = self._reservas(desde, hasta, options['habitaciones'])
+        self.stdout.write(f'🛏️  {reservas} reservas en {options["habitaciones"]} habitaciones')
+
+        # Los bulk_create no disparan señales: se reconstruyen resúmenes y cachés
+        reconstruir_resumenes(desde, hasta)
+        invalidar_menu()
+        invalidar_costeo()
+        invalidar_ocupacion()
+        self.stdout.write(self.style.SUCCESS('✅ Datos de carga generados'))
+
+    # --- Menú e inventario ---
+
+    def _insumos(self, cantidad):
+        rng = self.rng
+        base = Insumo.objects.count()
+        insumos = Insumo.objects.bulk_create([
+            Insumo(
+                nombre=f'{rng.choice(INSUMOS)} {base + i + 1}',
+                unidad_medida=rng.choice(['kg', 'lt', 'un', 'lb']),
+                stock_actual=Decimal(rng.randint(10, 500)),
+                costo_unitario=Decimal(rng.randint(20, 1500)) / 100,
+                # Una de cada diez es preparación propia (sub-receta)
+                es_subreceta=i % 10 == 0,
+                rendimiento_receta=Decimal(rng.randint(1, 5)),
+            )
+            for i in range(cantidad)
+        ], batch_size=LOTE)
+        crudos = [i for i in insumos if not i.es_subreceta]
+        Receta.objects.bulk_create([
+            Receta(insumo_principal=sub, insumo=ingrediente, cantidad_necesaria=Decimal(rng.randint(50, 500)) / 1000)
+            for sub in insumos if sub.es_subreceta and crudos
+            for ingrediente in rng.sample(crudos, min(len(crudos), rng.randint(2, 3)))
+        ], batch_size=LOTE)
+        return insumos
+
+    def _productos(self, cantidad):
+        rng = self.rng
+        categorias = [CategoriaProducto.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORIAS]
+        base = Producto.objects.count()
+        return Producto.objects.bulk_create([
+            Producto(
+                nombre=f'{rng.choice(PLATOS)} {base + i + 1}',
+                precio=Decimal(rng.randint(100, 1800)) / 100,
+                categoria=rng.choice(categorias),
+                stock=rng.randint(50, 500),
+            )
+            for i in range(cantidad)
+        ], batch_size=LOTE)
+
+    def _recetas(self, productos, insumos):
+        rng = self.rng
+        if not insumos:
+            return 0
+        lineas = Receta.objects.bulk_create([
+            Receta(producto=producto, insumo=insumo, cantidad_necesaria=Decimal(rng.randint(20, 400)) / 1000)
+            for producto in productos
+            for insumo in rng.sample(insumos, min(len(insumos), rng.randint(2, 5)))
+        ], batch_size=LOTE)
+        return len(lineas)
+
+    # --- Ventas ---
+
+    def _personal(self):
+        meseros = list(Usuario.objects.filter(rol='mesero')[:10])
+        for n in range(len(meseros), 5):
+            mesero = Usuario(username=f'mesero_carga_{n + 1}', email=f'mesero_carga_{n + 1}@carga.local', rol='mesero')
+            mesero.set_unusable_password()
+            mesero.save()
+            meseros.append(mesero)
+        mesas = list(Mesa.objects.all()[:30])
+        numero = (Mesa.objects.aggregate(m=Max('numero'))['m'] or 0) + 1
+        for n in range(len(mesas), 15):
+            mesas.append(Mesa.objects.create(numero=numero + n, capacidad=4))
+        impresoras = [
+            Printer.objects.filter(name=nombre).first() or Printer.objects.create(name=nombre, connection_string=nombre.upper())
+            for nombre in ('Cocina', 'Caja')
+        ]
+        return meseros, mesas, impresoras
+
+    def _historial_ventas(self, desde, hasta, por_dia, productos):
+        if not productos or por_dia <= 0:
+            return 0
+        meseros, mesas, (cocina, caja) = self._personal()
+        total = 0
+        dia = desde
+        while dia <= hasta:
+            bloque = [dia + datetime.timedelta(days=d) for d in range(DIAS_POR_BLOQUE) if dia + datetime.timedelta(days=d) <= hasta]
+            with transaction.atomic(), fechas_manuales(Pedido, Factura, PrintJob):
+                creados = self._bloque_ventas(bloque, por_dia, productos, meseros, mesas, cocina, caja)
+            total += creados
+            dia = bloque[-1] + datetime.timedelta(days=1)
+        return total
+
+    def _bloque_ventas(self, dias, por_dia, productos, meseros, mesas, cocina, caja):
+        rng = self.rng
+        tz = timezone.get_current_timezone()
+        pedidos, lineas = [], []
+        for dia in dias:
+            # Fines de semana con más movimiento
+            media = por_dia * (1.3 if dia.weekday() >= 5 else 1.0)
+            for _ in range(max(0, int(rng.gauss(media, media * 0.15)))):
+                hora = rng.choices(HORAS_SERVICIO, PESO_HORA)[0]
+                momento = timezone.make_aware(datetime.datetime(dia.year, dia.month, dia.day, hora, rng.randrange(60), rng.randrange(60)), tz)
+                items = [(p, rng.choices([1, 2, 3], [70, 22, 8])[0]) for p in rng.sample(productos, min(len(productos), rng.randint(1, 4)))]
+                listo = momento + datetime.timedelta(minutes=rng.randint(5, 25))
+                cobro = listo + datetime.timedelta(minutes=rng.randint(10, 60))
+                pedidos.append(Pedido(
+                    mesa=rng.choice(mesas) if rng.random() < 0.7 else None,
+                    mesero=rng.choice(meseros),
+                    estado='pagado',
+                    fecha_confirmado=momento,
+                    fecha_listo=listo,
+                    fecha_pago=cobro,
+                    notificacion_vista=True,
+                    total=sum(p.precio * c for p, c in items),
+                    cantidad_items=sum(c for _, c in items),
+                    created_at=momento,
+                    updated_at=listo,
+                ))
+                lineas.append(items)
+
+        Pedido.objects.bulk_create(pedidos, batch_size=LOTE)
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, producto=producto, cantidad=cantidad, precio_unitario=producto.precio)
+            for pedido, items in zip(pedidos, lineas)
+            for producto, cantidad in items
+        ], batch_size=LOTE)
+
+        facturas, trabajos = [], []
+        for pedido in pedidos:
+            emision = pedido.fecha_pago
+            es_factura = rng.random() < 0.3
+            metodo_sri = rng.choices(['01', '16', '19'], [60, 25, 15])[0]
+            facturas.append(Factura(
+                pedido=pedido,
+                tipo_comprobante='factura' if es_factura else 'nota_entrega',
+                razon_social='CONSUMIDOR FINAL',
+                ruc_ci='9999999999999',
+                fecha_emision=emision,
+                subtotal=pedido.total,
+                total=pedido.total,
+                metodo_pago_sri=metodo_sri,
+                estado_sri='autorizado' if es_factura else 'borrador',
+                monto_recibido=pedido.total,
+            ))
+            for impresora, tipo, momento in ((cocina, 'order', pedido.fecha_confirmado), (caja, 'receipt', emision)):
+                trabajos.append(PrintJob(
+                    job_number=f'CARGA-{uuid.uuid4().hex[:24]}',
+                    printer=impresora,
+                    document_type=tipo,
+                    related_model='Pedido',
+                    related_id=str(pedido.id),
+                    content=f'Pedido #{pedido.id}',
+                    status='completed',
+                    created_by='carga',
+                    created_at=momento,
+                    started_at=momento,
+                    completed_at=momento + datetime.timedelta(seconds=rng.randint(1, 5)),
+                ))
+        # bulk_create no pasa por Factura.save(): el bloque de secuenciales se pide al contador de una vez
+        con_numero = [f for f in facturas if f.tipo_comprobante == 'factura']
+        if con_numero:
+            ultimo = siguiente(clave_factura('001', '001'), len(con_numero))
+            for numero, factura in enumerate(con_numero, ultimo - len(con_numero) + 1):
+                factura.secuencial = f'{numero:09d}'
+        Factura.objects.bulk_create(facturas, batch_size=LOTE)
+        PrintJob.objects.bulk_create(trabajos, batch_size=LOTE)
+        return len(pedidos)
+
+    # --- Hostal ---
+
+    def _reservas(self, desde, hasta, habitaciones):
+        rng = self.rng
+        if habitaciones <= 0:
+            return 0
+        tipos = list(TipoHabitacion.objects.all()[:5]) or [
+            TipoHabitacion.objects.create(nombre=nombre, precio_persona=Decimal(precio), capacidad_personas=capacidad)
+            for nombre, precio, capacidad in (('Simple', 18, 1), ('Doble', 15, 2), ('Familiar', 12, 4))
+        ]
+        base = Habitacion.objects.count()
+        cuartos = Habitacion.objects.bulk_create([
+            Habitacion(numero=f'C{base + i + 1}', tipo=rng.choice(tipos), piso=str(1 + i // 10))
+            for i in range(habitaciones)
+        ])
+        huespedes = Huesped.objects.bulk_create([
+            Huesped(nombre_completo=f'Huésped {i + 1}', documento_identidad=f'{rng.randrange(10 ** 9, 10 ** 10)}')
+            for i in range(max(50, habitaciones * 20))
+        ], batch_size=LOTE)
+
+        tz = timezone.get_current_timezone()
+        ahora = timezone.now()
+        fin = hasta + datetime.timedelta(days=60)  # también reservas futuras
+        reservas = []
+        for cuarto in cuartos:
+            dia = desde + datetime.timedelta(days=rng.randint(0, 3))
+            while dia < fin:
+                noches = rng.randint(1, 6)
+                checkin = timezone.make_aware(datetime.datetime.combine(dia, datetime.time(14)), tz)
+                checkout = timezone.make_aware(datetime.datetime.combine(dia + datetime.timedelta(days=noches), datetime.time(12)), tz)
+                if checkout < ahora:
+                    estado = 'cancelada' if rng.random() < 0.08 else 'checkout'
+                elif checkin <= ahora:
+                    estado = 'checkin'
+                else:
+                    estado = 'pendiente'
+                personas = rng.randint(1, cuarto.tipo.capacidad_personas)
+                precio = cuarto.tipo.precio_persona * personas * noches
+                reservas.append(Reserva(
+                    huesped=rng.choice(huespedes), habitacion=cuarto,
+                    fecha_checkin=checkin, fecha_checkout=checkout,
+                    cantidad_personas=personas, estado=estado,
+                    precio_total=precio, pagado=precio if estado == 'checkout' else 0,
+                    created_at=checkin - datetime.timedelta(days=rng.randint(0, 30)),
+                ))
+                # Días libres entre una estadía y la siguiente
+                dia += datetime.timedelta(days=noches + rng.choice([0, 0, 1, 2, 4, 7]))
+        with transaction.atomic(), fechas_manuales(Reserva):
+            Reserva.objects.bulk_create(reservas, batch_size=LOTE)
+        return len(reservas)
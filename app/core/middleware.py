@@ -0,0 +1,34 @@
+import random
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .perfilador import Recolector, configuracion, registrar
+
+
+class PerfiladorConsultasMiddleware:
+    """
+    Mide las consultas de una fracción (PERFILADOR_MUESTREO) de los requests y
+    las acumula por vista en core/perfilador.py. Con PERFILADOR_CONSULTAS
+    apagado Django lo quita de la cadena al arrancar.
+    """
+
+    def __init__(self, get_response):
+        activo, self.muestreo, self.umbral_lenta_ms = configuracion()
+        if not activo:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        recolector = Recolector(self.umbral_lenta_ms)
+        with connection.execute_wrapper(recolector):
+            response = self.get_response(request)
+
+        # resolver_match existe solo si la URL resolvió (no en 404 de ruta)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            registrar(match.view_name, recolector.resumen())
+        return response
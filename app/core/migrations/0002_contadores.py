@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:31
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def sembrar_contadores(apps, schema_editor):
+    # El contador de cada punto de emisión arranca en el mayor secuencial ya emitido
+    Contador = apps.get_model('core', 'Contador')
+    Factura = apps.get_model('pedidos', 'Factura')
+    puntos = (Factura.objects.filter(secuencial__regex=r'^[0-9]+$')
+              .values('establecimiento', 'punto_emision')
+              .annotate(ultimo=Max('secuencial')))
+    Contador.objects.bulk_create([
+        Contador(clave=f"factura:{p['establecimiento']}-{p['punto_emision']}", valor=int(p['ultimo']))
+        for p in puntos
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('pedidos', '0015_factura_sesion_caja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('clave', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Último número entregado')),
+            ],
+            options={
+                'verbose_name': 'Contador',
+                'verbose_name_plural': 'Contadores',
+            },
+        ),
+        migrations.CreateModel(
+            name='BloqueNumeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60)),
+                ('asignado_a', models.CharField(max_length=60, verbose_name='Asignado a')),
+                ('desde', models.BigIntegerField()),
+                ('hasta', models.BigIntegerField()),
+                ('siguiente', models.BigIntegerField(verbose_name='Siguiente número libre')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Bloque de Numeración',
+                'verbose_name_plural': 'Bloques de Numeración',
+                'indexes': [models.Index(fields=['clave', 'asignado_a'], name='bloque_clave_asignado_idx')],
+            },
+        ),
+        migrations.RunPython(sembrar_contadores, migrations.RunPython.noop),
+    ]
@@ -20,3 +20,38 @@ class ConfiguracionSRI(models.Model):
         
     def __str__(self):
         return "Configuración Global SRI"
+
+
+class Contador(models.Model):
+    """Numeración correlativa por clave (la entrega core/contadores.py)."""
+    clave = models.CharField(max_length=60, primary_key=True)
+    valor = models.BigIntegerField(default=0, verbose_name="Último número entregado")
+
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+
+class BloqueNumeracion(models.Model):
+    """Rango de números de un Contador apartado para un solo usuario (p. ej. una caja sin conexión)."""
+    clave = models.CharField(max_length=60)
+    asignado_a = models.CharField(max_length=60, verbose_name="Asignado a")
+    desde = models.BigIntegerField()
+    hasta = models.BigIntegerField()
+    siguiente = models.BigIntegerField(verbose_name="Siguiente número libre")
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Bloque de Numeración"
+        verbose_name_plural = "Bloques de Numeración"
+        indexes = [models.Index(fields=['clave', 'asignado_a'], name='bloque_clave_asignado_idx')]
+
+    def __str__(self):
+        return f"{self.clave} {self.desde}-{self.hasta} ({self.asignado_a})"
+
+    @property
+    def disponibles(self):
+        return max(0, self.hasta - self.siguiente + 1)
@@ -0,0 +1,158 @@
+# 📁 core/perfilador.py
+# Perfilador de consultas SQL por vista (opt-in, ver PERFILADOR_CONSULTAS).
+# El middleware mide cada request muestreado con un execute_wrapper de la
+# conexión (funciona con DEBUG=False) y acumula por nombre de vista:
+#   - peticiones, consultas y tiempo de BD (contadores con cache.incr)
+#   - huellas de consultas repetidas dentro de un mismo request (N+1)
+#   - las consultas más lentas
+# Todo vive en la caché compartida (Redis en producción), así el reporte junta
+# lo de todos los workers. Contadores atómicos; el detalle (duplicados y lentas)
+# es lectura-escritura y puede perder alguna muestra concurrente, lo cual es
+# aceptable para un perfil muestreado.
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PERFIL_TTL = 60 * 60 * 24
+MAX_DUPLICADOS = 10
+MAX_LENTAS = 5
+MAX_SQL = 500
+
+_LITERALES = [
+    (re.compile(r'SAVEPOINT "[^"]*"'), 'SAVEPOINT ?'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def configuracion():
+    """(activo, muestreo, umbral de consulta lenta en ms) según settings."""
+    return (
+        getattr(settings, 'PERFILADOR_CONSULTAS', False),
+        getattr(settings, 'PERFILADOR_MUESTREO', 0.1),
+        getattr(settings, 'PERFILADOR_LENTA_MS', 200),
+    )
+
+
+def huella(sql):
+    """SQL sin literales: dos consultas con distintos parámetros comparten huella."""
+    for patron, reemplazo in _LITERALES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()[:MAX_SQL]
+
+
+class Recolector:
+    """execute_wrapper que toma tiempo y huella de cada consulta del request."""
+
+    def __init__(self, umbral_lenta_ms=None):
+        self.umbral_lenta_ms = umbral_lenta_ms
+        self.consultas = []  # (sql, ms)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.consultas.append((sql, ms))
+            if self.umbral_lenta_ms is not None and ms >= self.umbral_lenta_ms:
+                logger.warning('Consulta lenta (%.1f ms): %s', ms, sql[:MAX_SQL])
+
+    def resumen(self):
+        huellas = Counter(huella(sql) for sql, _ in self.consultas)
+        lenta = max(self.consultas, key=lambda c: c[1], default=None)
+        return {
+            'consultas': len(self.consultas),
+            'tiempo_ms': sum(ms for _, ms in self.consultas),
+            'duplicados': {h: n for h, n in huellas.items() if n > 1},
+            'lenta': (round(lenta[1], 2), lenta[0][:MAX_SQL]) if lenta else None,
+        }
+
+
+# --- Acumulado en caché ---
+
+def _version():
+    return cache.get_or_set('perfil_version', 1, None)
+
+
+def _clave(version, *partes):
+    return ':'.join(['perfil', str(version), *partes])
+
+
+def _sumar(clave, valor):
+    # incr() es atómico; si la llave no existe la crea add() (también atómico)
+    if not cache.add(clave, valor, PERFIL_TTL):
+        try:
+            cache.incr(clave, valor)
+        except ValueError:
+            cache.set(clave, valor, PERFIL_TTL)
+
+
+def registrar(vista, resumen):
+    """Suma el resumen de un request al perfil de `vista`."""
+    version = _version()
+    vistas = cache.get(_clave(version, 'vistas')) or []
+    if vista not in vistas:
+        cache.set(_clave(version, 'vistas'), vistas + [vista], PERFIL_TTL)
+
+    _sumar(_clave(version, vista, 'peticiones'), 1)
+    _sumar(_clave(version, vista, 'consultas'), resumen['consultas'])
+    # Microsegundos enteros: incr() no acepta decimales
+    _sumar(_clave(version, vista, 'tiempo_us'), int(resumen['tiempo_ms'] * 1000))
+
+    if not resumen['duplicados'] and not resumen['lenta']:
+        return
+    clave_detalle = _clave(version, vista, 'detalle')
+    detalle = cache.get(clave_detalle) or {'max_consultas': 0, 'duplicados': {}, 'lentas': []}
+    detalle['max_consultas'] = max(detalle['max_consultas'], resumen['consultas'])
+    duplicados = Counter(detalle['duplicados'])
+    duplicados.update(resumen['duplicados'])
+    detalle['duplicados'] = dict(duplicados.most_common(MAX_DUPLICADOS))
+    if resumen['lenta']:
+        lentas = detalle['lentas'] + [list(resumen['lenta'])]
+        detalle['lentas'] = sorted(lentas, key=lambda l: -l[0])[:MAX_LENTAS]
+    cache.set(clave_detalle, detalle, PERFIL_TTL)
+
+
+def reporte():
+    """Perfil por vista, las que más tiempo de BD consumen primero."""
+    version = _version()
+    filas = []
+    for vista in cache.get(_clave(version, 'vistas')) or []:
+        datos = cache.get_many([_clave(version, vista, c) for c in ('peticiones', 'consultas', 'tiempo_us', 'detalle')])
+        peticiones = datos.get(_clave(version, vista, 'peticiones'), 0)
+        if not peticiones:
+            continue
+        consultas = datos.get(_clave(version, vista, 'consultas'), 0)
+        tiempo_ms = datos.get(_clave(version, vista, 'tiempo_us'), 0) / 1000
+        detalle = datos.get(_clave(version, vista, 'detalle')) or {}
+        filas.append({
+            'vista': vista,
+            'peticiones': peticiones,
+            'consultas': consultas,
+            'consultas_promedio': round(consultas / peticiones, 1),
+            'max_consultas': max(detalle.get('max_consultas', 0), round(consultas / peticiones)),
+            'tiempo_bd_ms': round(tiempo_ms, 2),
+            'tiempo_bd_promedio_ms': round(tiempo_ms / peticiones, 2),
+            'duplicados': [
+                {'sql': sql, 'repeticiones': n}
+                for sql, n in sorted(detalle.get('duplicados', {}).items(), key=lambda d: -d[1])
+            ],
+            'lentas': [{'ms': ms, 'sql': sql} for ms, sql in detalle.get('lentas', [])],
+        })
+    return sorted(filas, key=lambda f: -f['tiempo_bd_ms'])
+
+
+def reiniciar():
+    """Empieza un perfil nuevo (las llaves viejas expiran solas)."""
+    if not cache.add('perfil_version', 2, None):
+        cache.incr('perfil_version')
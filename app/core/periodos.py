@@ -0,0 +1,48 @@
+# 📁 core/periodos.py
+# Períodos de reporte como rangos semiabiertos [inicio, fin) de timestamps.
+# Filtrar con `campo__gte` / `campo__lt` deja la columna intacta y Postgres usa
+# el índice; `campo__date=` la envuelve en un cast con zona horaria y no puede.
+import datetime
+from typing import NamedTuple, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Periodo(NamedTuple):
+    inicio: Optional[datetime.datetime]
+    fin: Optional[datetime.datetime]  # exclusivo; None = sin límite (caja abierta)
+
+    def filtro(self, campo):
+        """Q(campo__gte=inicio, campo__lt=fin) omitiendo los extremos abiertos."""
+        condiciones = {}
+        if self.inicio is not None:
+            condiciones[f'{campo}__gte'] = self.inicio
+        if self.fin is not None:
+            condiciones[f'{campo}__lt'] = self.fin
+        return Q(**condiciones)
+
+
+def inicio_dia(fecha):
+    """Medianoche local de esa fecha (aware)."""
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def periodo_dia(fecha):
+    """Un día local completo."""
+    return Periodo(inicio_dia(fecha), inicio_dia(fecha + datetime.timedelta(days=1)))
+
+
+def periodo_dias(desde=None, hasta=None):
+    """Días locales `desde`..`hasta` (ambos inclusive); cualquiera puede faltar."""
+    return Periodo(
+        inicio_dia(desde) if desde else None,
+        inicio_dia(hasta + datetime.timedelta(days=1)) if hasta else None,
+    )
+
+
+def periodo_sesion(sesion):
+    """Turno de caja (SesionCaja / SesionCajaHostal): de la apertura al cierre."""
+    fin = sesion.fecha_cierre
+    # El cierre es un instante que pertenece al turno: el fin exclusivo va justo después
+    return Periodo(sesion.fecha_apertura, fin + datetime.timedelta(microseconds=1) if fin else None)
@@ -0,0 +1,68 @@
+# 📁 core/pruebas.py
+# Presupuesto de consultas para los tests de las vistas más usadas.
+# Cada vista se mide dos veces, con pocos y con muchos datos: la cantidad de
+# consultas debe ser la misma (sin N+1) y no pasar del presupuesto. Al fallar
+# se listan las consultas para ver cuál se repite.
+#
+# EjecutorPruebas (TEST_RUNNER) fija la configuración que los tests necesitan
+# sin importar el .env de quien los corre.
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .perfilador import huella
+
+
+class EjecutorPruebas(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Un hilo escribiendo con otra conexión no ve los datos de la transacción del test
+        self.configuracion = override_settings(AUDITORIA_ASINCRONA=False)
+        self.configuracion.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.configuracion.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class PresupuestoConsultasMixin:
+
+    def medir_consultas(self, peticion):
+        """
+        Ejecuta `peticion()` (debe devolver la respuesta) con la caché vacía, así
+        ambas mediciones pagan lo mismo (grilla del POS, ocupación, actividad...).
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = peticion()
+        self.assertLess(respuesta.status_code, 400, f'La petición respondió {respuesta.status_code}')
+        return [q['sql'] for q in contexto.captured_queries]
+
+    def comparar_consultas(self, presupuesto, sembrar, peticion, preparar=lambda: ()):
+        """
+        Mide `peticion` con los datos del setUp, llama a `sembrar(8)` para
+        agregar más de lo que recorre la vista y vuelve a medir.
+        `preparar` arma los argumentos de la petición fuera de la medición.
+        """
+        peticion(*preparar())  # primera visita: pedido borrador, acumulados del día...
+        argumentos = preparar()
+        pocas = self.medir_consultas(lambda: peticion(*argumentos))
+        sembrar(8)
+        argumentos = preparar()
+        muchas = self.medir_consultas(lambda: peticion(*argumentos))
+        self.assertPresupuestoConsultas(presupuesto, pocas, muchas)
+
+    def assertPresupuestoConsultas(self, presupuesto, pocas, muchas):
+        if len(muchas) != len(pocas):
+            antes, despues = Counter(map(huella, pocas)), Counter(map(huella, muchas))
+            crecen = [f'{despues[h] - antes[h]:+d}  {h}' for h in despues if despues[h] != antes[h]]
+            crecen += [f'{-antes[h]:+d}  {h}' for h in antes if h not in despues]
+            self.fail('Las consultas crecen con los datos (%d -> %d):\n%s' % (
+                len(pocas), len(muchas), '\n'.join(crecen)))
+        if len(muchas) > presupuesto:
+            self.fail('%d consultas, presupuesto %d:\n%s' % (
+                len(muchas), presupuesto, '\n'.join(f'{i}. {sql}' for i, sql in enumerate(muchas, 1))))
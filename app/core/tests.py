@@ -1,3 +1,197 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import Q, Sum
+from django.core.cache import cache
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from eventos.models import Evento
+from usuarios.models import Usuario
+from .calendario import rango_calendario
+from .perfilador import huella, reporte
+
+
+class FeedCalendarioTest(TestCase):
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create_user(username='gerente_cal', email='gerente_cal@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.url = reverse('eventos:api_eventos')
+        marzo = timezone.make_aware(datetime.datetime(2025, 3, 15, 18, 0))
+        self.boda = Evento.objects.create(nombre='Boda', fecha_evento=marzo)
+        Evento.objects.create(nombre='Bautizo', fecha_evento=marzo - datetime.timedelta(days=400))
+
+    def test_rango_con_offset_y_solo_fecha(self):
+        factory = RequestFactory()
+        # El "+" del offset llega como espacio si el cliente no lo codifica
+        inicio, fin = rango_calendario(factory.get('/', {'start': '2025-03-01', 'end': '2025-04-01T00:00:00 05:00'}))
+        self.assertEqual(timezone.localtime(inicio).date(), datetime.date(2025, 3, 1))
+        self.assertEqual(fin, datetime.datetime(2025, 4, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=5))))
+
+    def test_solo_eventos_de_la_ventana(self):
+        datos = self.client.get(self.url, {'start': '2025-03-01', 'end': '2025-04-01'}).json()
+        self.assertEqual([e['title'] for e in datos], ['Boda'])
+
+    def test_respuesta_condicional(self):
+        parametros = {'start': '2025-03-01', 'end': '2025-04-01'}
+        respuesta = self.client.get(self.url, parametros)
+        self.assertTrue(respuesta.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta_304 = self.client.get(self.url, parametros, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta_304.status_code, 304)
+        # Solo la huella (COUNT/MAX) toca la tabla de eventos
+        self.assertEqual(len([q for q in consultas if 'eventos_evento' in q['sql']]), 1)
+
+        self.boda.personas = 80
+        self.boda.save()
+        self.assertEqual(self.client.get(self.url, parametros, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+
+class PeriodosTest(TestCase):
+
+    def test_dia_local_semiabierto(self):
+        from .periodos import periodo_dia
+        periodo = periodo_dia(datetime.date(2025, 3, 1))
+        # Guayaquil es UTC-5: el día local va de 05:00 UTC a 05:00 UTC del día siguiente
+        self.assertEqual(periodo.inicio, datetime.datetime(2025, 3, 1, 5, tzinfo=datetime.timezone.utc))
+        self.assertEqual(periodo.fin - periodo.inicio, datetime.timedelta(days=1))
+        self.assertNotIn('::date', str(Evento.objects.filter(periodo.filtro('fecha_evento')).query))
+
+    def test_sesion_abierta_sin_fin(self):
+        from caja.models import SesionCaja
+        from .periodos import periodo_sesion
+        sesion = SesionCaja(fecha_apertura=timezone.now())
+        self.assertEqual(periodo_sesion(sesion).filtro('fecha'), Q(fecha__gte=sesion.fecha_apertura))
+
+
+class PerfiladorConsultasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gerente = Usuario.objects.create_user(username='gerente_perfil', email='gerente_perfil@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.url = reverse('usuarios:perfil_consultas')
+
+    def test_huella_ignora_literales(self):
+        self.assertEqual(
+            huella("SELECT * FROM mesa WHERE id = 15 AND nombre = 'Mesa ''A''' AND x IN (%s, %s)"),
+            huella("SELECT * FROM mesa WHERE id = 7 AND nombre = 'B' AND x IN (%s)"),
+        )
+
+    @override_settings(PERFILADOR_CONSULTAS=True, PERFILADOR_MUESTREO=1.0)
+    def test_acumula_por_vista(self):
+        self.client.get(reverse('usuarios:agenda_pedidos'))
+        self.client.get(reverse('usuarios:agenda_pedidos'))
+        fila = next(f for f in reporte() if f['vista'] == 'usuarios:agenda_pedidos')
+        self.assertEqual(fila['peticiones'], 2)
+        self.assertGreater(fila['consultas'], 0)
+        self.assertEqual(fila['consultas_promedio'], fila['consultas'] / 2)
+        self.assertTrue(fila['lentas'])
+
+        datos = self.client.get(self.url).json()
+        self.assertIn('usuarios:agenda_pedidos', [f['vista'] for f in datos['vistas']])
+        # POST reinicia el perfil (solo queda el propio request del reporte)
+        self.client.post(self.url)
+        self.assertEqual([f['vista'] for f in reporte()], ['usuarios:perfil_consultas'])
+
+    @override_settings(PERFILADOR_CONSULTAS=True, PERFILADOR_MUESTREO=0.0)
+    def test_sin_muestreo_no_registra(self):
+        self.client.get(reverse('usuarios:agenda_pedidos'))
+        self.assertEqual(reporte(), [])
+
+    def test_apagado_por_defecto(self):
+        self.client.get(reverse('usuarios:agenda_pedidos'))
+        self.assertEqual(self.client.get(self.url).json()['vistas'], [])
+
+
+class GenerarDatosCargaTest(TestCase):
+
+    def test_historial_con_sus_fechas_y_resumenes(self):
+        from django.core.management import call_command
+        from hostal.models import Reserva
+        from pedidos.models import Factura, Pedido, VentaDiaria
+        from printer.models import PrintJob
+
+        call_command('generar_datos_carga', productos=20, insumos=10, dias=3, pedidos_por_dia=5, habitaciones=2,
+                     hasta='2025-01-31', semilla=1, stdout=StringIO())
+        dias = {timezone.localdate(f) for f in Pedido.objects.values_list('created_at', flat=True)}
+        self.assertTrue(dias)
+        self.assertTrue(dias <= {datetime.date(2025, 1, d) for d in (29, 30, 31)})
+        self.assertEqual(Factura.objects.count(), Pedido.objects.count())
+        self.assertEqual(PrintJob.objects.filter(status='completed').count(), 2 * Pedido.objects.count())
+        self.assertEqual(VentaDiaria.objects.aggregate(t=Sum('total'))['t'], Factura.objects.aggregate(t=Sum('total'))['t'])
+        self.assertTrue(Reserva.objects.exists())
+
+
+class ContadoresTest(TestCase):
+
+    def test_numeros_correlativos_por_clave(self):
+        from .contadores import clave_factura, siguiente
+        self.assertEqual([siguiente(clave_factura('001', '001')) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(siguiente(clave_factura('001', '002')), 1)
+        # Un bloque de 10 devuelve el último número del bloque
+        self.assertEqual(siguiente(clave_factura('001', '001'), 10), 13)
+
+    def test_rollback_no_deja_huecos(self):
+        from django.db import transaction
+        from .contadores import siguiente
+        siguiente('prueba')
+        try:
+            with transaction.atomic():
+                siguiente('prueba')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(siguiente('prueba'), 2)
+
+    def test_bloque_reservado_se_consume_primero(self):
+        from .contadores import reservar_bloque, siguiente_numero
+        bloque = reservar_bloque('prueba', 2, 'caja:1')
+        self.assertEqual((bloque.desde, bloque.hasta), (1, 2))
+        self.assertEqual(siguiente_numero('prueba', 'caja:2'), 3)  # otra caja no toca el bloque
+        self.assertEqual([siguiente_numero('prueba', 'caja:1') for _ in range(3)], [1, 2, 4])
+        bloque.refresh_from_db()
+        self.assertEqual(bloque.disponibles, 0)
+
+    def test_factura_y_trabajo_de_impresion_numerados(self):
+        from pedidos.models import Factura
+        from printer.models import PrintJob
+        datos = {'razon_social': 'X', 'ruc_ci': '9999999999999', 'subtotal': 1, 'total': 1, 'origen': 'hostal'}
+        primera = Factura.objects.create(tipo_comprobante='factura', **datos)
+        nota = Factura.objects.create(tipo_comprobante='nota_entrega', **datos)
+        segunda = Factura.objects.create(tipo_comprobante='factura', **datos)
+        self.assertEqual((primera.secuencial, nota.secuencial, segunda.secuencial), ('000000001', None, '000000002'))
+
+        hoy = f'{timezone.localdate():%Y%m%d}'
+        self.assertEqual([PrintJob.generate_job_number() for _ in range(2)],
+                         [f'PRINT-{hoy}-00001', f'PRINT-{hoy}-00002'])
+
+
+class BenchmarkHoraPicoTest(LiveServerTestCase):
+
+    def test_reporta_percentiles_por_endpoint(self):
+        import json
+        import tempfile
+        from django.core.management import call_command
+        from pedidos.models import Producto
+        from .benchmark import percentil
+
+        self.assertEqual(percentil([5, 1, 3, 2, 4], 50), 3)
+        self.assertEqual(percentil(list(range(1, 101)), 99), 99)
+
+        Producto.objects.create(nombre='Café', precio='1.50', stock=500)
+        with tempfile.NamedTemporaryFile(suffix='.json') as salida:
+            call_command('benchmark_hora_pico', url=self.live_server_url, duracion=3, meseros=1, cocinas=1, cajeros=1,
+                         pausa=0.05, sondeo=0.2, semilla=1, salida=salida.name, stdout=StringIO())
+            resultado = json.load(open(salida.name))
+        filas = {f['endpoint']: f for f in resultado['endpoints']}
+        self.assertIn('detalle_mesa', filas)
+        self.assertIn('agregar_producto', filas)
+        self.assertIn('agente_trabajos', filas)
+        self.assertEqual([f['endpoint'] for f in filas.values() if f['errores']], [])
+        self.assertTrue(all(f['p50_ms'] <= f['p95_ms'] <= f['p99_ms'] for f in filas.values()))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='fecha_evento',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -33,7 +33,7 @@ class Evento(models.Model):
     ]
 
     nombre = models.CharField(max_length=150, help_text="Ej: Boda Familia Pérez")
-    fecha_evento = models.DateTimeField()
+    fecha_evento = models.DateTimeField(db_index=True)
     hora_evento = models.TimeField(null=True, blank=True)
     personas = models.IntegerField(verbose_name="Cantidad de Personas (Pax)", default=10)
     tipo_servicio = models.CharField(max_length=50, choices=TIPO_SERVICIO, default='plato_servido')
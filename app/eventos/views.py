@@ -9,8 +9,10 @@ from django.utils import timezone
 from .models import Evento, DetalleMenu, ItemMenajeEvento, GastoEvento, IngresoEvento, Menaje
 from .forms import EventoForm, EventoCreateForm, DetalleMenuForm, CostoAdicionalForm, GastoEventoForm, IngresoEventoForm, ItemMenajeEventoForm
 from pedidos.models import Producto
+from inventario.costeo import anotar_costos
 import math
 from core.decorators import gerente_required
+from core.calendario import feed_calendario, rango_calendario
 
 @login_required
 @gerente_required
@@ -53,7 +55,7 @@ def simulador_evento(request, evento_id):
         'menaje_items': menaje_items,
         'gastos': evento.gastos.all(),
         'ingresos': evento.ingresos.all(),
-        'productos': Producto.objects.filter(disponible=True), # Para agregar platos
+        'productos': anotar_costos(Producto.objects.filter(disponible=True)), # Para agregar platos
         'categorias_gastos': categorias_gastos,
         'categorias_ingresos': categorias_ingresos,
         'all_menaje': all_menaje,
@@ -268,12 +270,17 @@ def agregar_item_menaje(request, evento_id):
     return redirect(f"{reverse('eventos:simulador_evento', args=[evento.id])}#menaje")
 
 # --- API JSON FOR CALENDAR ---
+def _eventos_calendario(inicio, fin):
+    # Todos los eventos menos los cancelados, solo dentro de la ventana visible
+    return Evento.objects.filter(fecha_evento__gte=inicio, fecha_evento__lt=fin).exclude(estado='cancelado')
+
 @login_required
 @gerente_required
+@feed_calendario(_eventos_calendario)
 def api_eventos(request):
-    # Retorna eventos para FullCalendar
-    # Mostrar TODOS los eventos menos los cancelados para debug
-    eventos = Evento.objects.exclude(estado='cancelado')
+    # Retorna eventos para FullCalendar (rango start/end que envía el calendario)
+    inicio, fin = rango_calendario(request)
+    eventos = _eventos_calendario(inicio, fin)
     events_data = []
     
     for evento in eventos:
@@ -4,3 +4,7 @@ class HostalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hostal'
     verbose_name = 'Gestión de Hostal'
+
+    def ready(self):
+        # Invalidación de la grilla de ocupación del calendario
+        import hostal.signals  # noqa: F401
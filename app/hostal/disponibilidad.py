@@ -0,0 +1,103 @@
+# 📁 hostal/disponibilidad.py
+# Motor de disponibilidad del hostal. La ocupación se decide por fechas
+# [checkin, checkout) de las reservas activas, no por Habitacion.estado; la
+# restricción de exclusión de Reserva (índice GiST) garantiza que nunca haya
+# dos reservas activas solapadas en la misma habitación.
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.periodos import inicio_dia
+from .models import ESTADOS_QUE_OCUPAN, Habitacion, Reserva
+
+
+class HabitacionNoDisponible(Exception):
+    """La habitación (o ninguna del tipo pedido) está libre en esas fechas."""
+
+
+def como_momento(valor):
+    """Fecha (o datetime ingenuo) de una reserva como momento aware: el día empieza a medianoche local."""
+    if isinstance(valor, datetime.datetime):
+        return valor if timezone.is_aware(valor) else timezone.make_aware(valor)
+    return inicio_dia(valor)
+
+
+def reservas_solapadas(checkin, checkout):
+    """Reservas activas que ocupan algún instante de [checkin, checkout)."""
+    return Reserva.objects.filter(
+        estado__in=ESTADOS_QUE_OCUPAN,
+        fecha_checkin__lt=como_momento(checkout),
+        fecha_checkout__gt=como_momento(checkin),
+    )
+
+
+def habitaciones_libres(checkin, checkout, tipo_id=None, excluir_reserva=None):
+    """Habitaciones sin reservas activas en [checkin, checkout) (una sola consulta)."""
+    ocupadas = reservas_solapadas(checkin, checkout).filter(habitacion=OuterRef('pk'))
+    if excluir_reserva is not None:
+        ocupadas = ocupadas.exclude(pk=excluir_reserva)
+    habitaciones = Habitacion.objects.filter(~Exists(ocupadas))
+    if como_momento(checkin) < inicio_dia(timezone.localdate() + datetime.timedelta(days=1)):
+        # Para entrar hoy la habitación además debe estar lista (no en limpieza / mantenimiento)
+        habitaciones = habitaciones.exclude(estado='limpieza')
+    if tipo_id:
+        habitaciones = habitaciones.filter(tipo_id=tipo_id)
+    return habitaciones.select_related('tipo').order_by('numero')
+
+
+def reservar(checkin, checkout, habitacion=None, tipo_id=None, **datos):
+    """
+    Crea la reserva en `habitacion` o en la primera libre del tipo `tipo_id`.
+    Lanza HabitacionNoDisponible si las fechas chocan con otra reserva activa.
+    """
+    checkin, checkout = como_momento(checkin), como_momento(checkout)
+    if checkout <= checkin:
+        raise ValueError("La fecha de salida debe ser posterior a la de entrada.")
+
+    try:
+        with transaction.atomic():
+            if habitacion is not None:
+                libre = habitaciones_libres(checkin, checkout).filter(pk=habitacion.pk).exists()
+                if not libre:
+                    raise HabitacionNoDisponible(
+                        f"La habitación {habitacion.numero} ya está reservada en esas fechas.")
+            else:
+                # skip_locked: dos recepcionistas a la vez reciben habitaciones distintas
+                habitacion = (habitaciones_libres(checkin, checkout, tipo_id=tipo_id)
+                              .select_for_update(skip_locked=True, of=('self',)).first())
+                if habitacion is None:
+                    raise HabitacionNoDisponible(
+                        "No hay habitaciones libres de este tipo para esas fechas.")
+            return Reserva.objects.create(
+                habitacion=habitacion, fecha_checkin=checkin, fecha_checkout=checkout, **datos)
+    except IntegrityError:
+        # Otra reserva ganó la carrera: la restricción de exclusión la rechazó
+        raise HabitacionNoDisponible(
+            f"La habitación {habitacion.numero} acaba de ser reservada para esas fechas.")
+
+
+def anotar_reservas(habitaciones):
+    """
+    Precarga reserva_actual y proxima_reserva de todas las habitaciones con dos
+    consultas (DISTINCT ON habitación) en vez de dos por habitación.
+    """
+    habitaciones = list(habitaciones)
+    ids = [h.pk for h in habitaciones]
+
+    actuales = {
+        r.habitacion_id: r for r in
+        Reserva.objects.filter(habitacion_id__in=ids, estado='checkin')
+        .select_related('huesped').order_by('habitacion_id', '-id').distinct('habitacion_id')
+    }
+    proximas = {
+        r.habitacion_id: r for r in
+        Reserva.objects.filter(habitacion_id__in=ids, estado='pendiente',
+                               fecha_checkin__gte=inicio_dia(timezone.localdate()))
+        .select_related('huesped').order_by('habitacion_id', 'fecha_checkin').distinct('habitacion_id')
+    }
+    for habitacion in habitaciones:
+        habitacion._reserva_actual = actuales.get(habitacion.pk)
+        habitacion._proxima_reserva = proximas.get(habitacion.pk)
+    return habitaciones
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hostal', '0007_remove_habitacion_codigo_porcentaje_iva_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reserva',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:10
+
+import logging
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import hostal.models
+from django.conf import settings
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def corregir_fechas_invertidas(apps, schema_editor):
+    # Reservas antiguas con salida anterior a la entrada violarían el CHECK
+    Reserva = apps.get_model('hostal', 'Reserva')
+    Reserva.objects.filter(fecha_checkout__lt=models.F('fecha_checkin')).update(
+        fecha_checkout=models.F('fecha_checkin'))
+
+
+
+def resolver_solapamientos(apps, schema_editor):
+    """
+    Antes se podía forzar una reserva sobre otra; la restricción no se crearía.
+    Por habitación gana la reserva ya hospedada (checkin) y luego la más
+    antigua; las pendientes que se le cruzan se cancelan y queda anotado.
+    Dos hospedajes (checkin) cruzados no se adivinan: la migración se detiene.
+    """
+    Reserva = apps.get_model('hostal', 'Reserva')
+    activas = (Reserva.objects.filter(estado__in=['pendiente', 'checkin'])
+               .order_by('habitacion_id', models.Case(models.When(estado='checkin', then=0), default=1), 'id'))
+    conservadas = {}
+    canceladas, conflictos = [], []
+    for reserva in activas:
+        if reserva.fecha_checkout <= reserva.fecha_checkin:
+            continue  # rango vacío: no se cruza con nada
+        cruce = next((r for r in conservadas.get(reserva.habitacion_id, [])
+                      if reserva.fecha_checkin < r.fecha_checkout and r.fecha_checkin < reserva.fecha_checkout), None)
+        if cruce is None:
+            conservadas.setdefault(reserva.habitacion_id, []).append(reserva)
+        elif reserva.estado == 'checkin':
+            conflictos.append((cruce.id, reserva.id))
+        else:
+            nota = f'[Migración] Cancelada por cruzarse con la reserva #{cruce.id}.'
+            reserva.estado = 'cancelada'
+            reserva.observaciones = f'{reserva.observaciones}\n{nota}' if reserva.observaciones else nota
+            canceladas.append(reserva)
+
+    if conflictos:
+        raise RuntimeError(
+            'Hay huéspedes hospedados (checkin) con fechas cruzadas en la misma habitación; '
+            'corrija estas reservas y vuelva a migrar: '
+            + ', '.join(f'#{a} y #{b}' for a, b in conflictos))
+    Reserva.objects.bulk_update(canceladas, ['estado', 'observaciones'])
+    for reserva in canceladas:
+        logger.warning('Reserva #%s cancelada por solapamiento (habitación %s)', reserva.id, reserva.habitacion_id)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hostal', '0008_reserva_created_at_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(corregir_fechas_invertidas, migrations.RunPython.noop),
+        migrations.RunPython(resolver_solapamientos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('estado__in', ['pendiente', 'checkin'])), expressions=[(hostal.models.TsTzRange('fecha_checkin', 'fecha_checkout', django.contrib.postgres.fields.ranges.RangeBoundary()), '&&'), (hostal.models.Int8Range('habitacion', 'habitacion', django.contrib.postgres.fields.ranges.RangeBoundary(inclusive_upper=True)), '&&')], name='reserva_sin_solapamiento'),
+        ),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.CheckConstraint(check=models.Q(('fecha_checkout__gte', models.F('fecha_checkin'))), name='reserva_checkout_posterior'),
+        ),
+    ]
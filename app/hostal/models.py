@@ -1,8 +1,28 @@
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeBoundary, RangeOperators
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
 from clientes.models import Cliente
 
+
+# Estados de Reserva que ocupan la habitación en su rango de fechas
+ESTADOS_QUE_OCUPAN = ['pendiente', 'checkin']
+
+
+class TsTzRange(models.Func):
+    # tstzrange(checkin, checkout, '[)') para la restricción de solapamiento
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class Int8Range(models.Func):
+    # int8range(id, id, '[]'): la habitación como rango de un solo valor, así la
+    # restricción usa solo operadores de rango nativos de GiST (sin btree_gist)
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+
 class TipoHabitacion(models.Model):
     nombre = models.CharField(max_length=50)  # Ej: Simple, Doble, Matrimonial
     descripcion = models.TextField(blank=True, null=True)
@@ -43,16 +63,23 @@ class Habitacion(models.Model):
             return self.precio_personalizado
         return self.tipo.precio_persona if self.tipo else 0
         
+    # Si la vista precargó las reservas en lote (hostal/disponibilidad.py -> anotar_reservas)
+    # las propiedades no consultan la BD por habitación.
     @property
     def reserva_actual(self):
+        if hasattr(self, '_reserva_actual'):
+            return self._reserva_actual
         return self.reservas.filter(estado='checkin').order_by('-id').first()
 
     @property
     def proxima_reserva(self):
+        if hasattr(self, '_proxima_reserva'):
+            return self._proxima_reserva
         from django.utils import timezone
+        from core.periodos import inicio_dia
         return self.reservas.filter(
             estado='pendiente', 
-            fecha_checkin__date__gte=timezone.localdate()
+            fecha_checkin__gte=inicio_dia(timezone.localdate())
         ).order_by('fecha_checkin').first()
 
 class Huesped(models.Model):
@@ -90,7 +117,33 @@ class Reserva(models.Model):
     pagado = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     observaciones = models.TextField(blank=True, null=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Fechas leídas de la BD: hostal/signals.py invalida también los meses de origen
+        instance._fechas_originales = (instance.__dict__.get('fecha_checkin'), instance.__dict__.get('fecha_checkout'))
+        return instance
+
+    class Meta:
+        constraints = [
+            # Dos reservas activas de la misma habitación no pueden solaparse en [checkin, checkout).
+            # El índice GiST de la restricción es el que usa hostal/disponibilidad.py
+            ExclusionConstraint(
+                name='reserva_sin_solapamiento',
+                expressions=[
+                    (TsTzRange('fecha_checkin', 'fecha_checkout', RangeBoundary()), RangeOperators.OVERLAPS),
+                    (Int8Range('habitacion', 'habitacion', RangeBoundary(inclusive_upper=True)),
+                     RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(estado__in=ESTADOS_QUE_OCUPAN),
+            ),
+            models.CheckConstraint(
+                check=models.Q(fecha_checkout__gte=models.F('fecha_checkin')),
+                name='reserva_checkout_posterior',
+            ),
+        ]
 
     def __str__(self):
         return f"Reserva {self.id} - {self.huesped} - Hab {self.habitacion.numero}"
@@ -0,0 +1,135 @@
+# 📁 hostal/ocupacion.py
+# Grilla de ocupación (habitación × día) del calendario de reservas en JSON.
+# Cada mes tiene un número de versión en caché; guardar o borrar una Reserva
+# incrementa solo los meses que toca, así una grilla de varios meses sigue
+# cacheada (y el navegador recibe 304) mientras no cambie nada en su ventana.
+import datetime
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.periodos import inicio_dia
+from .models import Habitacion, Reserva
+
+# Estados que se dibujan en el calendario (las canceladas y finalizadas no)
+ESTADOS_VISIBLES = ['pendiente', 'checkin']
+MAX_MESES = 6
+VERSION_GENERAL_KEY = 'hostal_ocupacion_v:general'
+GRILLA_TTL = 60 * 60 * 24
+
+
+def _clave_mes(mes):
+    return f'hostal_ocupacion_v:{mes:%Y-%m}'
+
+
+def _sumar_meses(mes, cantidad):
+    total = mes.year * 12 + mes.month - 1 + cantidad
+    return datetime.date(total // 12, total % 12 + 1, 1)
+
+
+def meses_entre(desde, hasta):
+    """Primer día de cada mes que toca el rango de fechas [desde, hasta]."""
+    mes, ultimo = desde.replace(day=1), hasta.replace(day=1)
+    meses = []
+    while mes <= ultimo:
+        meses.append(mes)
+        mes = _sumar_meses(mes, 1)
+    return meses
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 2, None)
+
+
+def _incrementar_versiones(claves):
+    for clave in claves:
+        _incrementar(clave)
+
+
+def invalidar_ocupacion(*rangos):
+    """
+    Descarta las grillas de los meses tocados por los rangos (checkin, checkout)
+    dados; sin rangos (cambió una habitación o un huésped) descarta todas.
+    Se repite al confirmar la transacción, como invalidar_menu().
+    """
+    if rangos:
+        claves = {_clave_mes(mes) for desde, hasta in rangos for mes in meses_entre(desde, hasta)}
+    else:
+        claves = {VERSION_GENERAL_KEY}
+    _incrementar_versiones(claves)
+    transaction.on_commit(lambda: _incrementar_versiones(claves))
+
+
+def ventana(desde, meses):
+    """Meses [desde, desde + meses) recortados a MAX_MESES."""
+    meses = max(1, min(int(meses), MAX_MESES))
+    desde = desde.replace(day=1)
+    return desde, _sumar_meses(desde, meses)
+
+
+def etag_grilla(desde, hasta):
+    """Huella de la ventana: versión general + versión de cada mes (una lectura a la caché)."""
+    claves = [VERSION_GENERAL_KEY] + [_clave_mes(mes) for mes in meses_entre(desde, hasta - datetime.timedelta(days=1))]
+    versiones = cache.get_many(claves)
+    partes = [desde.isoformat(), hasta.isoformat()] + [str(versiones.get(clave, 1)) for clave in claves]
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:20]
+
+
+def _indice(fecha, desde, dias):
+    return max(0, min((fecha - desde).days, dias))
+
+
+def construir_grilla(desde, hasta):
+    """
+    {desde, hasta (exclusivo), dias, habitaciones: [{id, numero, tipo, estado,
+    reservas: [{id, huesped, estado, inicio, fin, ...}]}]} con `inicio`/`fin`
+    como índices de día dentro de la ventana (fin = día de salida, exclusivo).
+    """
+    dias = (hasta - desde).days
+    habitaciones = list(Habitacion.objects.select_related('tipo').order_by('numero'))
+    filas = {
+        h.pk: {'id': h.pk, 'numero': h.numero, 'tipo': h.tipo.nombre if h.tipo else '',
+               'estado': h.estado, 'reservas': []}
+        for h in habitaciones
+    }
+    reservas = (Reserva.objects
+                .filter(estado__in=ESTADOS_VISIBLES,
+                        fecha_checkin__lt=inicio_dia(hasta), fecha_checkout__gte=inicio_dia(desde))
+                .select_related('huesped').order_by('fecha_checkin'))
+    for reserva in reservas:
+        fila = filas.get(reserva.habitacion_id)
+        if fila is None:
+            continue
+        entrada = timezone.localdate(reserva.fecha_checkin)
+        salida = timezone.localdate(reserva.fecha_checkout)
+        fila['reservas'].append({
+            'id': reserva.pk,
+            'huesped': reserva.huesped.nombre_completo,
+            'estado': reserva.estado,
+            'inicio': _indice(entrada, desde, dias),
+            'fin': _indice(salida, desde, dias),
+            'empieza_antes': entrada < desde,
+            'sigue_despues': salida >= hasta,
+        })
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': dias,
+        'habitaciones': [filas[h.pk] for h in habitaciones],
+    }
+
+
+def grilla_ocupacion(desde, hasta, etag=None):
+    """construir_grilla() cacheada por la huella de la ventana."""
+    etag = etag or etag_grilla(desde, hasta)
+    clave = f'hostal_ocupacion:{etag}'
+    grilla = cache.get(clave)
+    if grilla is None:
+        grilla = construir_grilla(desde, hasta)
+        cache.set(clave, grilla, GRILLA_TTL)
+    return grilla
@@ -0,0 +1,45 @@
+# 📁 hostal/signals.py
+# Invalida la grilla cacheada del calendario de reservas (hostal/ocupacion.py)
+import datetime
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Habitacion, Huesped, Reserva
+from .ocupacion import invalidar_ocupacion
+
+
+def _fecha(valor):
+    # actualizar_reserva asigna fechas sin hora; el resto de vistas, datetimes aware
+    if isinstance(valor, datetime.datetime):
+        return timezone.localdate(valor) if timezone.is_aware(valor) else valor.date()
+    return valor
+
+
+def _rango(checkin, checkout):
+    if checkin is None or checkout is None:
+        return None
+    return _fecha(checkin), _fecha(checkout)
+
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+def reserva_modificada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Meses de las fechas actuales y de las leídas de la BD (si la reserva se movió)
+    rangos = {_rango(instance.fecha_checkin, instance.fecha_checkout),
+              _rango(*getattr(instance, '_fechas_originales', (None, None)))}
+    rangos.discard(None)
+    if rangos:
+        invalidar_ocupacion(*rangos)
+    instance._fechas_originales = (instance.fecha_checkin, instance.fecha_checkout)
+
+
+@receiver(post_save, sender=Habitacion)
+@receiver(post_delete, sender=Habitacion)
+@receiver(post_save, sender=Huesped)
+def habitacion_o_huesped_modificado(sender, raw=False, **kwargs):
+    if not raw:
+        invalidar_ocupacion()
@@ -0,0 +1,196 @@
+import datetime
+from importlib import import_module
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.pruebas import PresupuestoConsultasMixin
+from usuarios.models import Usuario
+
+from hostal.disponibilidad import HabitacionNoDisponible, anotar_reservas, habitaciones_libres, reservar
+from hostal.models import Habitacion, Huesped, Reserva, TipoHabitacion
+
+
+class DisponibilidadTest(TestCase):
+
+    def setUp(self):
+        self.doble = TipoHabitacion.objects.create(nombre='Doble', precio_persona='20.00', capacidad_personas=2)
+        self.h101 = Habitacion.objects.create(numero='101', tipo=self.doble)
+        self.h102 = Habitacion.objects.create(numero='102', tipo=self.doble)
+        self.huesped = Huesped.objects.create(nombre_completo='Ana Pérez', documento_identidad='0102030405')
+        self.dia = timezone.localdate() + datetime.timedelta(days=10)
+
+    def _reservar(self, desde, noches, **extra):
+        extra.setdefault('habitacion', self.h101)
+        return reservar(self.dia + datetime.timedelta(days=desde), self.dia + datetime.timedelta(days=desde + noches),
+                        huesped=self.huesped, precio_total='40.00', **extra)
+
+    def test_no_se_solapan_reservas_de_la_misma_habitacion(self):
+        self._reservar(0, 3)
+        with self.assertRaises(HabitacionNoDisponible):
+            self._reservar(2, 2)
+        # Salida y entrada el mismo día no chocan: el rango es [checkin, checkout)
+        self._reservar(3, 1)
+        self.assertEqual(Reserva.objects.filter(habitacion=self.h101).count(), 2)
+
+    def test_la_restriccion_rechaza_solapamientos_fuera_del_motor(self):
+        reserva = self._reservar(0, 3)
+        with self.assertRaises(Exception):
+            Reserva.objects.create(habitacion=self.h101, huesped=self.huesped, precio_total=0,
+                                   fecha_checkin=reserva.fecha_checkin + datetime.timedelta(days=1),
+                                   fecha_checkout=reserva.fecha_checkout)
+
+    def test_editar_fechas_que_chocan_no_cambia_la_habitacion(self):
+        self._reservar(0, 3)
+        segunda = self._reservar(3, 2)
+        estado_habitacion = self.h101.estado
+        gerente = Usuario.objects.create_user(username='gerente_res', email='gerente_res@test.com', password='x', rol='gerente')
+        self.client.force_login(gerente)
+        self.client.post(reverse('hostal:actualizar_reserva', args=[segunda.id]), {
+            'fecha_checkin': (self.dia + datetime.timedelta(days=1)).isoformat(),
+            'estado': 'checkin', 'precio_total': '40.00', 'pagado': '0', 'cantidad_personas': '1'})
+
+        segunda.refresh_from_db()
+        self.h101.refresh_from_db()
+        self.assertEqual(segunda.estado, 'pendiente')
+        self.assertEqual(self.h101.estado, estado_habitacion)
+
+        # Fechas válidas: se guardan como medianoche local (datetime con zona)
+        self.client.post(reverse('hostal:actualizar_reserva', args=[segunda.id]), {
+            'fecha_checkout': (self.dia + datetime.timedelta(days=6)).isoformat(),
+            'precio_total': '60.00', 'pagado': '0', 'cantidad_personas': '1'})
+        segunda.refresh_from_db()
+        self.assertEqual(timezone.localtime(segunda.fecha_checkout).date(), self.dia + datetime.timedelta(days=6))
+        self.assertEqual(timezone.localtime(segunda.fecha_checkout).hour, 0)
+
+    def test_reserva_cancelada_libera_la_habitacion(self):
+        reserva = self._reservar(0, 3)
+        Reserva.objects.filter(pk=reserva.pk).update(estado='cancelada')
+        self.assertEqual(self._reservar(1, 1).habitacion, self.h101)
+
+    def test_asigna_la_primera_libre_del_tipo(self):
+        self._reservar(0, 2)
+        libres = habitaciones_libres(self.dia, self.dia + datetime.timedelta(days=1), tipo_id=self.doble.id)
+        self.assertEqual(list(libres), [self.h102])
+        self.assertEqual(self._reservar(0, 1, habitacion=None, tipo_id=self.doble.id).habitacion, self.h102)
+        with self.assertRaises(HabitacionNoDisponible):
+            self._reservar(0, 1, habitacion=None, tipo_id=self.doble.id)
+
+    def test_anotar_reservas_usa_consultas_constantes(self):
+        for numero in range(103, 110):
+            Habitacion.objects.create(numero=str(numero), tipo=self.doble)
+        proxima = self._reservar(0, 2)
+        actual = Reserva.objects.create(
+            habitacion=self.h102, huesped=self.huesped, precio_total=0, estado='checkin',
+            fecha_checkin=timezone.now(), fecha_checkout=timezone.now() + datetime.timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as consultas:
+            habitaciones = {h.numero: h for h in anotar_reservas(Habitacion.objects.order_by('numero'))}
+            self.assertEqual(habitaciones['101'].proxima_reserva, proxima)
+            self.assertEqual(habitaciones['102'].reserva_actual, actual)
+            self.assertIsNone(habitaciones['105'].reserva_actual)
+        self.assertEqual(len(consultas), 3)
+
+
+class MigracionSolapamientoTest(TestCase):
+
+    def test_reservas_cruzadas_existentes_se_resuelven_antes_de_la_restriccion(self):
+        migracion = import_module('hostal.migrations.0009_reserva_sin_solapamiento')
+        restriccion = next(c for c in Reserva._meta.constraints if c.name == 'reserva_sin_solapamiento')
+        # Base anterior a la migración: sin la restricción
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(Reserva, restriccion)
+
+        tipo = TipoHabitacion.objects.create(nombre='Simple', precio_persona='15.00', capacidad_personas=1)
+        h1, h2 = (Habitacion.objects.create(numero=n, tipo=tipo) for n in ('201', '202'))
+        huesped = Huesped.objects.create(nombre_completo='Luis Mora', documento_identidad='0908070605')
+        dia = timezone.now().replace(microsecond=0)
+
+        def reserva(habitacion, desde, hasta, estado='pendiente'):
+            return Reserva.objects.create(huesped=huesped, habitacion=habitacion, estado=estado, precio_total='15.00',
+                                          fecha_checkin=dia + datetime.timedelta(days=desde),
+                                          fecha_checkout=dia + datetime.timedelta(days=hasta))
+
+        primera = reserva(h1, 0, 3)
+        forzada = reserva(h1, 1, 3)
+        hospedado = reserva(h1, 2, 4, estado='checkin')  # el huésped en la habitación gana
+        otra_habitacion = reserva(h2, 0, 3)
+
+        with self.assertLogs(migracion.logger, 'WARNING') as registro:
+            migracion.resolver_solapamientos(apps, None)
+        self.assertEqual(len(registro.records), 2)
+        estados = dict(Reserva.objects.values_list('id', 'estado'))
+        self.assertEqual(estados, {primera.id: 'cancelada', forzada.id: 'cancelada',
+                                   hospedado.id: 'checkin', otra_habitacion.id: 'pendiente'})
+        self.assertIn(f'#{hospedado.id}', Reserva.objects.get(pk=primera.pk).observaciones)
+
+        # Dos hospedajes cruzados no se resuelven solos
+        Reserva.objects.filter(pk=primera.pk).update(estado='checkin')
+        with self.assertRaisesMessage(RuntimeError, f'#{primera.id} y #{hospedado.id}'):
+            migracion.resolver_solapamientos(apps, None)
+
+
+class OcupacionReservasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gerente = Usuario.objects.create_user(username='gerente_hostal', email='gerente_hostal@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.h101 = Habitacion.objects.create(numero='101')
+        self.huesped = Huesped.objects.create(nombre_completo='Ana Pérez')
+        # Del 30 de marzo al 2 de abril: toca dos meses
+        self.reserva = reservar(datetime.date(2031, 3, 30), datetime.date(2031, 4, 2), habitacion=self.h101,
+                                huesped=self.huesped, precio_total='40.00')
+
+    def _pedir(self, desde, meses=1, **headers):
+        return self.client.get(reverse('hostal:ocupacion_reservas'), {'desde': desde, 'meses': meses}, **headers)
+
+    def test_grilla_de_varios_meses(self):
+        grilla = self._pedir('2031-03', meses=2).json()
+        self.assertEqual((grilla['desde'], grilla['hasta'], grilla['dias']), ('2031-03-01', '2031-05-01', 61))
+        [reserva] = grilla['habitaciones'][0]['reservas']
+        self.assertEqual((reserva['id'], reserva['inicio'], reserva['fin']), (self.reserva.id, 29, 32))
+
+    def test_etag_solo_cambia_si_cambia_una_reserva_de_la_ventana(self):
+        etag_marzo, etag_mayo = self._pedir('2031-03')['ETag'], self._pedir('2031-05')['ETag']
+        self.assertEqual(self._pedir('2031-03', HTTP_IF_NONE_MATCH=etag_marzo).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reserva.estado = 'cancelada'
+            self.reserva.save()
+
+        self.assertEqual(self._pedir('2031-03', HTTP_IF_NONE_MATCH=etag_marzo).status_code, 200)
+        self.assertEqual(self._pedir('2031-05', HTTP_IF_NONE_MATCH=etag_mayo).status_code, 304)
+        self.assertEqual(self._pedir('2031-03').json()['habitaciones'][0]['reservas'], [])
+
+
+class PresupuestoCalendarioReservasTest(PresupuestoConsultasMixin, TestCase):
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create_user(username='gerente_budget', email='gerente_budget@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.doble = TipoHabitacion.objects.create(nombre='Doble', precio_persona='20.00', capacidad_personas=2)
+        self.huesped = Huesped.objects.create(nombre_completo='Ana Pérez')
+        self.sembrar(2)
+
+    def sembrar(self, cantidad):
+        """Habitaciones con dos reservas cada una dentro de marzo de 2031."""
+        for _ in range(cantidad):
+            habitacion = Habitacion.objects.create(numero=str(100 + Habitacion.objects.count()), tipo=self.doble)
+            for dia in (3, 20):
+                reservar(datetime.date(2031, 3, dia), datetime.date(2031, 3, dia + 2), habitacion=habitacion,
+                         huesped=self.huesped, precio_total='40.00')
+
+    def test_calendario_reservas(self):
+        pedir = lambda: self.client.get(reverse('hostal:calendario_reservas'), {'year': 2031, 'month': 3})
+        self.comparar_consultas(6, self.sembrar, pedir)
+        contexto = pedir().context
+        self.assertEqual((contexto['year'], contexto['month']), (2031, 3))  # el mes sembrado
+
+    def test_ocupacion_reservas(self):
+        self.comparar_consultas(8, self.sembrar, lambda: self.client.get(reverse('hostal:ocupacion_reservas'), {'desde': '2031-03', 'meses': 3}))
@@ -10,6 +10,7 @@ urlpatterns = [
     path('modal-nueva-reserva/', views.modal_nueva_reserva, name='modal_nueva_reserva'),
     path('procesar-checkin/', views.procesar_checkin, name='procesar_checkin'),
     path('reservas/', views.calendario_reservas, name='calendario_reservas'),
+    path('reservas/ocupacion/', views.ocupacion_reservas, name='ocupacion_reservas'),
     path('nueva-reserva/', views.crear_reserva, name='crear_reserva'),
     path('reservas/cancelar/<int:reserva_id>/', views.cancelar_reserva, name='cancelar_reserva'),
     path('procesar-checkout/<int:habitacion_id>/', views.realizar_checkout, name='realizar_checkout'),
@@ -6,26 +6,38 @@ from django.contrib import messages
 from .models import Habitacion, Reserva, Huesped, TipoHabitacion
 
 from core.decorators import gerente_required
-from django.http import HttpResponse
+from core.periodos import periodo_dia, periodo_dias, periodo_sesion
+from django.db import IntegrityError, transaction
+from .disponibilidad import HabitacionNoDisponible, anotar_reservas, como_momento, habitaciones_libres, reservar
+from datetime import date
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .ocupacion import etag_grilla, grilla_ocupacion, ventana
 from .models import Habitacion, Reserva, Huesped, TipoHabitacion, SesionCajaHostal
 from caja.models import Gasto
 from django.db.models import Sum, Count
 
+# Meses que el calendario pide de una vez (navegar dentro de ellos no llama al servidor)
+MESES_POR_CARGA = 3
+
+
 @login_required
 @gerente_required
 def dashboard_hostal(request):
-    habitaciones = Habitacion.objects.all().order_by('numero')
+    # Reserva actual y próxima de todas las habitaciones en lote (no una consulta por tarjeta)
+    habitaciones = anotar_reservas(Habitacion.objects.select_related('tipo').order_by('numero'))
     tipos = TipoHabitacion.objects.all()
 
     # Calcular KPIs
-    ocupadas = habitaciones.filter(estado='ocupada').count()
-    total = habitaciones.count()
+    ocupadas = sum(1 for h in habitaciones if h.estado == 'ocupada')
+    total = len(habitaciones)
     ocupacion_pct = int((ocupadas / total) * 100) if total > 0 else 0
 
     # Entradas/Salidas Hoy
-    hoy = timezone.now().date()
-    entradas = Reserva.objects.filter(fecha_checkin__date=hoy).count()
-    salidas  = Reserva.objects.filter(fecha_checkout__date=hoy).count()
+    hoy = timezone.localdate()
+    entradas = Reserva.objects.filter(periodo_dia(hoy).filtro('fecha_checkin')).count()
+    salidas  = Reserva.objects.filter(periodo_dia(hoy).filtro('fecha_checkout')).count()
 
     # Verificar si hay caja abierta
     caja_abierta = SesionCajaHostal.objects.filter(estado=True).first()
@@ -147,12 +159,11 @@ def procesar_checkin(request):
             # Cobro por PERSONA (no por noche como antes)
             total = precio_persona_final * personas
             
-            # 3. Crear Reserva
-            reserva = Reserva.objects.create(
-                huesped=huesped,
+            # 3. Crear Reserva (falla si choca con una reserva futura de la habitación)
+            reserva = reservar(
+                checkin, checkout,
                 habitacion=habitacion,
-                fecha_checkin=timezone.now(),
-                fecha_checkout=timezone.now() + timezone.timedelta(days=noches),
+                huesped=huesped,
                 cantidad_personas=personas,
                 precio_total=total,
                 pagado=total,
@@ -166,106 +177,68 @@ def procesar_checkin(request):
             
             messages.success(request, f'Check-In exitoso. Habitación {habitacion.numero} ocupada por {nombre}.')
             
+        except HabitacionNoDisponible as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f"Error al procesar check-in: {str(e)}")
             
     return redirect('hostal:dashboard_hostal')
 
+def _mes_pedido(request):
+    """Primer día del mes pedido (?desde=AAAA-MM o ?year=&month=); por defecto el actual."""
+    hoy = timezone.localdate()
+    try:
+        if request.GET.get('desde'):
+            anio, mes = (int(parte) for parte in request.GET['desde'].split('-')[:2])
+        else:
+            anio = int(request.GET.get('year', hoy.year))
+            mes = int(request.GET.get('month', hoy.month))
+        return date(anio, mes, 1)
+    except (TypeError, ValueError):
+        return hoy.replace(day=1)
+
+
+def _ventana_ocupacion(request):
+    if not hasattr(request, '_ventana_ocupacion'):
+        try:
+            meses = int(request.GET.get('meses', 1))
+        except ValueError:
+            meses = 1
+        request._ventana_ocupacion = ventana(_mes_pedido(request), meses)
+    return request._ventana_ocupacion
+
+
+def _etag_ocupacion(request):
+    if not hasattr(request, '_etag_ocupacion'):
+        request._etag_ocupacion = etag_grilla(*_ventana_ocupacion(request))
+    return request._etag_ocupacion
+
+
 @login_required
 @gerente_required
 def calendario_reservas(request):
-    year = int(request.GET.get('year', timezone.now().year))
-    month = int(request.GET.get('month', timezone.now().month))
-    
-    # Calcular días del mes
-    import calendar
-    from datetime import date
-    _, num_days = calendar.monthrange(year, month)
-    
-    days_data = []
-    hoy = timezone.now().date()
-    
-    # Nombres de días en español
-    dias_semana = ['LUN', 'MAR', 'MIÉ', 'JUE', 'VIE', 'SÁB', 'DOM']
-    
-    for d in range(1, num_days + 1):
-        fecha_actual = date(year, month, d)
-        es_hoy = (fecha_actual == hoy)
-        es_finde = (fecha_actual.weekday() >= 5) # 5=Sat, 6=Sun
-        
-        days_data.append({
-            'num': d,
-            'name': dias_semana[fecha_actual.weekday()],
-            'is_today': es_hoy,
-            'is_weekend': es_finde,
-            'full_date': fecha_actual
-        })
-    
-    # Obtener reservas que se solapan con este mes
-    import calendar
-    from datetime import date
-    
-    habitaciones = Habitacion.objects.all().order_by('numero')
-    import calendar
-    from datetime import date
-    
-    first_day = date(year, month, 1)
-    last_day = date(year, month, num_days)
-    
-    reservas_qs = Reserva.objects.filter(
-        fecha_checkin__lte=last_day,
-        fecha_checkout__gte=first_day
-    ).exclude(estado__in=['cancelada', 'checkout']).select_related('huesped', 'habitacion')
-    
-    # Estructura para fácil acceso en template: { hab_id: [eventos] }
-    eventos_por_habitacion = {}
-    
-    for hab in habitaciones:
-        eventos_por_habitacion[hab.id] = []
-        
-    for res in reservas_qs:
-        # Calcular inicio y fin visual (limitado al mes actual)
-        start_date = res.fecha_checkin.date()
-        end_date = res.fecha_checkout.date()
-        
-        # Ajustar bordes
-        visible_start = max(start_date, first_day)
-        visible_end = min(end_date, last_day)
-        
-        # Calcular posición (1-based para CSS grid o calc)
-        start_day_num = visible_start.day
-        duration_days = (visible_end - visible_start).days + 1
-        
-        # Determine Color based on Status
-        if res.estado == 'checkin':
-            color = '#8B5CF6' # Purple (Active)
-        elif res.estado == 'checkout':
-            color = '#9CA3AF' # Gray (History)
-        else:
-            color = '#F59E0B' # Orange (Pending)
-
-        evento = {
-            'id': res.id,
-            'huesped': res.huesped.nombre_completo,
-            'start_day': start_day_num,
-            'duration': duration_days,
-            'color': color,
-            'status': res.estado,
-            'cancellable': res.estado != 'checkout'
-        }
-        
-        if res.habitacion_id in eventos_por_habitacion:
-            eventos_por_habitacion[res.habitacion_id].append(evento)
-    
-    context = {
-        'habitaciones': habitaciones,
-        'eventos_por_habitacion': eventos_por_habitacion, # Nueva estructura
-        'year': year,
-        'month': month,
-        'days': days_data,
-        'month_name': calendar.month_name[month],
-    }
-    return render(request, 'hostal/calendario_reservas.html', context)
+    # La grilla se dibuja en el navegador con ocupacion_reservas (JSON, varios meses por llamada)
+    mes = _mes_pedido(request)
+    return render(request, 'hostal/calendario_reservas.html', {
+        'year': mes.year,
+        'month': mes.month,
+        'meses_por_carga': MESES_POR_CARGA,
+    })
+
+
+@login_required
+@gerente_required
+@condition(etag_func=lambda request: _etag_ocupacion(request))
+def ocupacion_reservas(request):
+    """
+    Grilla habitación × día de ?desde=AAAA-MM durante ?meses=N (máx. 6).
+    Responde 304 mientras ninguna reserva de la ventana cambie.
+    """
+    desde, hasta = _ventana_ocupacion(request)
+    response = JsonResponse(grilla_ocupacion(desde, hasta, etag=_etag_ocupacion(request)))
+    # El navegador revalida siempre con If-None-Match (no reutiliza sin preguntar)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 @gerente_required
@@ -317,21 +290,15 @@ def crear_reserva(request):
                 huesped.telefono = telefono
                 huesped.save()
 
-            # Asignar Habitación
+            # Asignar Habitación (la disponibilidad se valida por fechas en reservar())
             habitacion = None
             if habitacion_id:
                 habitacion = get_object_or_404(Habitacion, id=habitacion_id)
-                # Validar disponibilidad (simple check for now)
-                if habitacion.estado != 'disponible':
-                    # TODO: Mejorar validación con fechas reales
-                    messages.warning(request, f"La habitación {habitacion.numero} figura como {habitacion.estado}, pero se forza la reserva.")
             elif tipo_id:
-                # Auto-assign available room of this type
-                # Esto es simple: busca la primera disponible. 
-                # En un sistema real, chequearía solapamiento de fechas.
-                habitacion = Habitacion.objects.filter(tipo_id=tipo_id, estado='disponible').first()
+                # Para el precio: cualquiera libre del tipo; la asignación final la hace reservar()
+                habitacion = habitaciones_libres(checkin, checkout, tipo_id=tipo_id).first()
                 if not habitacion:
-                     messages.error(request, "No hay habitaciones disponibles de este tipo actualmente.")
+                     messages.error(request, "No hay habitaciones libres de este tipo para esas fechas.")
                      return redirect('hostal:crear_reserva')
             
             if not habitacion:
@@ -358,25 +325,31 @@ def crear_reserva(request):
             
             if checkin == hoy:
                 estado_reserva = 'checkin'
-                habitacion.estado = 'ocupada'
-                habitacion.save()
-                msg_success = f"Check-In realizado automáticamente para {nombre} en Hab. {habitacion.numero}"
-            else:
-                msg_success = f"Reserva confirmada para el {checkin} en Hab. {habitacion.numero}"
 
-            reserva = Reserva.objects.create(
+            reserva = reservar(
+                checkin, checkout,
+                habitacion=habitacion if habitacion_id else None,
+                tipo_id=None if habitacion_id else tipo_id,
                 huesped=huesped,
-                habitacion=habitacion,
-                fecha_checkin=checkin,
-                fecha_checkout=checkout,
                 cantidad_personas=personas,
                 estado=estado_reserva,
                 precio_total=total
             )
+            habitacion = reserva.habitacion
+
+            if estado_reserva == 'checkin':
+                habitacion.estado = 'ocupada'
+                habitacion.save()
+                msg_success = f"Check-In realizado automáticamente para {nombre} en Hab. {habitacion.numero}"
+            else:
+                msg_success = f"Reserva confirmada para el {checkin} en Hab. {habitacion.numero}"
 
             messages.success(request, msg_success)
             return redirect('hostal:dashboard_hostal')
 
+        except HabitacionNoDisponible as e:
+            messages.error(request, str(e))
+            return redirect('hostal:crear_reserva')
         except Exception as e:
             messages.error(request, f"Error al crear reserva: {str(e)}")
             return redirect('hostal:crear_reserva')
@@ -438,17 +411,18 @@ def finanzas_hostal(request):
     from django.db.models import Sum, Count
     from django.db.models.functions import TruncMonth
     
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     mes_actual = hoy.month
     anio_actual = hoy.year
     
     # Base Query: Reservas activas o finalizadas (excluir canceladas)
     reservas = Reserva.objects.exclude(estado='cancelada')
     
-    # 1. Ingresos Hoy (Check-ins creados hoy)
-    q_hoy = reservas.filter(created_at__date=hoy).aggregate(
+    # 1. Ingresos Hoy (Check-ins creados hoy) y 3. Huéspedes Hoy, en una sola consulta
+    q_hoy = reservas.filter(periodo_dia(hoy).filtro('created_at')).aggregate(
         total=Sum('precio_total'), 
-        cant=Count('id')
+        cant=Count('id'),
+        total_h=Sum('cantidad_personas')
     )
     total_hoy = float(q_hoy['total'] or 0)
     
@@ -456,9 +430,7 @@ def finanzas_hostal(request):
     reservas_activas = int(Reserva.objects.filter(estado='checkin').count())
     
     # 3. Huéspedes Hoy (Suma de personas en reservas de hoy)
-    huespedes_hoy = int(reservas.filter(created_at__date=hoy).aggregate(
-        total_h=Sum('cantidad_personas')
-    )['total_h'] or 0)
+    huespedes_hoy = int(q_hoy['total_h'] or 0)
     
     # 4. Listado Reciente (Últimas 50) con el usuario incluido
     ultimas_reservas = reservas.select_related('huesped', 'habitacion', 'usuario').order_by('-created_at')[:50]
@@ -510,7 +482,7 @@ def gestion_habitaciones(request):
         messages.success(request, f'Habitación {habitacion.numero} actualizada correctamente.')
         return redirect('hostal:gestion_habitaciones')
 
-    habitaciones = Habitacion.objects.all().order_by('numero')
+    habitaciones = anotar_reservas(Habitacion.objects.select_related('tipo').order_by('numero'))
     tipos = TipoHabitacion.objects.all()
     return render(request, 'hostal/gestion_habitaciones.html', {
         'habitaciones': habitaciones,
@@ -602,7 +574,7 @@ def reportes_hostal(request):
     from datetime import date, timedelta
     from django.utils.dateparse import parse_date
 
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     filtro = request.GET.get('filtro', '')
     fecha_inicio_str = request.GET.get('fecha_inicio')
     fecha_fin_str = request.GET.get('fecha_fin')
@@ -611,27 +583,22 @@ def reportes_hostal(request):
     cajas_recientes = SesionCajaHostal.objects.all().order_by('-fecha_apertura')[:10]
     sesion_filtrada = None
 
+    periodo = None
     if filtro == 'hoy':
-        reservas = reservas_base.filter(created_at__date=hoy)
+        periodo = periodo_dia(hoy)
     elif filtro == 'ayer':
-        reservas = reservas_base.filter(created_at__date=hoy - timedelta(days=1))
+        periodo = periodo_dia(hoy - timedelta(days=1))
     elif filtro == 'semana':
-        reservas = reservas_base.filter(created_at__date__gte=hoy - timedelta(days=7))
+        periodo = periodo_dias(hoy - timedelta(days=7))
     elif filtro.startswith('caja_'):
         caja_id = int(filtro.split('_')[1])
         sesion_filtrada = SesionCajaHostal.objects.filter(id=caja_id).first()
         if sesion_filtrada:
-            reservas = reservas_base.filter(created_at__gte=sesion_filtrada.fecha_apertura)
-            if sesion_filtrada.fecha_cierre:
-                reservas = reservas.filter(created_at__lte=sesion_filtrada.fecha_cierre)
-        else:
-            reservas = reservas_base
+            periodo = periodo_sesion(sesion_filtrada)
     elif fecha_inicio_str and fecha_fin_str:
-        fi = parse_date(fecha_inicio_str)
-        ff = parse_date(fecha_fin_str)
-        reservas = reservas_base.filter(created_at__date__gte=fi, created_at__date__lte=ff)
-    else:
-        reservas = reservas_base
+        periodo = periodo_dias(parse_date(fecha_inicio_str), parse_date(fecha_fin_str))
+
+    reservas = reservas_base.filter(periodo.filtro('created_at')) if periodo else reservas_base
 
     total_ingresos = reservas.aggregate(total=Sum('precio_total'))['total'] or 0
     cantidad_reservas = reservas.count()
@@ -646,13 +613,8 @@ def reportes_hostal(request):
     # --- PROCESAR GASTOS (NUEVO) ---
 
     gastos_query = Gasto.objects.filter(modulo='hostal')
-    if sesion_filtrada:
-        if sesion_filtrada.fecha_cierre:
-             gastos_query = gastos_query.filter(fecha__gte=sesion_filtrada.fecha_apertura, fecha__lte=sesion_filtrada.fecha_cierre)
-        else:
-             gastos_query = gastos_query.filter(fecha__gte=sesion_filtrada.fecha_apertura)
-    elif fecha_inicio_str and fecha_fin_str:
-        gastos_query = gastos_query.filter(fecha__date__range=[fi, ff])
+    if periodo:
+        gastos_query = gastos_query.filter(periodo.filtro('fecha'))
     
     total_gastos = gastos_query.aggregate(Sum('monto'))['monto__sum'] or 0
     ganancia_neta = float(total_ingresos) - float(total_gastos)
@@ -704,43 +666,52 @@ def actualizar_reserva(request, reserva_id):
         habitacion_viej = reserva.habitacion
         
         try:
-            # 1. Update Huesped (General Info)
-            huesped = reserva.huesped
-            huesped.nombre_completo = request.POST.get('nombre_completo', huesped.nombre_completo)
-            huesped.email = request.POST.get('email', huesped.email)
-            huesped.telefono = request.POST.get('telefono', huesped.telefono)
-            huesped.save()
-            
-            # 2. Update Reserva Details
-            from django.utils.dateparse import parse_date
-            checkin_str = request.POST.get('fecha_checkin')
-            checkout_str = request.POST.get('fecha_checkout')
-            if checkin_str: reserva.fecha_checkin = parse_date(checkin_str)
-            if checkout_str: reserva.fecha_checkout = parse_date(checkout_str)
-            
-            reserva.cantidad_personas = int(request.POST.get('cantidad_personas', reserva.cantidad_personas))
-            reserva.precio_total = float(request.POST.get('precio_total', reserva.precio_total))
-            reserva.pagado = float(request.POST.get('pagado', reserva.pagado))
-            reserva.observaciones = request.POST.get('observaciones', reserva.observaciones)
-            
-            nuevo_estado = request.POST.get('estado')
-            if nuevo_estado in dict(Reserva.ESTADOS_RESERVA):
-                # Sincronizar habitación si cambia estado
-                reserva.estado = nuevo_estado
+            # Huésped, habitación y reserva en una sola transacción: si las fechas
+            # chocan con otra reserva, tampoco queda cambiado el estado de la habitación
+            with transaction.atomic():
+                # 1. Update Huesped (General Info)
+                huesped = reserva.huesped
+                huesped.nombre_completo = request.POST.get('nombre_completo', huesped.nombre_completo)
+                huesped.email = request.POST.get('email', huesped.email)
+                huesped.telefono = request.POST.get('telefono', huesped.telefono)
+                huesped.save()
                 
-                if nuevo_estado == 'checkout' or nuevo_estado == 'cancelada':
-                    reserva.habitacion.estado = 'disponible' if nuevo_estado == 'cancelada' else 'limpieza'
-                    reserva.habitacion.save()
-                elif nuevo_estado == 'checkin':
-                    reserva.habitacion.estado = 'ocupada'
-                    reserva.habitacion.save()
-
-            reserva.save()
+                # 2. Update Reserva Details
+                from django.utils.dateparse import parse_date
+                checkin_str = request.POST.get('fecha_checkin')
+                checkout_str = request.POST.get('fecha_checkout')
+                if checkin_str: reserva.fecha_checkin = como_momento(parse_date(checkin_str))
+                if checkout_str: reserva.fecha_checkout = como_momento(parse_date(checkout_str))
+                
+                reserva.cantidad_personas = int(request.POST.get('cantidad_personas', reserva.cantidad_personas))
+                reserva.precio_total = float(request.POST.get('precio_total', reserva.precio_total))
+                reserva.pagado = float(request.POST.get('pagado', reserva.pagado))
+                reserva.observaciones = request.POST.get('observaciones', reserva.observaciones)
+                
+                nuevo_estado = request.POST.get('estado')
+                if nuevo_estado in dict(Reserva.ESTADOS_RESERVA):
+                    # Sincronizar habitación si cambia estado
+                    reserva.estado = nuevo_estado
+                    
+                    if nuevo_estado == 'checkout' or nuevo_estado == 'cancelada':
+                        reserva.habitacion.estado = 'disponible' if nuevo_estado == 'cancelada' else 'limpieza'
+                        reserva.habitacion.save()
+                    elif nuevo_estado == 'checkin':
+                        reserva.habitacion.estado = 'ocupada'
+                        reserva.habitacion.save()
+
+                try:
+                    with transaction.atomic():
+                        reserva.save()
+                except IntegrityError:
+                    raise HabitacionNoDisponible("Las nuevas fechas chocan con otra reserva de la habitación.")
             messages.success(request, f'Reserva #{reserva.id} actualizada correctamente.')
             
             # Redirect intelligently
             return HttpResponse(status=204, headers={'HX-Refresh': 'true'})
             
+        except HabitacionNoDisponible as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f"Error al actualizar reserva: {str(e)}")
             
@@ -789,8 +760,6 @@ def procesar_factura_reserva(request, reserva_id):
     if request.method == 'POST':
         reserva = get_object_or_404(Reserva, id=reserva_id)
         from pedidos.models import Factura
-        import threading
-        from pedidos.services.sri_api import enviar_factura_sri
         
         if Factura.objects.filter(reserva=reserva).exists():
             messages.warning(request, 'Esta reserva ya tiene una factura generada.')
@@ -827,10 +796,8 @@ def procesar_factura_reserva(request, reserva_id):
         }
         fact = Factura.objects.create(**datos_factura)
         
-        from django.db import transaction
-        def enviar_sri_bg(fact_id):
-            enviar_factura_sri(fact_id)
-        transaction.on_commit(lambda: threading.Thread(target=enviar_sri_bg, args=(fact.id,)).start())
+        from pedidos.tasks import encolar_envio_sri
+        encolar_envio_sri(fact)
         
         messages.success(request, f'Factura generada y enviada al SRI para la reserva #{reserva.id}')
         
@@ -894,7 +861,7 @@ def unificar_cajas_hostal(request):
     if request.method == 'POST':
         fechas = SesionCajaHostal.objects.annotate(dia=TruncDate('fecha_apertura')).values('dia').distinct()
         for f in fechas:
-            cajas_dia = SesionCajaHostal.objects.filter(fecha_apertura__date=f['dia']).order_by('fecha_apertura')
+            cajas_dia = SesionCajaHostal.objects.filter(periodo_dia(f['dia']).filtro('fecha_apertura')).order_by('fecha_apertura')
             if cajas_dia.count() > 1:
                 principal = cajas_dia[0]
                 otras = cajas_dia[1:]
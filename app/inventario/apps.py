@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario'
+
+    def ready(self):
+        # Invalidación del costeo de recetas
+        import inventario.signals  # noqa: F401
@@ -0,0 +1,151 @@
+# 📁 inventario/costeo.py
+# Costeo de recetas: costo unitario de cada insumo (las sub-recetas según sus
+# ingredientes y rendimiento) y costo de elaboración de cada producto.
+# Se calcula para todo el menú a la vez (grafo de Receta en una consulta, orden
+# topológico de las sub-recetas) y se cachea hasta que cambie un costo o una receta.
+import logging
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Insumo, Receta
+
+logger = logging.getLogger(__name__)
+
+COSTEO_VERSION_KEY = 'costeo_recetas_version'
+COSTEO_TTL = 60 * 60 * 24
+
+
+def _version():
+    return cache.get_or_set(COSTEO_VERSION_KEY, 1, None)
+
+
+def _incrementar_version():
+    try:
+        cache.incr(COSTEO_VERSION_KEY)
+    except ValueError:
+        cache.set(COSTEO_VERSION_KEY, 2, None)
+
+
+def invalidar_costeo():
+    """Descarta los costos cacheados (cambió un costo unitario, un rendimiento o una receta)."""
+    _incrementar_version()
+    transaction.on_commit(_incrementar_version)
+
+
+def _orden_topologico(hijos):
+    """
+    Sub-recetas ordenadas de modo que cada una va después de las que usa.
+    Devuelve (orden, en_ciclo): las que forman (o dependen de) un ciclo quedan fuera del orden.
+    """
+    pendientes = {padre: len(set(ingredientes)) for padre, ingredientes in hijos.items()}
+    usada_por = defaultdict(set)
+    for padre, ingredientes in hijos.items():
+        for insumo_id in set(ingredientes):
+            if insumo_id in hijos:
+                usada_por[insumo_id].add(padre)
+            else:
+                pendientes[padre] -= 1  # insumo base: ya tiene costo
+
+    listas = deque(padre for padre, faltan in pendientes.items() if faltan == 0)
+    orden = []
+    while listas:
+        actual = listas.popleft()
+        orden.append(actual)
+        for padre in usada_por[actual]:
+            pendientes[padre] -= 1
+            if pendientes[padre] == 0:
+                listas.append(padre)
+    return orden, set(hijos) - set(orden)
+
+
+def calcular_costos():
+    """
+    {'insumos': {id: costo unitario}, 'productos': {id: costo de elaboración},
+    'ciclos': ids de sub-recetas en ciclo}. Dos consultas para todo el menú.
+    """
+    insumos = {
+        fila['id']: fila for fila in
+        Insumo.objects.values('id', 'costo_unitario', 'es_subreceta', 'rendimiento_receta')
+    }
+    hijos = defaultdict(list)       # sub-receta -> [(insumo_id, cantidad)]
+    productos = defaultdict(list)   # producto -> [(insumo_id, cantidad)]
+    for producto_id, padre_id, insumo_id, cantidad in Receta.objects.values_list(
+            'producto_id', 'insumo_principal_id', 'insumo_id', 'cantidad_necesaria'):
+        if producto_id:
+            productos[producto_id].append((insumo_id, cantidad))
+        elif insumos[padre_id]['es_subreceta']:
+            hijos[padre_id].append((insumo_id, cantidad))
+
+    costo_unitario = {insumo_id: fila['costo_unitario'] for insumo_id, fila in insumos.items()}
+    orden, en_ciclo = _orden_topologico({padre: [i for i, _ in items] for padre, items in hijos.items()})
+    if en_ciclo:
+        # Se costean con su costo_unitario cargado a mano, como un insumo base
+        logger.warning(f"Ciclo de sub-recetas en el costeo; se usa su costo unitario: {sorted(en_ciclo)}")
+    for padre in orden:
+        costo_batch = sum((cantidad * costo_unitario[i] for i, cantidad in hijos[padre]), Decimal(0))
+        rendimiento = insumos[padre]['rendimiento_receta']
+        costo_unitario[padre] = costo_batch / (rendimiento if rendimiento > 0 else 1)
+
+    return {
+        'insumos': costo_unitario,
+        'productos': {
+            producto_id: sum((cantidad * costo_unitario[i] for i, cantidad in items), Decimal(0))
+            for producto_id, items in productos.items()
+        },
+        'ciclos': en_ciclo,
+    }
+
+
+def costos():
+    """calcular_costos() cacheado por versión."""
+    clave = f'costeo_recetas:{_version()}'
+    tabla = cache.get(clave)
+    if tabla is None:
+        tabla = calcular_costos()
+        cache.set(clave, tabla, COSTEO_TTL)
+    return tabla
+
+
+def costo_insumo(insumo_id):
+    return costos()['insumos'].get(insumo_id, Decimal(0))
+
+
+def costo_producto(producto_id):
+    """Costo de elaboración de un plato (0 si no tiene receta)."""
+    return costos()['productos'].get(producto_id, Decimal(0))
+
+
+def anotar_costos(productos):
+    """Lista de productos con su costo_elaboracion precargado (una lectura de caché para todos)."""
+    tabla = costos()['productos']
+    productos = list(productos)
+    for producto in productos:
+        producto._costo_elaboracion = tabla.get(producto.pk, Decimal(0))
+    return productos
+
+
+def detalle_receta(recetas):
+    """
+    Costo de una lista de filas de Receta (de un producto o de una sub-receta)
+    con su detalle para la ficha técnica. Retorna: (Costo Total, Lista Detallada)
+    """
+    tabla = costos()['insumos']
+    costo_total = Decimal(0)
+    detalle = []
+    for item in recetas.select_related('insumo').order_by('id'):
+        insumo = item.insumo
+        costo_unitario = tabla.get(insumo.id, insumo.costo_unitario)
+        costo_item = item.cantidad_necesaria * costo_unitario
+        costo_total += costo_item
+        detalle.append({
+            'nombre': insumo.nombre,
+            'es_subreceta': insumo.es_subreceta,
+            'unidad': insumo.get_unidad_medida_display(),
+            'cantidad': item.cantidad_necesaria,
+            'costo_unitario': costo_unitario,
+            'costo_total': costo_item,
+        })
+    return costo_total, detalle
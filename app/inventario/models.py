@@ -31,6 +31,19 @@ class Insumo(models.Model):
     es_subreceta = models.BooleanField(default=False, help_text="Marcar si este insumo es una preparación (ej. Salsa de Tomate)")
     rendimiento_receta = models.DecimalField(max_digits=10, decimal_places=3, default=1, help_text="Cuánto rinde la receta de este insumo (en su unidad de medida)")
 
+    # Campos que cambian el costeo de recetas (inventario/costeo.py)
+    CAMPOS_COSTEO = ('costo_unitario', 'es_subreceta', 'rendimiento_receta')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores leídos de la BD: inventario/signals.py solo invalida el costeo si cambian
+        instance._costeo_original = tuple(instance.__dict__.get(campo) for campo in cls.CAMPOS_COSTEO)
+        return instance
+
+    def cambio_costeo(self):
+        actual = tuple(getattr(self, campo) for campo in self.CAMPOS_COSTEO)
+        return actual != getattr(self, '_costeo_original', None)
 
     def __str__(self):
         # Formatear el stock para evitar confusiones (eliminar ceros decimales si es entero)
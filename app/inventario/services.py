@@ -0,0 +1,119 @@
+# 📁 inventario/services.py
+# Descuento / reposición de inventario por pedido en lote (pocas consultas, una transacción)
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+
+from pedidos.models import Producto
+from pedidos.services.menu import invalidar_menu
+from .models import Insumo, MovimientoKardex, Receta
+
+logger = logging.getLogger(__name__)
+
+CANTIDAD_QUANT = Decimal('0.001')
+
+
+def expandir_consumo_pedido(pedido):
+    """
+    Expande un pedido en los consumos agregados que genera.
+    Las sub-recetas (insumos con receta propia) se expanden a sus ingredientes
+    base según su rendimiento. Usa una consulta por nivel de anidamiento.
+
+    Retorna: (productos {producto_id: cantidad}, insumos {insumo_id: (insumo, cantidad)})
+    """
+    productos = defaultdict(int)
+    for producto_id, cantidad in pedido.items.values_list('producto_id', 'cantidad'):
+        productos[producto_id] += cantidad
+
+    # Nivel 0: recetas de los platos vendidos
+    demanda = defaultdict(Decimal)   # insumo_id -> cantidad requerida
+    insumos = {}
+    for receta in Receta.objects.filter(producto_id__in=productos).select_related('insumo'):
+        demanda[receta.insumo_id] += receta.cantidad_necesaria * productos[receta.producto_id]
+        insumos[receta.insumo_id] = receta.insumo
+
+    consumo = defaultdict(Decimal)
+    hijos = {}   # sub-receta -> sus filas de Receta (se consultan una sola vez)
+    nivel = 0
+    while demanda:
+        pendientes = {i for i in demanda if insumos[i].es_subreceta and i not in hijos}
+        if pendientes:
+            for i in pendientes:
+                hijos[i] = []
+            for receta in Receta.objects.filter(insumo_principal_id__in=pendientes).select_related('insumo'):
+                hijos[receta.insumo_principal_id].append(receta)
+                insumos[receta.insumo_id] = receta.insumo
+
+        # Una cadena sin ciclos no puede tener más niveles que sub-recetas distintas
+        nivel += 1
+        if nivel > len(hijos) + 1:
+            logger.warning(f"Ciclo de sub-recetas en el pedido #{pedido.id}; se descuentan sin expandir: {sorted(demanda)}")
+            for insumo_id, cantidad in demanda.items():
+                consumo[insumo_id] += cantidad
+            break
+
+        siguiente = defaultdict(Decimal)
+        for insumo_id, cantidad in demanda.items():
+            if not hijos.get(insumo_id):
+                # Insumo base (o sub-receta sin ingredientes): se descuenta tal cual
+                consumo[insumo_id] += cantidad
+                continue
+            rendimiento = insumos[insumo_id].rendimiento_receta or 1
+            for receta in hijos[insumo_id]:
+                siguiente[receta.insumo_id] += cantidad * receta.cantidad_necesaria / rendimiento
+        demanda = siguiente
+
+    return dict(productos), {i: (insumos[i], c.quantize(CANTIDAD_QUANT)) for i, c in consumo.items() if c}
+
+
+def _aplicar_movimiento_pedido(pedido, tipo, observacion):
+    productos, consumo = expandir_consumo_pedido(pedido)
+    signo = -1 if tipo == 'salida' else 1
+
+    with transaction.atomic():
+        # A. Stock de productos (un solo UPDATE)
+        if productos:
+            qs = Producto.objects.filter(pk__in=productos)
+            if tipo == 'salida':
+                qs = qs.filter(stock__gt=0)  # Solo productos que gestionan stock
+            qs.update(stock=F('stock') + signo * Case(
+                *[When(pk=pk, then=Value(cant)) for pk, cant in productos.items()],
+                output_field=IntegerField(),
+            ))
+            invalidar_menu()  # La grilla del POS marca los productos agotados
+
+        if not consumo:
+            return 0
+
+        # B. Stock de insumos (un solo UPDATE con F())
+        Insumo.objects.filter(pk__in=consumo).update(stock_actual=F('stock_actual') + signo * Case(
+            *[When(pk=pk, then=Value(cant)) for pk, (_, cant) in consumo.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=3),
+        ))
+
+        # C. Kardex: una fila por insumo, en un solo INSERT
+        # (bulk_create no llama a MovimientoKardex.save, el stock ya se aplicó arriba)
+        MovimientoKardex.objects.bulk_create([
+            MovimientoKardex(
+                insumo=insumo,
+                tipo=tipo,
+                cantidad=cant,
+                costo_total=(cant * insumo.costo_unitario).quantize(Decimal('0.01')),
+                observacion=observacion[:200],
+            )
+            for insumo, cant in consumo.values()
+        ])
+    return len(consumo)
+
+
+def descontar_inventario_pedido(pedido):
+    """Descuenta productos e ingredientes de un pedido vendido."""
+    return _aplicar_movimiento_pedido(pedido, 'salida', f"Venta Final Pedido #{pedido.id}")
+
+
+def revertir_inventario_pedido(pedido, motivo):
+    """Devuelve al inventario lo consumido por un pedido pagado (eliminación / re-apertura)."""
+    return _aplicar_movimiento_pedido(pedido, 'entrada', f"{motivo} Pedido #{pedido.id}")
@@ -0,0 +1,23 @@
+# 📁 inventario/signals.py
+# Invalida el costeo cacheado de recetas cuando cambia un costo o una receta
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .costeo import invalidar_costeo
+from .models import Insumo, Receta
+
+
+@receiver(post_save, sender=Insumo)
+def insumo_guardado(sender, instance, raw=False, **kwargs):
+    # Los movimientos de Kardex guardan el insumo solo por el stock: eso no cambia costos
+    if not raw and instance.cambio_costeo():
+        invalidar_costeo()
+    instance._costeo_original = tuple(getattr(instance, campo) for campo in Insumo.CAMPOS_COSTEO)
+
+
+@receiver(post_delete, sender=Insumo)
+@receiver(post_save, sender=Receta)
+@receiver(post_delete, sender=Receta)
+def receta_modificada(sender, raw=False, **kwargs):
+    if not raw:
+        invalidar_costeo()
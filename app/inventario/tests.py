@@ -1,3 +1,129 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from pedidos.models import Producto, Pedido, DetallePedido
+from .models import Insumo, Receta, MovimientoKardex
+from .costeo import costo_insumo, costo_producto, costos, detalle_receta
+from .services import descontar_inventario_pedido, revertir_inventario_pedido
+
+
+class DescuentoInventarioTest(TestCase):
+
+    def setUp(self):
+        # Insumos base
+        self.pan = Insumo.objects.create(nombre="Pan", unidad_medida='un', stock_actual=100, costo_unitario=Decimal('0.20'))
+        self.carne = Insumo.objects.create(nombre="Carne", unidad_medida='kg', stock_actual=10, costo_unitario=Decimal('8.00'))
+        self.tomate = Insumo.objects.create(nombre="Tomate", unidad_medida='kg', stock_actual=5, costo_unitario=Decimal('1.50'))
+
+        # Sub-receta: 1 kg de salsa rinde con 2 kg de tomate
+        self.salsa = Insumo.objects.create(
+            nombre="Salsa", unidad_medida='kg', stock_actual=0,
+            es_subreceta=True, rendimiento_receta=Decimal('1.000'),
+        )
+        Receta.objects.create(insumo_principal=self.salsa, insumo=self.tomate, cantidad_necesaria=Decimal('2.000'))
+
+        self.hamburguesa = Producto.objects.create(nombre="Hamburguesa", precio=5, stock=20)
+        Receta.objects.create(producto=self.hamburguesa, insumo=self.pan, cantidad_necesaria=1)
+        Receta.objects.create(producto=self.hamburguesa, insumo=self.carne, cantidad_necesaria=Decimal('0.150'))
+        Receta.objects.create(producto=self.hamburguesa, insumo=self.salsa, cantidad_necesaria=Decimal('0.050'))
+
+        self.hotdog = Producto.objects.create(nombre="Hot Dog", precio=3, stock=0)
+        Receta.objects.create(producto=self.hotdog, insumo=self.pan, cantidad_necesaria=1)
+
+        self.pedido = Pedido.objects.create(estado='confirmado')
+        DetallePedido.objects.create(pedido=self.pedido, producto=self.hamburguesa, cantidad=3)
+        DetallePedido.objects.create(pedido=self.pedido, producto=self.hotdog, cantidad=2)
+
+    def test_descuento_agregado_con_subrecetas(self):
+        """Los insumos compartidos se agregan y la sub-receta se expande a sus ingredientes"""
+        descontar_inventario_pedido(self.pedido)
+
+        self.pan.refresh_from_db()
+        self.carne.refresh_from_db()
+        self.tomate.refresh_from_db()
+        self.hamburguesa.refresh_from_db()
+        self.hotdog.refresh_from_db()
+
+        self.assertEqual(self.pan.stock_actual, Decimal('95.000'))      # 3 + 2 panes
+        self.assertEqual(self.carne.stock_actual, Decimal('9.550'))     # 3 x 0.150
+        self.assertEqual(self.tomate.stock_actual, Decimal('4.700'))    # 3 x 0.050 x 2
+        self.assertEqual(self.hamburguesa.stock, 17)
+        self.assertEqual(self.hotdog.stock, 0)                          # Sin stock gestionado
+
+        # Una fila de Kardex por insumo base
+        self.assertEqual(MovimientoKardex.objects.filter(tipo='salida').count(), 3)
+
+    def test_consultas_constantes(self):
+        """El costo en consultas no depende del número de líneas ni de ingredientes"""
+        # items + recetas + sub-recetas + UPDATE productos + UPDATE insumos + INSERT kardex (+ savepoint)
+        with self.assertNumQueries(8):
+            descontar_inventario_pedido(self.pedido)
+
+    def test_revertir_devuelve_stock(self):
+        """Eliminar / re-abrir un pedido pagado repone exactamente lo descontado"""
+        descontar_inventario_pedido(self.pedido)
+        revertir_inventario_pedido(self.pedido, "DEVOLUCIÓN")
+
+        self.pan.refresh_from_db()
+        self.tomate.refresh_from_db()
+        self.assertEqual(self.pan.stock_actual, Decimal('100.000'))
+        self.assertEqual(self.tomate.stock_actual, Decimal('5.000'))
+        self.assertEqual(MovimientoKardex.objects.filter(tipo='entrada').count(), 3)
+
+    def test_ciclo_de_subrecetas_no_se_cuelga(self):
+        """Una sub-receta que se usa a sí misma no produce un bucle infinito"""
+        Receta.objects.create(insumo_principal=self.salsa, insumo=self.salsa, cantidad_necesaria=Decimal('0.100'))
+        descontar_inventario_pedido(self.pedido)
+        self.assertTrue(MovimientoKardex.objects.filter(insumo=self.tomate).exists())
+
+
+class CosteoRecetasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tomate = Insumo.objects.create(nombre="Tomate", unidad_medida='kg', costo_unitario=Decimal('1.50'))
+        self.aceite = Insumo.objects.create(nombre="Aceite", unidad_medida='lt', costo_unitario=Decimal('4.00'))
+        # Salsa: 2 kg de tomate + 0.5 lt de aceite rinden 2 kg -> 2.50 por kg
+        self.salsa = Insumo.objects.create(nombre="Salsa", unidad_medida='kg', es_subreceta=True,
+                                           rendimiento_receta=Decimal('2.000'))
+        Receta.objects.create(insumo_principal=self.salsa, insumo=self.tomate, cantidad_necesaria=Decimal('2.000'))
+        Receta.objects.create(insumo_principal=self.salsa, insumo=self.aceite, cantidad_necesaria=Decimal('0.500'))
+        # Pizza: 0.2 kg de salsa + 0.1 kg de tomate -> 0.50 + 0.15
+        self.pizza = Producto.objects.create(nombre="Pizza", precio=8)
+        Receta.objects.create(producto=self.pizza, insumo=self.salsa, cantidad_necesaria=Decimal('0.200'))
+        Receta.objects.create(producto=self.pizza, insumo=self.tomate, cantidad_necesaria=Decimal('0.100'))
+
+    def test_costo_con_subrecetas_y_cache(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.pizza.costo_elaboracion, Decimal('0.65'))
+        with self.assertNumQueries(0):
+            self.assertEqual(costo_insumo(self.salsa.id), Decimal('2.50'))
+
+        total, detalle = detalle_receta(self.pizza.receta.all())
+        self.assertEqual(total, Decimal('0.65'))
+        self.assertEqual([item['costo_unitario'] for item in detalle], [Decimal('2.50'), Decimal('1.50')])
+
+    def test_se_invalida_al_cambiar_costo_o_receta(self):
+        self.assertEqual(costo_producto(self.pizza.id), Decimal('0.65'))
+
+        # Una entrada de Kardex guarda el insumo (stock) pero no toca el costeo
+        MovimientoKardex.objects.create(insumo=self.tomate, tipo='entrada', cantidad=5)
+        with self.assertNumQueries(0):
+            costo_producto(self.pizza.id)
+
+        self.aceite.costo_unitario = Decimal('6.00')
+        self.aceite.save()
+        self.assertEqual(costo_producto(self.pizza.id), Decimal('0.75'))
+
+        Receta.objects.filter(producto=self.pizza, insumo=self.tomate).delete()
+        Receta.objects.create(producto=self.pizza, insumo=self.aceite, cantidad_necesaria=Decimal('0.010'))
+        self.assertEqual(costo_producto(self.pizza.id), Decimal('0.66'))
+
+    def test_ciclo_usa_el_costo_unitario_cargado(self):
+        Insumo.objects.filter(pk=self.salsa.pk).update(costo_unitario=Decimal('3.00'))
+        Receta.objects.create(insumo_principal=self.salsa, insumo=self.salsa, cantidad_necesaria=Decimal('0.100'))
+        tabla = costos()
+        self.assertEqual(tabla['ciclos'], {self.salsa.id})
+        self.assertEqual(tabla['productos'][self.pizza.id], Decimal('0.75'))
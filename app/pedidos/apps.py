@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PedidosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pedidos'
+
+    def ready(self):
+        # Avisos a la pantalla de cocina (WebSocket)
+        import pedidos.signals  # noqa: F401
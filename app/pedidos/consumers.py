@@ -0,0 +1,30 @@
+# 📁 pedidos/consumers.py
+# WebSocket de la pantalla de cocina: reemplaza el sondeo HTMX cada 5 segundos
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .services.cocina import GRUPO_COCINA
+
+ROLES_COCINA = ('cocina', 'gerente', 'admin')  # Mismos roles que @cocina_required
+
+
+class CocinaConsumer(AsyncJsonWebsocketConsumer):
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated or user.rol not in ROLES_COCINA:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(GRUPO_COCINA, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(GRUPO_COCINA, self.channel_name)
+
+    async def cocina_evento(self, event):
+        # Se reenvía solo el cambio (diff), no la lista completa
+        await self.send_json({
+            'evento': event['evento'],
+            'pedido_id': event['pedido_id'],
+            'html': event.get('html', ''),
+        })
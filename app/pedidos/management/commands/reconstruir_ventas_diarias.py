@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from pedidos.services.ventas import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes diarios de ventas (VentaDiaria / VentaProductoDiaria) desde las facturas y los pedidos pagados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (inclusive)')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (inclusive)')
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            valor = options[nombre]
+            if valor:
+                fechas[nombre] = parse_date(valor)
+                if fechas[nombre] is None:
+                    raise CommandError(f'Fecha inválida para --{nombre}: {valor}')
+
+        dias, productos = reconstruir_resumenes(**fechas)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Resúmenes reconstruidos: {dias} filas diarias, {productos} filas por producto'
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:47
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales(apps, schema_editor):
+    """Rellena total y cantidad_items de los pedidos existentes en un solo UPDATE."""
+    Pedido = apps.get_model('pedidos', 'Pedido')
+    DetallePedido = apps.get_model('pedidos', 'DetallePedido')
+    items = DetallePedido.objects.filter(pedido=OuterRef('pk')).values('pedido')
+    Pedido.objects.update(
+        total=Coalesce(Subquery(
+            items.annotate(s=Sum(F('cantidad') * F('precio_unitario'))).values('s'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ), 0, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        cantidad_items=Coalesce(Subquery(
+            items.annotate(c=Sum('cantidad')).values('c'),
+            output_field=IntegerField(),
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0010_factura_tipo_comprobante'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0, verbose_name='Unidades en el Pedido'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
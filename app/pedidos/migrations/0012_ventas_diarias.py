@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0011_pedido_total_cantidad_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('origen', models.CharField(choices=[('cafeteria', 'Cafetería'), ('hostal', 'Hostal')], default='cafeteria', max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('num_facturas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'origen'), name='ventadiaria_fecha_origen_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaProductoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='pedidos.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria por Producto',
+                'verbose_name_plural': 'Ventas Diarias por Producto',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'precio_unitario'), name='ventaproductodiaria_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_tipo_identificacion'),
+        ('pedidos', '0012_ventas_diarias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('fecha_entrega__isnull', False)), fields=['fecha_entrega'], name='pedido_agenda_idx'),
+        ),
+    ]
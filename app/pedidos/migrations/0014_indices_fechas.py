@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0013_pedido_agenda_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='factura',
+            name='fecha_emision',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='pedido',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
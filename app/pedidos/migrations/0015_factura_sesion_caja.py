@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+CAMPO_POR_FORMA_PAGO = {
+    '01': 'ventas_efectivo',
+    '16': 'ventas_tarjeta',
+    '19': 'ventas_tarjeta',
+    '20': 'ventas_transferencia',
+}
+
+
+def vincular_facturas(apps, schema_editor):
+    """Asigna las facturas existentes del restaurante al turno en que se emitieron y calcula los acumulados."""
+    SesionCaja = apps.get_model('caja', 'SesionCaja')
+    Factura = apps.get_model('pedidos', 'Factura')
+    Gasto = apps.get_model('caja', 'Gasto')
+
+    for sesion in SesionCaja.objects.order_by('fecha_apertura'):
+        facturas = Factura.objects.filter(origen='cafeteria', sesion_caja__isnull=True,
+                                          fecha_emision__gte=sesion.fecha_apertura)
+        if sesion.fecha_cierre:
+            facturas = facturas.filter(fecha_emision__lte=sesion.fecha_cierre)
+        facturas.update(sesion_caja=sesion)
+
+        valores = {campo: 0 for campo in CAMPO_POR_FORMA_PAGO.values()}
+        valores['num_facturas'] = 0
+        for fila in Factura.objects.filter(sesion_caja=sesion).values('metodo_pago_sri').annotate(
+                importe=Sum('total'), cantidad=Count('id')):
+            campo = CAMPO_POR_FORMA_PAGO.get(fila['metodo_pago_sri'], 'ventas_efectivo')
+            valores[campo] += fila['importe'] or 0
+            valores['num_facturas'] += fila['cantidad']
+        valores['total_gastos'] = Gasto.objects.filter(sesion_caja=sesion).aggregate(t=Sum('monto'))['t'] or 0
+        SesionCaja.objects.filter(pk=sesion.pk).update(**valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0006_acumulados_sesion'),
+        ('pedidos', '0014_indices_fechas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='sesion_caja',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='facturas', to='caja.sesioncaja'),
+        ),
+        migrations.RunPython(vincular_facturas, migrations.RunPython.noop),
+    ]
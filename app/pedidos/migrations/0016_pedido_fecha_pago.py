@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:13
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def completar_fecha_pago(apps, schema_editor):
+    """
+    Fecha de pago de los pedidos ya pagados (la de su factura, o la última
+    modificación si se cerraron sin comprobante) y resumen por producto
+    recalculado con ella: antes solo contaba los pedidos facturados.
+    """
+    Pedido = apps.get_model('pedidos', 'Pedido')
+    Factura = apps.get_model('pedidos', 'Factura')
+    DetallePedido = apps.get_model('pedidos', 'DetallePedido')
+    VentaProductoDiaria = apps.get_model('pedidos', 'VentaProductoDiaria')
+
+    emision = Factura.objects.filter(pedido=OuterRef('pk')).values('fecha_emision')[:1]
+    Pedido.objects.filter(estado='pagado', fecha_pago__isnull=True).update(
+        fecha_pago=Coalesce(Subquery(emision), F('updated_at')))
+
+    filas = (DetallePedido.objects.filter(pedido__estado='pagado')
+             .annotate(dia=TruncDate('pedido__fecha_pago', tzinfo=timezone.get_current_timezone()))
+             .values('dia', 'producto_id', 'precio_unitario')
+             .annotate(unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_unitario'))))
+    VentaProductoDiaria.objects.all().delete()
+    VentaProductoDiaria.objects.bulk_create([
+        VentaProductoDiaria(fecha=f['dia'], producto_id=f['producto_id'], precio_unitario=f['precio_unitario'],
+                            cantidad=f['unidades'], total=f['ingresos'])
+        for f in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0015_factura_sesion_caja'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_pago',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Fecha de Pago'),
+        ),
+        migrations.RunPython(completar_fecha_pago, migrations.RunPython.noop),
+    ]
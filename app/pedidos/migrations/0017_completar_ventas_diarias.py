@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:05
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def completar_ventas_diarias(apps, schema_editor):
+    """
+    Totales diarios de las facturas ya emitidas: VentaDiaria se creó vacía y
+    los dashboards solo leen de ella.
+    """
+    Factura = apps.get_model('pedidos', 'Factura')
+    VentaDiaria = apps.get_model('pedidos', 'VentaDiaria')
+
+    filas = (Factura.objects
+             .annotate(dia=TruncDate('fecha_emision', tzinfo=timezone.get_current_timezone()))
+             .values('dia', 'origen')
+             .annotate(ingresos=Sum('total'), num=Count('id')))
+    VentaDiaria.objects.all().delete()
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(fecha=f['dia'], origen=f['origen'], total=f['ingresos'], num_facturas=f['num'])
+        for f in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0016_pedido_fecha_pago'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_ventas_diarias, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 
 
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from clientes.models import Cliente
 
 
@@ -47,6 +49,14 @@ class Producto(models.Model):
     stock = models.IntegerField(default=0, verbose_name="Stock Disponible")
     disponible = models.BooleanField(default=True)
 
+    @property
+    def costo_elaboracion(self):
+        """Costo de la receta (con sub-recetas), desde el costeo cacheado de todo el menú"""
+        if hasattr(self, '_costo_elaboracion'):
+            return self._costo_elaboracion  # precargado con inventario.costeo.anotar_costos()
+        from inventario.costeo import costo_producto
+        return costo_producto(self.pk)
+
     def __str__(self):
         return f"{self.nombre} - ${self.precio}"
 
@@ -64,16 +74,10 @@ class VarianteProducto(models.Model):
         verbose_name = "Variante de Producto"
         verbose_name_plural = "Variantes de Productos"
 
-    # 👇 ESTA ES LA FUNCIÓN QUE FALTABA PARA EL COSTEO
     @property
     def costo_elaboracion(self):
-        """Suma el costo de todos los ingredientes de la receta"""
-        total = 0
-        # 'receta' es el related_name definido en inventario/models.py
-        for ingrediente in self.receta.all():
-            if ingrediente.insumo:
-                total += ingrediente.cantidad_necesaria * ingrediente.insumo.costo_unitario
-        return total
+        """Las variantes comparten la receta del producto"""
+        return self.producto.costo_elaboracion
 
 # 3. PEDIDO (La cuenta)
 class Pedido(models.Model):
@@ -101,15 +105,61 @@ class Pedido(models.Model):
     # Notificaciones
     notificacion_vista = models.BooleanField(default=False)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Cuándo pasó a 'pagado' (con o sin factura); los resúmenes por producto usan este día
+    fecha_pago = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Fecha de Pago")
+
+    # Totales desnormalizados: los mantiene DetallePedido al guardarse / borrarse
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True)
+    cantidad_items = models.PositiveIntegerField(default=0, verbose_name="Unidades en el Pedido")
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Agenda (FullCalendar): solo los pedidos programados, por fecha de entrega
+            models.Index(
+                fields=['fecha_entrega'],
+                condition=models.Q(fecha_entrega__isnull=False),
+                name='pedido_agenda_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} - Mesa {self.mesa.numero}"
-    
-    @property
-    def total(self):
-        return sum(item.subtotal for item in self.items.all())
+
+    # Acumulados que DetallePedido actualiza con F(); un save() normal no los pisa
+    CAMPOS_ACUMULADOS = ('total', 'cantidad_items')
+
+    def save(self, *args, **kwargs):
+        anterior = getattr(self, '_estado_original', None)
+        if self.estado == 'pagado' and (self.fecha_pago is None or anterior not in (None, 'pagado')):
+            self.fecha_pago = timezone.now()
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Los valores en memoria pueden estar atrasados frente a otro request que agregó items
+            excluidos = set(self.CAMPOS_ACUMULADOS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in excluidos
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado leído de la BD: pedidos/signals.py detecta las transiciones para la cocina
+        instance._estado_original = instance.__dict__.get('estado')
+        return instance
+
+    def recalcular_totales(self):
+        """Recalcula total y unidades desde los items (para corregir desajustes)."""
+        from django.db.models import F, Sum
+        datos = self.items.aggregate(
+            total=Sum(F('cantidad') * F('precio_unitario')),
+            unidades=Sum('cantidad'),
+        )
+        self.total = datos['total'] or 0
+        self.cantidad_items = datos['unidades'] or 0
+        Pedido.objects.filter(pk=self.pk).update(total=self.total, cantidad_items=self.cantidad_items)
 
 # 4. DETALLE (Platos del pedido)
 class DetallePedido(models.Model):
@@ -119,6 +169,37 @@ class DetallePedido(models.Model):
     cantidad = models.PositiveIntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2) # Guardamos precio histórico
 
+    def _sumado_en_pedido(self):
+        """
+        (subtotal, cantidad) de esta línea que ya están en Pedido.total / cantidad_items.
+        Se leen de la BD con la fila bloqueada, no de la instancia: dos requests
+        con la misma línea cargada (doble toque en "+", cocina y mesero) no
+        aplican dos veces el mismo cambio. None si la línea ya no existe.
+        """
+        fila = (DetallePedido.objects.select_for_update()
+                .filter(pk=self.pk).values_list('cantidad', 'precio_unitario').first())
+        if fila is None:
+            return None
+        cantidad, precio = fila
+        return cantidad * precio, cantidad
+
+    def _subtotal_decimal(self):
+        # precio_unitario puede venir como str/float antes de releer de la BD
+        return self.cantidad * Decimal(str(self.precio_unitario))
+
+    def _aplicar_delta_pedido(self, delta_total, delta_cantidad):
+        """Actualiza los totales del pedido con F() (sin leer ni recorrer los items)."""
+        if not delta_total and not delta_cantidad:
+            return
+        Pedido.objects.filter(pk=self.pedido_id).update(
+            total=models.F('total') + delta_total,
+            cantidad_items=models.F('cantidad_items') + delta_cantidad,
+        )
+        # Mantener coherente la instancia del pedido si ya está cargada en memoria
+        if DetallePedido.pedido.is_cached(self):
+            self.pedido.total += delta_total
+            self.pedido.cantidad_items += delta_cantidad
+
     def save(self, *args, **kwargs):
         if not self.id:
             # Si hay una variante, usamos su precio. Si no, el del producto base.
@@ -126,7 +207,21 @@ class DetallePedido(models.Model):
                 self.precio_unitario = self.variante.precio
             else:
                 self.precio_unitario = self.producto.precio
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            subtotal_previo, cantidad_previa = (self._sumado_en_pedido() if self.pk else None) or (0, 0)
+            super().save(*args, **kwargs)
+            self._aplicar_delta_pedido(
+                self._subtotal_decimal() - subtotal_previo,
+                self.cantidad - cantidad_previa,
+            )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            sumado = self._sumado_en_pedido()
+            # None: otro request ya la borró y descontó su parte
+            if sumado is not None:
+                self._aplicar_delta_pedido(-sumado[0], -sumado[1])
+            return super().delete(*args, **kwargs)
 
     @property
     def subtotal(self):
@@ -170,7 +265,7 @@ class Factura(models.Model):
     correo = models.EmailField(blank=True, null=True)
     
     # --- MONTOS ---
-    fecha_emision = models.DateTimeField(auto_now_add=True)
+    fecha_emision = models.DateTimeField(auto_now_add=True, db_index=True)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
     iva = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     total = models.DecimalField(max_digits=10, decimal_places=2)
@@ -202,6 +297,9 @@ class Factura(models.Model):
 
     # Mantenemos el metodo_pago original si se usa internamente
     metodo_pago = models.CharField(max_length=20, choices=METODO_PAGO_CHOICES, default='efectivo')
+
+    # Turno de caja del restaurante en que se cobró (las facturas del hostal no lo llevan)
+    sesion_caja = models.ForeignKey('caja.SesionCaja', on_delete=models.SET_NULL, null=True, blank=True, related_name='facturas')
     
     # Datos de pago (especialmente para efectivo)
     monto_recibido = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -211,8 +309,18 @@ class Factura(models.Model):
         return f"Factura #{self.id} - {self.razon_social}"
 
     def save(self, *args, **kwargs):
-        # Al guardar la factura, marcamos como pagado según el origen
-        if not self.id: # Solo al crear
+        if self.id:
+            return super().save(*args, **kwargs)
+
+        # Al crear: todo en una transacción, así el secuencial se devuelve si algo falla
+        # (sin savepoint: si ya hay una transacción abierta, el rollback es el de ella)
+        with transaction.atomic(savepoint=False):
+            # Al guardar la factura, marcamos como pagado según el origen
+            if self.origen == 'cafeteria' and not self.sesion_caja_id:
+                from caja.models import SesionCaja
+                # Con bloqueo: una factura a mitad del cierre no se suma a la caja ya cuadrada
+                self.sesion_caja = SesionCaja.abierta(bloquear=True)
+
             if self.pedido:
                 self.pedido.estado = 'pagado'
                 self.pedido.save()
@@ -225,5 +333,52 @@ class Factura(models.Model):
                 # Si viene de hostal, asumiendo que facturar completa el pago
                 self.reserva.pagado = self.reserva.precio_total
                 self.reserva.save()
+
+            if self.tipo_comprobante == 'factura' and not self.secuencial:
+                self.secuencial = self.asignar_secuencial()
             
-        super().save(*args, **kwargs)
\ No newline at end of file
+            super().save(*args, **kwargs)
+
+    def asignar_secuencial(self):
+        """Próximo secuencial SRI del punto de emisión (del bloque de la caja si apartó uno)."""
+        from core.contadores import clave_factura, siguiente_numero
+        asignado_a = f'caja:{self.sesion_caja_id}' if self.sesion_caja_id else None
+        numero = siguiente_numero(clave_factura(self.establecimiento, self.punto_emision), asignado_a)
+        return f'{numero:09d}'
+
+# 6. RESÚMENES DIARIOS DE VENTAS (los mantiene pedidos/services/ventas.py)
+class VentaDiaria(models.Model):
+    """Total facturado por día y módulo; los dashboards leen esto en vez de recorrer facturas."""
+    fecha = models.DateField()
+    origen = models.CharField(max_length=20, choices=Factura.ORIGEN_CHOICES, default='cafeteria')
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    num_facturas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Venta Diaria"
+        verbose_name_plural = "Ventas Diarias"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'origen'], name='ventadiaria_fecha_origen_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.origen}: ${self.total}"
+
+
+class VentaProductoDiaria(models.Model):
+    """Unidades e ingresos por producto y precio histórico en cada día."""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Venta Diaria por Producto"
+        verbose_name_plural = "Ventas Diarias por Producto"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'precio_unitario'], name='ventaproductodiaria_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id} x{self.cantidad}"
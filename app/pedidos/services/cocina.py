@@ -0,0 +1,51 @@
+# 📁 pedidos/services/cocina.py
+# Avisos en tiempo real a las pantallas de cocina (Django Channels)
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from pedidos.models import Pedido
+
+logger = logging.getLogger(__name__)
+
+GRUPO_COCINA = 'cocina'
+
+
+def notificar_cocina(pedido_id, evento):
+    """
+    Envía a todas las pantallas de cocina el cambio de un pedido, cuando la
+    transacción actual se confirme.
+
+    evento:
+      - 'confirmado': la tarjeta del pedido se agrega (o reemplaza) en pantalla.
+      - 'listo' / 'cancelado' / 'retirado': la tarjeta se quita.
+    """
+    transaction.on_commit(lambda: _publicar(pedido_id, evento))
+
+
+def _publicar(pedido_id, evento):
+    capa = get_channel_layer()
+    if capa is None:
+        return
+
+    try:
+        mensaje = {'type': 'cocina.evento', 'evento': evento, 'pedido_id': pedido_id}
+        if evento == 'confirmado':
+            # Se renderiza una sola vez aquí, no en cada pantalla conectada
+            pedido = (
+                Pedido.objects.select_related('mesa', 'mesero')
+                .prefetch_related('items__producto')
+                .filter(pk=pedido_id, estado='confirmado')
+                .first()
+            )
+            if pedido is None:
+                return
+            mensaje['html'] = render_to_string('pedidos/partials/tarjeta_pedido_cocina.html', {'pedido': pedido})
+
+        async_to_sync(capa.group_send)(GRUPO_COCINA, mensaje)
+    except Exception:
+        # La cocina se resincroniza sola al reconectar; no se rompe el request
+        logger.exception(f"No se pudo avisar a cocina del pedido #{pedido_id} ({evento})")
@@ -0,0 +1,123 @@
+# 📁 pedidos/services/ingenieria_menu.py
+# Matriz de ingeniería de menú (Kasavana & Smith) para todos los productos y
+# variantes de un período: food cost %, margen de contribución y mezcla de ventas.
+# Las ventas salen de un solo GROUP BY sobre DetallePedido y el costo del costeo
+# cacheado de recetas; el cruce y las métricas se calculan en bloque con pandas.
+import numpy as np
+import pandas as pd
+from django.db.models import F, Sum
+
+from inventario.costeo import costos
+from ..models import DetallePedido, Producto, VarianteProducto
+
+# Un plato es "popular" si vende al menos el 70% de lo que le tocaría con una mezcla pareja
+UMBRAL_POPULARIDAD = 0.70
+
+CLASIFICACION = {
+    (True, True): 'Estrella',
+    (True, False): 'Caballo de batalla',
+    (False, True): 'Rompecabezas',
+    (False, False): 'Perro',
+}
+
+COLUMNAS_CSV = {
+    'categoria': 'Categoría',
+    'producto': 'Producto',
+    'variante': 'Variante',
+    'precio': 'Precio',
+    'costo': 'Costo',
+    'food_cost_pct': 'Food Cost %',
+    'margen_unitario': 'Margen Unitario',
+    'unidades': 'Unidades Vendidas',
+    'mezcla_pct': 'Mezcla de Ventas %',
+    'ingresos': 'Ingresos',
+    'margen_total': 'Margen Total',
+    'clasificacion': 'Clasificación',
+}
+
+
+def _catalogo(categoria_id=None):
+    # Una fila por producto (variante_id = 0) y una por cada variante
+    productos = Producto.objects.all()
+    variantes = VarianteProducto.objects.all()
+    if categoria_id:
+        productos = productos.filter(categoria_id=categoria_id)
+        variantes = variantes.filter(producto__categoria_id=categoria_id)
+
+    filas = pd.DataFrame.from_records(
+        productos.values_list('id', 'nombre', 'categoria__nombre', 'precio'),
+        columns=['producto_id', 'producto', 'categoria', 'precio'])
+    filas['variante_id'] = 0
+    filas['variante'] = ''
+    variantes = pd.DataFrame.from_records(
+        variantes.values_list('producto_id', 'producto__nombre', 'producto__categoria__nombre',
+                              'precio', 'id', 'nombre'),
+        columns=['producto_id', 'producto', 'categoria', 'precio', 'variante_id', 'variante'])
+    catalogo = pd.concat([filas, variantes], ignore_index=True) if len(variantes) else filas
+    catalogo['categoria'] = catalogo['categoria'].fillna('Sin categoría')
+    return catalogo
+
+
+def _ventas(periodo, categoria_id=None):
+    # Items de pedidos cobrados dentro del período, con o sin factura (índice en Pedido.fecha_pago)
+    detalles = DetallePedido.objects.filter(periodo.filtro('pedido__fecha_pago'), pedido__estado='pagado')
+    if categoria_id:
+        detalles = detalles.filter(producto__categoria_id=categoria_id)
+    filas = (detalles.values('producto_id', 'variante_id')
+             .annotate(unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_unitario'))))
+    ventas = pd.DataFrame.from_records(filas, columns=['producto_id', 'variante_id', 'unidades', 'ingresos'])
+    ventas['variante_id'] = ventas['variante_id'].fillna(0).astype('int64')
+    return ventas
+
+
+def matriz_menu(periodo, categoria_id=None):
+    """
+    DataFrame con una fila por producto / variante y sus métricas del período,
+    ordenado por margen total. `periodo` es un core.periodos.Periodo.
+    """
+    catalogo = _catalogo(categoria_id)
+    ventas = _ventas(periodo, categoria_id)
+    # Una variante borrada deja sus ventas en la fila del producto
+    ventas.loc[~ventas['variante_id'].isin(catalogo['variante_id']), 'variante_id'] = 0
+    ventas = ventas.groupby(['producto_id', 'variante_id'], as_index=False)[['unidades', 'ingresos']].sum()
+
+    tabla = catalogo.merge(ventas, on=['producto_id', 'variante_id'], how='left')
+    costo_por_producto = costos()['productos']
+    tabla['costo'] = tabla['producto_id'].map(costo_por_producto)
+
+    for columna in ('precio', 'costo', 'unidades', 'ingresos'):
+        tabla[columna] = pd.to_numeric(tabla[columna], errors='coerce').astype('float64').fillna(0.0)
+    # Productos con variantes y sin ventas directas no se listan aparte
+    con_variantes = tabla.loc[tabla['variante_id'] > 0, 'producto_id'].unique()
+    tabla = tabla[~((tabla['variante_id'] == 0) & tabla['producto_id'].isin(con_variantes) & (tabla['unidades'] == 0))]
+
+    unidades = tabla['unidades'].to_numpy()
+    # Precio efectivo del período (precios históricos); sin ventas, el de lista
+    precio = np.where(unidades > 0, tabla['ingresos'].to_numpy() / np.where(unidades > 0, unidades, 1),
+                      tabla['precio'].to_numpy())
+    costo = tabla['costo'].to_numpy()
+    tabla = tabla.assign(
+        precio=precio,
+        food_cost_pct=np.where(precio > 0, costo / np.where(precio > 0, precio, 1) * 100, 0.0),
+        margen_unitario=precio - costo,
+    )
+    tabla['margen_total'] = tabla['margen_unitario'] * unidades
+    total_unidades = unidades.sum()
+    tabla['mezcla_pct'] = unidades / total_unidades * 100 if total_unidades else 0.0
+
+    # Umbrales: 70% de la mezcla pareja y margen promedio ponderado por ventas
+    umbral_mezcla = UMBRAL_POPULARIDAD * 100 / len(tabla) if len(tabla) else 0
+    margen_promedio = tabla['margen_total'].sum() / total_unidades if total_unidades else 0
+    popular = tabla['mezcla_pct'].to_numpy() >= umbral_mezcla
+    rentable = tabla['margen_unitario'].to_numpy() >= margen_promedio
+    tabla['clasificacion'] = [CLASIFICACION[clave] for clave in zip(popular, rentable)]
+
+    tabla.attrs.update(umbral_mezcla=umbral_mezcla, margen_promedio=margen_promedio,
+                       total_unidades=int(total_unidades), total_ingresos=float(tabla['ingresos'].sum()),
+                       total_margen=float(tabla['margen_total'].sum()))
+    return tabla.sort_values(['margen_total', 'producto'], ascending=[False, True]).reset_index(drop=True)
+
+
+def exportar_csv(tabla, destino):
+    """Escribe la matriz en CSV (columnas en español, 2 decimales) sobre un archivo o HttpResponse."""
+    tabla[list(COLUMNAS_CSV)].rename(columns=COLUMNAS_CSV).to_csv(destino, index=False, float_format='%.2f')
@@ -0,0 +1,27 @@
+# 📁 pedidos/services/menu.py
+# Versión del menú del POS: la grilla de productos se cachea por versión
+from django.core.cache import cache
+from django.db import transaction
+
+MENU_VERSION_KEY = 'pos_menu_version'
+
+
+def version_menu():
+    return cache.get_or_set(MENU_VERSION_KEY, 1, None)
+
+
+def _incrementar_version():
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.set(MENU_VERSION_KEY, 2, None)
+
+
+def invalidar_menu():
+    """
+    Descarta la grilla cacheada (cambió un producto, categoría, variante o stock).
+    Se repite al confirmar la transacción: otro request pudo cachear el menú viejo
+    mientras tanto.
+    """
+    _incrementar_version()
+    transaction.on_commit(_incrementar_version)
@@ -1,12 +1,26 @@
 import requests
 import logging
+from django.conf import settings
 from django.utils import timezone
 from core.models import ConfiguracionSRI
 from pedidos.models import Factura
 
 logger = logging.getLogger(__name__)
 
-def enviar_factura_sri(factura_id):
+
+class SRIErrorTransitorio(Exception):
+    """Falla temporal del API (red, timeout, HTTP 5xx/429). Se puede reintentar."""
+
+
+def enviar_factura_sri(factura_id, reintentar=False):
+    """
+    Envía la factura al API de Fronteratech y actualiza su estado SRI.
+    Retorna (exito, mensaje).
+
+    Con reintentar=True las fallas temporales se propagan como SRIErrorTransitorio
+    (para que la tarea de Celery reintente) en lugar de devolver (False, mensaje).
+    En ese caso la factura se queda en 'pendiente', nunca en 'rechazado'.
+    """
     try:
         factura = Factura.objects.get(id=factura_id)
         config = ConfiguracionSRI.objects.first()
@@ -103,11 +117,24 @@ def enviar_factura_sri(factura_id):
             "items": items
         }
 
+        # El número lo asigna la app (core/contadores.py): correlativo y sin huecos por punto de emisión
+        if factura.secuencial:
+            payload["establishment"] = factura.establecimiento
+            payload["emission_point"] = factura.punto_emision
+            payload["sequential"] = factura.secuencial
+
         if factura.correo and factura.correo.strip():
             payload["customer_email"] = factura.correo.strip()
 
-        response = requests.post(url, json=payload, headers=headers)
+        timeout = getattr(settings, 'SRI_API_TIMEOUT', 20)
+        try:
+            response = requests.post(url, json=payload, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise SRIErrorTransitorio(f"Sin respuesta del API SRI: {e}")
         logger.info(f"Respuesta SRI API {response.status_code}: {response.text}")
+
+        if response.status_code >= 500 or response.status_code == 429:
+            raise SRIErrorTransitorio(f"Error HTTP {response.status_code}")
         
         if response.status_code in [200, 201]:
             data = response.json()
@@ -118,6 +145,10 @@ def enviar_factura_sri(factura_id):
                 factura.clave_acceso = inv_data.get('access_key')
                 
                 numero = inv_data.get('number', '')
+                enviado = f"{factura.establecimiento}-{factura.punto_emision}-{factura.secuencial}"
+                if numero and factura.secuencial and numero != enviado:
+                    # El API no respetó nuestro número: queda el del SRI (es el autorizado), pero es un error
+                    logger.error(f"Factura #{factura.id}: se envió el número {enviado} y el API devolvió {numero}")
                 if '-' in numero:
                     parts = numero.split('-')
                     if len(parts) == 3:
@@ -137,7 +168,12 @@ def enviar_factura_sri(factura_id):
             factura.estado_sri = 'rechazado'
             factura.save()
             return False, f"Error HTTP {response.status_code}"
-            
+
+    except SRIErrorTransitorio as e:
+        if reintentar:
+            raise
+        logger.warning(f"Falla temporal enviando factura #{factura_id} al SRI: {e}")
+        return False, str(e)
     except Exception as e:
         logger.exception("Excepción enviando factura al SRI")
         return False, str(e)
@@ -0,0 +1,161 @@
+# 📁 pedidos/services/ventas.py
+# Resúmenes diarios de ventas (VentaDiaria / VentaProductoDiaria).
+# Se actualizan con deltas, así los dashboards leen una fila por día en lugar
+# de recorrer todo el historial:
+#   - VentaDiaria al crear o borrar una Factura (lo facturado, cafetería y hostal)
+#   - VentaProductoDiaria cuando un pedido entra o sale de 'pagado', tenga o no
+#     factura (pagar_pedido cierra la venta sin emitir comprobante)
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import DetallePedido, Factura, VentaDiaria, VentaProductoDiaria
+
+
+def _dia_local(momento):
+    return timezone.localdate(momento) if timezone.is_aware(momento) else momento.date()
+
+
+def _lineas_pedido(pedido_id):
+    # Unidades e ingresos por (producto, precio histórico) de un pedido
+    return (DetallePedido.objects.filter(pedido_id=pedido_id)
+            .values('producto_id', 'precio_unitario')
+            .annotate(unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_unitario'))))
+
+
+def _sumar(modelo, claves, **deltas):
+    fila, _ = modelo.objects.get_or_create(**claves)
+    modelo.objects.filter(pk=fila.pk).update(**{campo: F(campo) + valor for campo, valor in deltas.items()})
+
+
+def _sumar_productos(fecha, lineas, signo):
+    """
+    Suma las líneas de un pedido en VentaProductoDiaria con consultas fijas:
+    crea en lote las filas que falten (ON CONFLICT DO NOTHING) y aplica todos
+    los deltas en un único UPDATE.
+    """
+    if not lineas:
+        return
+    VentaProductoDiaria.objects.bulk_create(
+        [VentaProductoDiaria(fecha=fecha, producto_id=l['producto_id'], precio_unitario=l['precio_unitario'])
+         for l in lineas],
+        ignore_conflicts=True,
+    )
+
+    def delta(campo, output_field):
+        return Case(
+            *[When(producto_id=l['producto_id'], precio_unitario=l['precio_unitario'], then=Value(signo * l[campo]))
+              for l in lineas],
+            default=Value(0), output_field=output_field,
+        )
+
+    claves = Q()
+    for l in lineas:
+        claves |= Q(producto_id=l['producto_id'], precio_unitario=l['precio_unitario'])
+    VentaProductoDiaria.objects.filter(claves, fecha=fecha).update(
+        cantidad=F('cantidad') + delta('unidades', IntegerField()),
+        total=F('total') + delta('ingresos', DecimalField(max_digits=12, decimal_places=2)),
+    )
+
+
+def aplicar_factura(factura, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) una factura en el total de su día.
+    Se llama dentro de la misma transacción que crea / borra la factura.
+    """
+    fecha = _dia_local(factura.fecha_emision or timezone.now())
+    with transaction.atomic():
+        _sumar(VentaDiaria, {'fecha': fecha, 'origen': factura.origen},
+               total=signo * Decimal(str(factura.total)), num_facturas=signo)
+
+
+def aplicar_pago_pedido(pedido, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) las líneas de un pedido pagado en el
+    resumen por producto del día en que se cobró.
+    """
+    fecha = _dia_local(pedido.fecha_pago or timezone.now())
+    # Sin savepoint: va dentro del guardado del pedido, y si falla se revierte con él
+    with transaction.atomic(savepoint=False):
+        _sumar_productos(fecha, list(_lineas_pedido(pedido.pk)), signo)
+
+
+def reconstruir_resumenes(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes desde las facturas y los pedidos pagados (ambas
+    fechas inclusive; sin fechas, todo el historial). Devuelve (días, filas de
+    producto) escritos.
+    """
+    tz = timezone.get_current_timezone()
+    dia = TruncDate('fecha_emision', tzinfo=tz)
+    facturas = Factura.objects.annotate(dia=dia)
+    detalles = DetallePedido.objects.filter(pedido__estado='pagado', pedido__fecha_pago__isnull=False).annotate(
+        dia=TruncDate('pedido__fecha_pago', tzinfo=tz))
+
+    filtros_resumen = {}
+    if desde:
+        facturas = facturas.filter(dia__gte=desde)
+        detalles = detalles.filter(dia__gte=desde)
+        filtros_resumen['fecha__gte'] = desde
+    if hasta:
+        facturas = facturas.filter(dia__lte=hasta)
+        detalles = detalles.filter(dia__lte=hasta)
+        filtros_resumen['fecha__lte'] = hasta
+
+    ventas = [
+        VentaDiaria(fecha=fila['dia'], origen=fila['origen'], total=fila['ingresos'], num_facturas=fila['num'])
+        for fila in facturas.values('dia', 'origen').annotate(ingresos=Sum('total'), num=Count('id'))
+    ]
+    productos = [
+        VentaProductoDiaria(fecha=fila['dia'], producto_id=fila['producto_id'],
+                            precio_unitario=fila['precio_unitario'],
+                            cantidad=fila['unidades'], total=fila['ingresos'])
+        for fila in detalles.values('dia', 'producto_id', 'precio_unitario').annotate(
+            unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_unitario')))
+    ]
+
+    with transaction.atomic():
+        VentaDiaria.objects.filter(**filtros_resumen).delete()
+        VentaProductoDiaria.objects.filter(**filtros_resumen).delete()
+        VentaDiaria.objects.bulk_create(ventas, batch_size=1000)
+        VentaProductoDiaria.objects.bulk_create(productos, batch_size=1000)
+    return len(ventas), len(productos)
+
+
+def ventas_por_dia(desde, hasta):
+    """{fecha: (total, num_facturas)} de todos los módulos entre dos fechas inclusive."""
+    filas = (VentaDiaria.objects.filter(fecha__range=(desde, hasta))
+             .values('fecha').annotate(ingresos=Sum('total'), num=Sum('num_facturas')))
+    return {fila['fecha']: (fila['ingresos'], fila['num']) for fila in filas}
+
+
+def serie_ventas(desde, hasta):
+    """Lista [(fecha, total)] día por día (incluye días sin ventas en 0)."""
+    por_dia = ventas_por_dia(desde, hasta)
+    dias = (hasta - desde).days + 1
+    return [
+        (fecha, por_dia.get(fecha, (0, 0))[0])
+        for fecha in (desde + datetime.timedelta(days=i) for i in range(dias))
+    ]
+
+
+def productos_vendidos(desde=None, hasta=None):
+    """Resumen por producto y precio (mismas columnas que el reporte de ventas)."""
+    filas = VentaProductoDiaria.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    filas = (filas.values('producto__nombre', 'precio_unitario')
+             .annotate(cantidad_vendida=Sum('cantidad'), ingresos=Sum('total'))
+             .filter(cantidad_vendida__gt=0)
+             .order_by('-cantidad_vendida'))
+    return [
+        {'producto__nombre': fila['producto__nombre'], 'precio_unitario': fila['precio_unitario'],
+         'cantidad_vendida': fila['cantidad_vendida'], 'total': fila['ingresos']}
+        for fila in filas
+    ]
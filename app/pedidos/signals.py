@@ -0,0 +1,67 @@
+# 📁 pedidos/signals.py
+# Detecta cuándo un pedido entra o sale de la cocina y avisa a las pantallas;
+# invalida la grilla del POS cuando cambia el menú; mantiene los resúmenes diarios de ventas
+# (lo facturado con Factura, las unidades por producto con la entrada / salida de 'pagado')
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CategoriaProducto, Factura, Pedido, Producto, VarianteProducto
+from .services.cocina import notificar_cocina
+from .services.menu import invalidar_menu
+from .services.ventas import aplicar_factura, aplicar_pago_pedido
+
+EVENTO_SALIDA_COCINA = {'listo': 'listo', 'cancelado': 'cancelado'}
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_guardado(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_estado_original', None)
+    instance._estado_original = instance.estado
+
+    if instance.estado == 'confirmado':
+        # Nuevo en cocina o cambió algo (nota, items): se reenvía la tarjeta
+        notificar_cocina(instance.pk, 'confirmado')
+    elif anterior == 'confirmado':
+        notificar_cocina(instance.pk, EVENTO_SALIDA_COCINA.get(instance.estado, 'retirado'))
+
+    if kwargs.get('raw'):
+        return
+    if instance.estado == 'pagado' and anterior != 'pagado':
+        aplicar_pago_pedido(instance)
+    elif anterior == 'pagado' and instance.estado != 'pagado':
+        aplicar_pago_pedido(instance, signo=-1)
+
+
+@receiver(pre_delete, sender=Pedido)
+def pedido_por_eliminar(sender, instance, **kwargs):
+    # pre_delete: los items todavía existen para descontarlos
+    if getattr(instance, '_estado_original', instance.estado) == 'pagado':
+        aplicar_pago_pedido(instance, signo=-1)
+
+
+@receiver(post_delete, sender=Pedido)
+def pedido_eliminado(sender, instance, **kwargs):
+    if getattr(instance, '_estado_original', instance.estado) == 'confirmado':
+        notificar_cocina(instance.pk, 'retirado')
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=CategoriaProducto)
+@receiver(post_delete, sender=CategoriaProducto)
+@receiver(post_save, sender=VarianteProducto)
+@receiver(post_delete, sender=VarianteProducto)
+def menu_modificado(sender, **kwargs):
+    invalidar_menu()
+
+
+@receiver(post_save, sender=Factura)
+def factura_creada(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        aplicar_factura(instance)
+
+
+@receiver(pre_delete, sender=Factura)
+def factura_eliminada(sender, instance, **kwargs):
+    # pre_delete: al borrar el pedido en cascada los items aún existen aquí
+    aplicar_factura(instance, signo=-1)
@@ -0,0 +1,105 @@
+# 📁 pedidos/tasks.py
+# Tareas en segundo plano (Celery) del módulo de pedidos
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Factura
+from .services.sri_api import enviar_factura_sri, SRIErrorTransitorio
+
+logger = logging.getLogger(__name__)
+
+
+REINTENTO_BASE = 5       # 5s, 10s, 20s, 40s... (exponencial)
+REINTENTO_MAXIMO = 600   # como máximo 10 minutos entre intentos
+MAX_REINTENTOS = getattr(settings, 'SRI_MAX_REINTENTOS', 8)
+
+
+def ventana_reintentos():
+    """Segundos que puede tardar la cadena completa de reintentos de una factura."""
+    esperas = sum(min(REINTENTO_BASE * 2 ** n, REINTENTO_MAXIMO) for n in range(MAX_REINTENTOS))
+    return esperas + (MAX_REINTENTOS + 1) * getattr(settings, 'SRI_API_TIMEOUT', 20)
+
+
+def enviar_factura_bloqueada(factura_id, reintentar=False):
+    """
+    Envía la factura al SRI con su fila tomada mientras dura el POST.
+    Retorna (exito, mensaje), o None si ya tiene clave de acceso o si otro
+    intento (tarea, barrido, botón del gerente) la está enviando: SKIP LOCKED
+    la salta en lugar de postearla dos veces.
+    """
+    with transaction.atomic():
+        if not Factura.objects.select_for_update(skip_locked=True).filter(
+                pk=factura_id, clave_acceso__isnull=True).exclude(estado_sri='autorizado').exists():
+            return None
+        return enviar_factura_sri(factura_id, reintentar=reintentar)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(SRIErrorTransitorio,),
+    retry_backoff=REINTENTO_BASE,
+    retry_backoff_max=REINTENTO_MAXIMO,
+    retry_jitter=True,
+    max_retries=MAX_REINTENTOS,
+)
+def enviar_factura_sri_task(self, factura_id):
+    """Envía una factura al SRI fuera del request del cajero, con reintentos."""
+    try:
+        resultado = enviar_factura_bloqueada(factura_id, reintentar=True)
+    except SRIErrorTransitorio as e:
+        if not self.request.is_eager:
+            raise  # autoretry_for la reprograma con backoff
+        # Sin worker (modo eager) reintentar bloquearía el request del cajero: queda 'pendiente' para el barrido
+        logger.warning(f"SRI factura #{factura_id}: {e}; queda pendiente para el barrido")
+        return str(e)
+    if resultado is None:
+        return 'Factura ya procesada o en envío'
+    exito, mensaje = resultado
+    logger.info(f"SRI factura #{factura_id} (intento {self.request.retries + 1}): {mensaje}")
+    return mensaje
+
+
+def encolar_envio_sri(factura):
+    """
+    Marca la factura como 'pendiente' y la encola para enviarla al SRI
+    cuando la transacción actual se confirme. No bloquea el request.
+    """
+    Factura.objects.filter(pk=factura.pk).update(estado_sri='pendiente')
+    factura.estado_sri = 'pendiente'
+    transaction.on_commit(lambda: _publicar_envio_sri(factura.pk))
+
+
+def _publicar_envio_sri(factura_id):
+    try:
+        enviar_factura_sri_task.delay(factura_id)
+    except Exception:
+        # Si el broker no responde la factura queda 'pendiente' y el barrido periódico la reenvía
+        logger.exception(f"No se pudo encolar la factura #{factura_id} para el SRI")
+
+
+@shared_task
+def reenviar_facturas_pendientes(antiguedad_minutos=None):
+    """
+    Reencola facturas que siguen 'pendiente' sin clave de acceso (barrido periódico).
+    Por defecto solo las que ya agotaron su cadena de reintentos, para no
+    abrir una segunda cadena sobre una factura que todavía se está reintentando.
+    """
+    if antiguedad_minutos is None:
+        limite = timezone.now() - timedelta(seconds=ventana_reintentos())
+    else:
+        limite = timezone.now() - timedelta(minutes=antiguedad_minutos)
+    ids = list(Factura.objects.filter(
+        tipo_comprobante='factura',
+        estado_sri='pendiente',
+        clave_acceso__isnull=True,
+        fecha_emision__lt=limite,
+    ).values_list('id', flat=True))
+
+    for factura_id in ids:
+        _publicar_envio_sri(factura_id)
+    return len(ids)
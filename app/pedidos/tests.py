@@ -1,7 +1,38 @@
+import asyncio
+import datetime
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 
-from django.test import TestCase
-from .models import Mesa, Producto, Pedido
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from caja.models import SesionCaja
+from clientes.models import Cliente
+from core.models import ConfiguracionSRI
+from core.pruebas import PresupuestoConsultasMixin
+from inventario.models import Insumo, Receta
 from usuarios.models import Usuario
+from .consumers import CocinaConsumer
+from .models import (
+    CategoriaProducto, DetallePedido, Factura, Mesa, Pedido, Producto,
+    VarianteProducto, VentaDiaria, VentaProductoDiaria,
+)
+from .services.cocina import GRUPO_COCINA
+from .services.sri_api import SRIErrorTransitorio
+from .tasks import enviar_factura_sri_task, encolar_envio_sri, reenviar_facturas_pendientes, ventana_reintentos
+
 
 class PedidosModelTest(TestCase):
 
@@ -44,4 +75,675 @@ class PedidosModelTest(TestCase):
         # Volvemos a leer de la base de datos
         mesa_actualizada = Mesa.objects.get(numero=99)
         self.assertEqual(mesa_actualizada.estado, 'ocupada')
-        print("✅ Test de Estado de Mesa: OK")
\ No newline at end of file
+        print("✅ Test de Estado de Mesa: OK")
+
+# --- ENVÍO SRI EN SEGUNDO PLANO (contra un servidor HTTP local de prueba) ---
+class StubSRIHandler(BaseHTTPRequestHandler):
+    """Simula el API de Fronteratech: responde los códigos de `respuestas` en orden."""
+    respuestas = []
+    peticiones = 0
+    ultimo_payload = None
+    numero_forzado = None  # el API numera por su cuenta e ignora el secuencial enviado
+
+    def do_POST(self):
+        StubSRIHandler.peticiones += 1
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        StubSRIHandler.ultimo_payload = payload
+        codigo = StubSRIHandler.respuestas.pop(0) if StubSRIHandler.respuestas else 200
+        if codigo == 200:
+            cuerpo = {'success': True, 'invoice': {
+                'status': 'AUTORIZADO',
+                'access_key': '1' * 49,
+                'number': StubSRIHandler.numero_forzado or '-'.join(
+                    payload[c] for c in ('establishment', 'emission_point', 'sequential')),
+            }}
+        else:
+            cuerpo = {'success': False, 'message': 'Servicio no disponible'}
+        data = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorSRIMixin:
+    """Levanta el API simulado y deja una factura lista para enviar."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubSRIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubSRIHandler.respuestas = []
+        StubSRIHandler.peticiones = 0
+        StubSRIHandler.numero_forzado = None
+        ConfiguracionSRI.objects.create(
+            api_url=f'http://127.0.0.1:{self.server.server_port}/api/',
+            api_token='token-prueba',
+        )
+        producto = Producto.objects.create(nombre="Café", precio=2.50, stock=10)
+        pedido = Pedido.objects.create(estado='confirmado')
+        DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=2)
+        self.factura = Factura.objects.create(
+            pedido=pedido, razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999',
+            subtotal=5, total=5,
+        )
+
+
+class EnvioSRITest(ServidorSRIMixin, TestCase):
+
+    def test_encolar_deja_factura_pendiente(self):
+        """Al encolar, la factura queda 'pendiente' y el envío espera al commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            encolar_envio_sri(self.factura)
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.estado_sri, 'pendiente')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(StubSRIHandler.peticiones, 0)
+
+    def test_envio_autorizado(self):
+        """La tarea actualiza estado, clave de acceso y fecha de autorización"""
+        enviar_factura_sri_task.apply(args=[self.factura.id])
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.estado_sri, 'autorizado')
+        self.assertEqual(self.factura.clave_acceso, '1' * 49)
+        self.assertEqual(self.factura.secuencial, '000000001')
+        self.assertIsNotNone(self.factura.fecha_autorizacion)
+        # El número va en el payload: el SRI autoriza el mismo que se asignó localmente
+        self.assertEqual(StubSRIHandler.ultimo_payload['sequential'], '000000001')
+
+    def test_numero_distinto_del_api_queda_registrado_como_error(self):
+        """Si el API no respeta el número enviado, se guarda el autorizado y se deja el error en el log"""
+        StubSRIHandler.numero_forzado = '001-001-000000123'
+        with self.assertLogs('pedidos.services.sri_api', 'ERROR') as logs:
+            enviar_factura_sri_task.apply(args=[self.factura.id])
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.secuencial, '000000123')
+        self.assertIn('001-001-000000001', logs.output[0])
+
+    def test_falla_temporal_con_worker_se_reintenta(self):
+        """Con worker, un 503 no rechaza la factura: la excepción llega a autoretry_for"""
+        StubSRIHandler.respuestas = [503]
+        with self.assertRaises(SRIErrorTransitorio):
+            enviar_factura_sri_task(self.factura.id)  # llamada directa: no es eager
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.estado_sri, 'borrador')
+
+    def test_falla_temporal_sin_worker_no_bloquea_el_request(self):
+        """En modo eager no se reintenta en línea: la factura queda pendiente para el barrido"""
+        Factura.objects.filter(pk=self.factura.pk).update(estado_sri='pendiente')
+        StubSRIHandler.respuestas = [503, 503, 200]
+        enviar_factura_sri_task.apply(args=[self.factura.id])
+        self.factura.refresh_from_db()
+        self.assertEqual(StubSRIHandler.peticiones, 1)
+        self.assertEqual(self.factura.estado_sri, 'pendiente')
+
+    def test_barrido_espera_a_que_termine_la_cadena_de_reintentos(self):
+        """El barrido no abre una segunda cadena sobre una factura que aún se reintenta"""
+        ahora = timezone.now()
+        Factura.objects.filter(pk=self.factura.pk).update(
+            estado_sri='pendiente', fecha_emision=ahora - timedelta(seconds=ventana_reintentos() - 60))
+        self.assertEqual(reenviar_facturas_pendientes(), 0)
+        Factura.objects.filter(pk=self.factura.pk).update(fecha_emision=ahora - timedelta(seconds=ventana_reintentos() + 60))
+        self.assertEqual(reenviar_facturas_pendientes(), 1)
+        self.assertEqual(StubSRIHandler.peticiones, 1)
+
+    def test_no_reenvia_factura_ya_procesada(self):
+        """Si la factura ya tiene clave de acceso, la tarea no vuelve a llamar al API"""
+        Factura.objects.filter(pk=self.factura.pk).update(clave_acceso='9' * 49)
+        enviar_factura_sri_task.apply(args=[self.factura.id])
+        self.assertEqual(StubSRIHandler.peticiones, 0)
+
+
+class ReenvioGerenteTest(ServidorSRIMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(Usuario.objects.create_user(
+            username='gerente_sri', email='gerente_sri@test.com', password='x', rol='gerente'))
+
+    def test_reenviar_no_postea_factura_en_envio(self):
+        """Si la tarea o el barrido tienen la factura tomada, el botón del gerente no la postea otra vez"""
+        tomada, liberar = threading.Event(), threading.Event()
+
+        def envio_en_curso():
+            try:
+                with transaction.atomic():
+                    list(Factura.objects.select_for_update().filter(pk=self.factura.pk))
+                    tomada.set()
+                    liberar.wait(5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=envio_en_curso)
+        hilo.start()
+        try:
+            self.assertTrue(tomada.wait(5))
+            respuesta = self.client.get(reverse('pedidos:enviar_factura_sri', args=[self.factura.pk]))
+        finally:
+            liberar.set()
+            hilo.join()
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(StubSRIHandler.peticiones, 0)
+
+    def test_reenviar_factura_autorizada_no_llama_al_api(self):
+        Factura.objects.filter(pk=self.factura.pk).update(estado_sri='autorizado', clave_acceso='9' * 49)
+        self.client.get(reverse('pedidos:enviar_factura_sri', args=[self.factura.pk]))
+        self.assertEqual(StubSRIHandler.peticiones, 0)
+
+    def test_reenviar_factura_libre(self):
+        self.client.get(reverse('pedidos:enviar_factura_sri', args=[self.factura.pk]))
+        self.factura.refresh_from_db()
+        self.assertEqual(StubSRIHandler.peticiones, 1)
+        self.assertEqual(self.factura.estado_sri, 'autorizado')
+
+
+# --- TOTAL DESNORMALIZADO DEL PEDIDO ---
+class TotalPedidoTest(TestCase):
+
+    def setUp(self):
+        self.cafe = Producto.objects.create(nombre="Café", precio='2.50', stock=50)
+        self.pan = Producto.objects.create(nombre="Pan", precio='0.75', stock=50)
+        self.pedido = Pedido.objects.create(estado='borrador')
+
+    def test_total_se_mantiene_al_agregar_modificar_y_borrar(self):
+        """El total almacenado sigue a los items sin recorrerlos"""
+        item = DetallePedido.objects.create(pedido=self.pedido, producto=self.cafe, cantidad=2)
+        DetallePedido.objects.create(pedido=self.pedido, producto=self.pan, cantidad=4)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('8.00'))
+        self.assertEqual(self.pedido.cantidad_items, 6)
+
+        item = DetallePedido.objects.get(pk=item.pk)
+        item.cantidad = 1
+        item.save()
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('5.50'))
+
+        item.delete()
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('3.00'))
+        self.assertEqual(self.pedido.cantidad_items, 4)
+
+    def test_instancia_en_memoria_se_actualiza(self):
+        """Las vistas renderizan el pedido que ya tienen cargado: debe reflejar el cambio"""
+        item = DetallePedido(pedido=self.pedido, producto=self.cafe, cantidad=3)
+        item.save()
+        self.assertEqual(self.pedido.total, Decimal('7.50'))
+
+    def test_save_no_pisa_acumulados_de_otro_request(self):
+        """Un pedido cargado antes de que otro request agregue items no revierte el total al guardarse"""
+        atrasado = Pedido.objects.get(pk=self.pedido.pk)
+        DetallePedido.objects.create(pedido=self.pedido, producto=self.cafe, cantidad=2)
+        atrasado.estado = 'confirmado'
+        atrasado.save()
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.estado, self.pedido.total, self.pedido.cantidad_items), ('confirmado', Decimal('5.00'), 2))
+
+    def test_lineas_atrasadas_no_aplican_dos_veces_el_cambio(self):
+        """Dos requests con la misma línea cargada (doble toque en "+") dejan el total igual a la suma de las líneas"""
+        item = DetallePedido.objects.create(pedido=self.pedido, producto=self.cafe, cantidad=1)
+        primera, segunda = DetallePedido.objects.get(pk=item.pk), DetallePedido.objects.get(pk=item.pk)
+        primera.cantidad = segunda.cantidad = 2
+        primera.save()
+        segunda.save()
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.total, self.pedido.cantidad_items), (Decimal('5.00'), 2))
+
+        primera.delete()
+        segunda.delete()
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.total, self.pedido.cantidad_items), (Decimal('0.00'), 0))
+
+    def test_recalcular_totales(self):
+        """recalcular_totales corrige un total desajustado"""
+        DetallePedido.objects.create(pedido=self.pedido, producto=self.cafe, cantidad=2)
+        Pedido.objects.filter(pk=self.pedido.pk).update(total=0, cantidad_items=0)
+        self.pedido.recalcular_totales()
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('5.00'))
+        self.assertEqual(self.pedido.cantidad_items, 2)
+
+# --- COCINA EN TIEMPO REAL (WebSocket, capa de canales en memoria) ---
+CAPA_EN_MEMORIA = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=CAPA_EN_MEMORIA)
+class CocinaTiempoRealTest(TestCase):
+
+    def setUp(self):
+        self.capa = get_channel_layer()
+        self.canal = async_to_sync(self.capa.new_channel)()
+        async_to_sync(self.capa.group_add)(GRUPO_COCINA, self.canal)
+
+        self.mesero = Usuario.objects.create_user(username='mesero_ws', email='mesero_ws@test.com', password='x', rol='mesero')
+        self.cocinero = Usuario.objects.create_user(username='cocina_ws', email='cocina_ws@test.com', password='x', rol='cocina')
+        self.mesa = Mesa.objects.create(numero=7, capacidad=4)
+        self.pedido = Pedido.objects.create(mesa=self.mesa, mesero=self.mesero, estado='borrador')
+        lomo = Producto.objects.create(nombre="Lomo Saltado", precio='8.00', stock=10)
+        DetallePedido.objects.create(pedido=self.pedido, producto=lomo, cantidad=2)
+
+    def _recibir(self):
+        async def recibir():
+            return await asyncio.wait_for(self.capa.receive(self.canal), timeout=1)
+        return async_to_sync(recibir)()
+
+    def test_confirmar_envia_tarjeta(self):
+        """Al confirmar, la cocina recibe solo la tarjeta del pedido nuevo"""
+        self.client.force_login(self.mesero)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('pedidos:confirmar_pedido', args=[self.pedido.id]))
+
+        mensaje = self._recibir()
+        self.assertEqual(mensaje['evento'], 'confirmado')
+        self.assertEqual(mensaje['pedido_id'], self.pedido.id)
+        self.assertIn('pedido-cocina-%d' % self.pedido.id, mensaje['html'])
+        self.assertIn('Lomo Saltado', mensaje['html'])
+
+    def test_terminar_y_eliminar_quitan_tarjeta(self):
+        """Listo / eliminado solo envían el id para quitar la tarjeta"""
+        pedido = Pedido.objects.get(pk=self.pedido.pk)
+        pedido.estado = 'confirmado'
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+        self._recibir()
+
+        self.client.force_login(self.cocinero)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('pedidos:terminar_pedido', args=[self.pedido.id]))
+        mensaje = self._recibir()
+        self.assertEqual((mensaje['evento'], mensaje['pedido_id']), ('listo', self.pedido.id))
+        self.assertNotIn('html', mensaje)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            otro = Pedido.objects.create(estado='confirmado')
+        self._recibir()
+        otro = Pedido.objects.get(pk=otro.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.delete()
+        self.assertEqual(self._recibir()['evento'], 'retirado')
+
+    def test_cambios_fuera_de_cocina_no_se_envian(self):
+        """Editar un borrador no genera tráfico hacia la cocina"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.observacion = 'Sin cebolla'
+            self.pedido.save()
+        with self.assertRaises(asyncio.TimeoutError):
+            self._recibir()
+
+
+@override_settings(CHANNEL_LAYERS=CAPA_EN_MEMORIA)
+class CocinaConsumerTest(SimpleTestCase):
+    # El consumer no consulta la BD: basta con usuarios en memoria
+
+    def setUp(self):
+        self.mesero = Usuario(username='mesero_c', rol='mesero')
+        self.cocinero = Usuario(username='cocina_c', rol='cocina')
+
+    async def _conectar(self, user):
+        comunicador = WebsocketCommunicator(CocinaConsumer.as_asgi(), '/ws/cocina/')
+        comunicador.scope['user'] = user
+        conectado, _ = await comunicador.connect()
+        return comunicador, conectado
+
+    async def test_solo_roles_de_cocina(self):
+        _, conectado = await self._conectar(self.mesero)
+        self.assertFalse(conectado)
+
+    async def test_reenvia_eventos_del_grupo(self):
+        comunicador, conectado = await self._conectar(self.cocinero)
+        self.assertTrue(conectado)
+
+        await get_channel_layer().group_send(GRUPO_COCINA, {
+            'type': 'cocina.evento', 'evento': 'listo', 'pedido_id': 5,
+        })
+        self.assertEqual(await comunicador.receive_json_from(), {'evento': 'listo', 'pedido_id': 5, 'html': ''})
+        await comunicador.disconnect()
+
+
+# --- GRILLA DEL POS CACHEADA ---
+class GrillaPOSCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.mesero = Usuario.objects.create_user(username='mesero_pos', email='mesero_pos@test.com', password='x', rol='mesero')
+        SesionCaja.objects.create(usuario=self.mesero, monto_inicial=0)
+        self.mesa = Mesa.objects.create(numero=12, capacidad=4)
+        bebidas = CategoriaProducto.objects.create(nombre='Bebidas')
+        self.jugo = Producto.objects.create(nombre='Jugo de Mora', precio='1.50', stock=20, categoria=bebidas)
+        self.client.force_login(self.mesero)
+        self.url = reverse('pedidos:detalle_mesa', args=[self.mesa.id])
+
+    def _consultas_de_productos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.url)
+        return respuesta, [q['sql'] for q in consultas if 'FROM "pedidos_producto"' in q['sql']]
+
+    def test_segunda_visita_no_consulta_productos(self):
+        respuesta, consultas = self._consultas_de_productos()
+        self.assertContains(respuesta, 'Jugo de Mora')
+        self.assertTrue(consultas)
+
+        respuesta, consultas = self._consultas_de_productos()
+        self.assertContains(respuesta, 'Jugo de Mora')
+        self.assertEqual(consultas, [])
+        # El pedido va fuera del fragmento cacheado
+        self.assertContains(respuesta, '"pedido_id": "%d"' % respuesta.context['pedido'].id)
+
+    def test_editar_producto_invalida_grilla(self):
+        self.client.get(self.url)
+        self.jugo.nombre = 'Jugo de Naranjilla'
+        self.jugo.save()
+        self.assertContains(self.client.get(self.url), 'Jugo de Naranjilla')
+
+    def test_agregar_desde_grilla_cacheada(self):
+        pedido = Pedido.objects.create(mesa=self.mesa, mesero=self.mesero, estado='borrador')
+        self.client.post(reverse('pedidos:agregar_producto_menu', args=[self.jugo.id]), {'pedido_id': pedido.id})
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.cantidad_items, 1)
+
+
+# --- RESÚMENES DIARIOS DE VENTAS ---
+class VentasDiariasTest(TestCase):
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create_user(username='gerente_ventas', email='gerente_ventas@test.com', password='x', rol='gerente')
+        self.cafe = Producto.objects.create(nombre="Café", precio='2.50', stock=50)
+        self.pan = Producto.objects.create(nombre="Pan", precio='0.75', stock=50)
+
+    def _pagar(self, cafes, panes=0):
+        pedido = Pedido.objects.create(estado='entregado')
+        DetallePedido.objects.create(pedido=pedido, producto=self.cafe, cantidad=cafes)
+        if panes:
+            DetallePedido.objects.create(pedido=pedido, producto=self.pan, cantidad=panes)
+        pedido.refresh_from_db()
+        Factura.objects.create(pedido=pedido, subtotal=pedido.total, total=pedido.total,
+                               razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999')
+        return pedido
+
+    def test_factura_suma_y_eliminar_resta(self):
+        pedido = self._pagar(2, panes=4)
+        self._pagar(1)
+        hoy = VentaDiaria.objects.get()
+        self.assertEqual((hoy.total, hoy.num_facturas), (Decimal('10.50'), 2))
+        self.assertEqual(VentaProductoDiaria.objects.get(producto=self.cafe).cantidad, 3)
+
+        self.client.force_login(self.gerente)
+        self.client.post(reverse('pedidos:eliminar_pedido', args=[pedido.id]))
+        hoy.refresh_from_db()
+        self.assertEqual((hoy.total, hoy.num_facturas), (Decimal('2.50'), 1))
+        self.assertEqual(VentaProductoDiaria.objects.get(producto=self.cafe).cantidad, 1)
+        self.assertEqual(VentaProductoDiaria.objects.get(producto=self.pan).cantidad, 0)
+
+    def test_reabrir_resta_la_factura(self):
+        pedido = self._pagar(2)
+        self.client.force_login(self.gerente)
+        self.client.get(reverse('pedidos:reabrir_pedido', args=[pedido.id]))
+        self.assertEqual(VentaDiaria.objects.get().total, 0)
+
+    def test_reconstruir_coincide_con_incremental(self):
+        self._pagar(2, panes=1)
+        self._pagar(3)
+        incremental = list(VentaProductoDiaria.objects.order_by('producto_id').values_list('producto_id', 'cantidad', 'total'))
+        VentaDiaria.objects.update(total=0)
+        VentaProductoDiaria.objects.all().delete()
+
+        call_command('reconstruir_ventas_diarias', stdout=StringIO())
+        self.assertEqual(VentaDiaria.objects.get().total, Decimal('13.25'))
+        self.assertEqual(list(VentaProductoDiaria.objects.order_by('producto_id').values_list('producto_id', 'cantidad', 'total')), incremental)
+
+    def test_dashboard_lee_resumenes(self):
+        self._pagar(2)
+        self.client.force_login(self.gerente)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('usuarios:dashboard_gerente'))
+        self.assertEqual(respuesta.context['total_ventas_hoy'], Decimal('5.00'))
+        self.assertEqual(respuesta.context['top_labels'], ['Café'])
+        self.assertFalse([q for q in consultas if 'pedidos_factura' in q['sql']])
+        respuesta = self.client.get(reverse('usuarios:reportes_ventas'), {'filtro': 'hoy'})
+        self.assertEqual(respuesta.context['total_ingresos'], Decimal('5.00'))
+
+    def test_pedido_cobrado_sin_factura_cuenta_en_productos(self):
+        """pagar_pedido cierra la venta sin comprobante: igual aparece en el top y en los reportes"""
+        pedido = Pedido.objects.create(estado='entregado')
+        DetallePedido.objects.create(pedido=pedido, producto=self.pan, cantidad=3)
+        self.client.force_login(self.gerente)
+        self.client.get(reverse('pedidos:pagar_pedido', args=[pedido.id]))
+        pedido.refresh_from_db()
+        self.assertIsNotNone(pedido.fecha_pago)
+
+        respuesta = self.client.get(reverse('usuarios:dashboard_gerente'))
+        self.assertEqual((respuesta.context['top_labels'], respuesta.context['top_data']), (['Pan'], [3]))
+        for filtros in ({}, {'filtro': 'hoy'}):
+            respuesta = self.client.get(reverse('usuarios:reportes_ventas'), filtros)
+            self.assertEqual(respuesta.context['total_ingresos'], Decimal('2.25'))
+
+        # Reabrirlo lo saca de los resúmenes
+        self.client.get(reverse('pedidos:reabrir_pedido', args=[pedido.id]))
+        self.assertEqual(VentaProductoDiaria.objects.get(producto=self.pan).cantidad, 0)
+
+
+# --- AGENDA (FullCalendar) ---
+class AgendaPedidosTest(TestCase):
+
+    def setUp(self):
+        self.mesero = Usuario.objects.create_user(username='mesero_agenda', email='mesero_agenda@test.com', password='x', rol='mesero')
+        self.client.force_login(self.mesero)
+        self.cafe = Producto.objects.create(nombre="Café", precio='2.50', stock=50)
+        self.entrega = timezone.make_aware(datetime.datetime(2025, 6, 10, 12, 0))
+
+    def _programar(self, cantidad, dias=0):
+        cliente = Cliente.objects.create(nombres=f'Cliente {cantidad}-{dias}', cedula_o_ruc=f'17{cantidad:04d}{dias:04d}')
+        pedido = Pedido.objects.create(cliente=cliente, fecha_entrega=self.entrega + datetime.timedelta(days=dias))
+        DetallePedido.objects.create(pedido=pedido, producto=self.cafe, cantidad=cantidad)
+        return pedido
+
+    def _consultar(self):
+        return self.client.get(reverse('pedidos:api_pedidos_agenda'), {'start': '2025-06-01', 'end': '2025-07-01'})
+
+    def test_consultas_constantes_y_ventana(self):
+        self._programar(1)
+        self._programar(2, dias=90)  # fuera de la ventana
+        self._consultar()  # la primera escritura de last_activity no cuenta en la comparación
+        with CaptureQueriesContext(connection) as pocos:
+            datos = self._consultar().json()
+        self.assertEqual([e['extendedProps']['valor'] for e in datos], [2.5])
+
+        for cantidad in range(3, 8):
+            self._programar(cantidad, dias=cantidad)
+        with CaptureQueriesContext(connection) as muchos:
+            datos = self._consultar().json()
+        self.assertEqual(len(datos), 6)
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertIn('7x Café', [e['extendedProps']['items'] for e in datos])
+
+    def test_cambio_de_items_invalida_etag(self):
+        pedido = self._programar(1)
+        etag = self._consultar()['ETag']
+        DetallePedido.objects.create(pedido=pedido, producto=self.cafe, cantidad=1)
+        respuesta = self.client.get(reverse('pedidos:api_pedidos_agenda'), {'start': '2025-06-01', 'end': '2025-07-01'},
+                                    HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_items_o_cliente_sin_tocar_updated_at_invalidan_etag(self):
+        pedido = self._programar(2)
+        otro_cliente = Cliente.objects.create(nombres='Otro', cedula_o_ruc='1799999999')
+        cambios = [
+            lambda: DetallePedido.objects.filter(pedido=pedido).update(cantidad=3),
+            lambda: Pedido.objects.filter(pk=pedido.pk).update(cliente=otro_cliente),
+        ]
+        for cambio in cambios:
+            etag = self._consultar()['ETag']
+            cambio()
+            respuesta = self.client.get(reverse('pedidos:api_pedidos_agenda'), {'start': '2025-06-01', 'end': '2025-07-01'},
+                                        HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(respuesta.status_code, 200)
+
+
+class HistorialPeriodoTest(TestCase):
+
+    def test_incluye_creados_o_pagados_en_el_dia(self):
+        gerente = Usuario.objects.create_user(username='gerente_hist', email='gerente_hist@test.com', password='x', rol='gerente')
+        self.client.force_login(gerente)
+        cafe = Producto.objects.create(nombre="Café", precio='2.50', stock=50)
+
+        hoy = Pedido.objects.create(estado='confirmado')
+        anterior = Pedido.objects.create(estado='entregado')
+        viejo = Pedido.objects.create(estado='entregado')
+        hace_dos_dias = timezone.now() - datetime.timedelta(days=2)
+        Pedido.objects.filter(pk__in=[anterior.pk, viejo.pk]).update(created_at=hace_dos_dias)
+        # Creado hace dos días pero pagado hoy: también aparece
+        DetallePedido.objects.create(pedido=anterior, producto=cafe, cantidad=1)
+        Factura.objects.create(pedido=anterior, subtotal='2.50', total='2.50', razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999')
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('pedidos:historial_pedidos'))
+        self.assertEqual({p.id for p in respuesta.context['pedidos']}, {hoy.id, anterior.id})
+        self.assertEqual(respuesta.context['total_ventas_hoy'], Decimal('2.50'))
+        self.assertFalse([q for q in consultas if 'DISTINCT' in q['sql'] or '::date' in q['sql']])
+
+
+# --- Ingeniería de menú ---
+class IngenieriaMenuTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gerente = Usuario.objects.create_user(username='gerente_menu', email='gerente_menu@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        harina = Insumo.objects.create(nombre="Harina", unidad_medida='kg', costo_unitario=Decimal('2.00'))
+        self.pizza = Producto.objects.create(nombre="Pizza", precio='10.00')
+        Receta.objects.create(producto=self.pizza, insumo=harina, cantidad_necesaria=Decimal('1.500'))
+        self.jugo = Producto.objects.create(nombre="Jugo", precio='2.00')
+        self.mora = VarianteProducto.objects.create(producto=self.jugo, nombre="Mora", precio='2.50')
+        self.te = Producto.objects.create(nombre="Té", precio='1.00')
+
+        self._vender((self.pizza, None, 4, '10.00'), (self.jugo, self.mora, 6, '2.50'))
+
+    def _vender(self, *lineas):
+        pedido = Pedido.objects.create(estado='pagado')
+        for producto, variante, cantidad, precio in lineas:
+            DetallePedido.objects.create(pedido=pedido, producto=producto, variante=variante,
+                                         cantidad=cantidad, precio_unitario=precio)
+        Factura.objects.create(pedido=pedido, subtotal=pedido.total, total=pedido.total,
+                               razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999')
+
+    def test_matriz_con_costos_y_mezcla(self):
+        respuesta = self.client.get(reverse('pedidos:ingenieria_menu'))
+        filas = {(f['producto'], f['variante']): f for f in respuesta.context['filas']}
+
+        pizza = filas[('Pizza', '')]
+        self.assertAlmostEqual(pizza['food_cost_pct'], 30.0)
+        self.assertAlmostEqual(pizza['margen_total'], 28.0)
+        self.assertAlmostEqual(pizza['mezcla_pct'], 40.0)
+        self.assertEqual(pizza['clasificacion'], 'Estrella')
+        # El jugo solo se vendió como variante: no aparece la fila suelta del producto
+        self.assertNotIn(('Jugo', ''), filas)
+        self.assertEqual(filas[('Jugo', 'Mora')]['clasificacion'], 'Caballo de batalla')
+        self.assertEqual(filas[('Té', '')]['clasificacion'], 'Perro')
+
+    def test_cuenta_pedidos_cobrados_sin_factura(self):
+        """Lo cobrado con pagar_pedido entra en la mezcla; lo que no se cobró, no"""
+        for estado in ('entregado', 'confirmado'):
+            pedido = Pedido.objects.create(estado=estado)
+            DetallePedido.objects.create(pedido=pedido, producto=self.te, cantidad=5)
+        self.client.get(reverse('pedidos:pagar_pedido', args=[pedido.id]))
+
+        filas = {(f['producto'], f['variante']): f for f in self.client.get(reverse('pedidos:ingenieria_menu')).context['filas']}
+        self.assertEqual(filas[('Té', '')]['unidades'], 5)
+
+    def test_consultas_no_crecen_con_las_ventas(self):
+        self.client.get(reverse('pedidos:ingenieria_menu'))  # calienta el costeo cacheado
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(reverse('pedidos:ingenieria_menu'))
+        for _ in range(5):
+            self._vender((self.te, None, 1, '1.00'), (self.pizza, None, 1, '10.00'))
+        with CaptureQueriesContext(connection) as despues:
+            self.client.get(reverse('pedidos:ingenieria_menu'))
+        self.assertEqual(len(despues), len(antes))
+
+    def test_exportar_csv(self):
+        respuesta = self.client.get(reverse('pedidos:ingenieria_menu'), {'formato': 'csv'})
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        lineas = respuesta.content.decode('utf-8-sig').splitlines()
+        self.assertTrue(lineas[0].startswith('Categoría,Producto,Variante,Precio,Costo,Food Cost %'))
+        self.assertIn('Sin categoría,Pizza,,10.00,3.00,30.00,7.00,4.00,40.00,40.00,28.00,Estrella', lineas)
+
+
+# --- PRESUPUESTO DE CONSULTAS DE LAS VISTAS DEL POS Y COCINA ---
+class PresupuestoConsultasPedidosTest(PresupuestoConsultasMixin, TestCase):
+
+    def setUp(self):
+        self.mesero = Usuario.objects.create_user(username='mesero_budget', email='mesero_budget@test.com', password='x', rol='mesero')
+        self.gerente = Usuario.objects.create_user(username='gerente_budget', email='gerente_budget@test.com', password='x', rol='gerente')
+        SesionCaja.objects.create(usuario=self.mesero, monto_inicial=0)
+        self.harina = Insumo.objects.create(nombre='Harina', unidad_medida='kg', stock_actual=1000, costo_unitario='1.00')
+        self.productos = []
+        self.mesa = Mesa.objects.create(numero=1, capacidad=4)
+        self.pedido_mesa = Pedido.objects.create(mesa=self.mesa, mesero=self.mesero, estado='borrador')
+        self.sembrar(2)
+        self.client.force_login(self.mesero)
+
+    def sembrar(self, cantidad):
+        """Más categorías, productos (con receta y variante), mesas y pedidos en cada estado."""
+        for _ in range(cantidad):
+            n = len(self.productos) + 1
+            categoria = CategoriaProducto.objects.create(nombre=f'Categoría {n}')
+            producto = Producto.objects.create(nombre=f'Producto {n}', precio='3.00', stock=100, categoria=categoria)
+            VarianteProducto.objects.create(producto=producto, nombre='Grande', precio='4.00')
+            Receta.objects.create(producto=producto, insumo=self.harina, cantidad_necesaria='0.100')
+            self.productos.append(producto)
+            mesa = Mesa.objects.create(numero=100 + n, capacidad=2)
+            DetallePedido.objects.create(pedido=self.pedido_mesa, producto=producto, cantidad=1)
+            for estado in ('confirmado', 'listo', 'entregado'):
+                pedido = Pedido.objects.create(mesa=mesa, mesero=self.mesero, estado=estado)
+                DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=2)
+                DetallePedido.objects.create(pedido=pedido, producto=self.productos[0], cantidad=1)
+
+    def _pedido_por_cobrar(self, productos):
+        pedido = Pedido.objects.create(mesero=self.mesero, estado='entregado')
+        for producto in productos:
+            DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=1)
+        return pedido
+
+    def test_panel_mesas(self):
+        self.comparar_consultas(13, self.sembrar, lambda: self.client.get(reverse('pedidos:panel_mesas')))
+
+    def test_detalle_mesa(self):
+        self.comparar_consultas(15, self.sembrar, lambda: self.client.get(reverse('pedidos:detalle_mesa', args=[self.mesa.id])))
+
+    def test_agregar_producto(self):
+        # Incluye el SELECT ... FOR UPDATE de la línea que DetallePedido.save relee antes de aplicar el delta
+        self.comparar_consultas(15, self.sembrar, lambda: self.client.post(
+            reverse('pedidos:agregar_producto_menu', args=[self.productos[0].id]), {'pedido_id': self.pedido_mesa.id}))
+
+    def test_procesar_pago(self):
+        self.comparar_consultas(
+            25,
+            self.sembrar,
+            lambda pedido: self.client.post(reverse('pedidos:procesar_pago', args=[pedido.id]),
+                                            {'tipo_documento': 'nota_entrega', 'efectivo_recibido': '100'}),
+            preparar=lambda: [self._pedido_por_cobrar(self.productos)],
+        )
+
+    def test_actualizar_cocina(self):
+        self.client.force_login(self.gerente)
+        self.comparar_consultas(10, self.sembrar, lambda: self.client.get(reverse('pedidos:actualizar_cocina')))
+
+    def test_check_notificaciones(self):
+        self.comparar_consultas(7, self.sembrar, lambda: self.client.get(reverse('pedidos:check_notificaciones')))
+
+    def test_historial_pedidos(self):
+        self.client.force_login(self.gerente)
+        self.comparar_consultas(13, self.sembrar, lambda: self.client.get(reverse('pedidos:historial_pedidos')))
@@ -8,6 +8,7 @@ urlpatterns = [
     path('mesa/<int:mesa_id>/', views.detalle_mesa, name='detalle_mesa'),
     path('gestion/', views.gestion_mesas, name='gestion_mesas'),
     path('agregar/<int:pedido_id>/<int:producto_id>/', views.agregar_producto, name='agregar_producto'),
+    path('agregar/<int:producto_id>/', views.agregar_producto, name='agregar_producto_menu'),  # pedido_id por POST (grilla cacheada)
     path('confirmar/<int:pedido_id>/', views.confirmar_pedido, name='confirmar_pedido'),
     path('pagar/<int:pedido_id>/', views.pagar_pedido, name='pagar_pedido'),
     path('cocina/', views.dashboard_cocina, name='dashboard_cocina'),
@@ -37,6 +38,7 @@ urlpatterns = [
     
     # Ingeniería de Menú
     path('productos/<int:producto_id>/ficha-tecnica/', views.ver_ficha_tecnica, name='ver_ficha_tecnica'),
+    path('reportes/ingenieria-menu/', views.ingenieria_menu, name='ingenieria_menu'),
 
     # Sub-recetas (Insumos)
     path('insumos/<int:insumo_id>/receta/', views.gestion_receta_insumo, name='gestion_receta_insumo'),
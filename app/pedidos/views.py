@@ -8,14 +8,21 @@ from django.http import JsonResponse, HttpResponse
 import json
 from django.views.decorators.http import etag
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from clientes.models import Cliente
 from .models import Pedido, Producto, DetallePedido, Mesa, Factura, CategoriaProducto, VarianteProducto
-from usuarios.models import AuditLog
-from inventario.models import MovimientoKardex, Insumo
+from usuarios.auditoria import auditar
+from inventario.models import Insumo
+from inventario.costeo import detalle_receta
+from inventario.services import descontar_inventario_pedido, revertir_inventario_pedido
+from .services.menu import version_menu
+from printer.rawbt import redirigir_con_rawbt, tomar_rawbt
 from .forms import ProductoForm # Importar Formulario
-from django.db.models import Avg, F, Count, ExpressionWrapper, DurationField
+from django.db.models import Avg, F, Count, Max, Prefetch, Q, Sum, ExpressionWrapper, DurationField, prefetch_related_objects
 from core.decorators import mesero_required, cocina_required, gerente_required
+from core.calendario import feed_calendario, rango_calendario
+from core.periodos import periodo_dia, periodo_dias
 
 # --- FUNCIÓN AUXILIAR PARA LA IP ---
 def get_client_ip(request):
@@ -33,18 +40,14 @@ from django.contrib import messages
 def _print_kitchen_order(pedido, request=None):
     """Imprime comanda de cocina al confirmar pedido"""
     try:
-        from printer.models import Printer, PrintJob, PrinterSettings
-        settings = PrinterSettings.get_settings()
+        from printer.models import PrintJob
+        from printer.enrutamiento import ruteo_impresion
+        ruteo = ruteo_impresion()  # configuración e impresora de la misma versión
+        settings = ruteo.config
         if not settings.auto_print_kitchen:
             return
 
-        printer = None
-        for p in Printer.objects.filter(is_active=True):
-            cfg = p.config or {}
-            if cfg.get('prints_command'):
-                printer = p
-                break
-
+        printer = ruteo.impresora_para('order')
         if not printer:
             return
 
@@ -87,12 +90,10 @@ def _print_kitchen_order(pedido, request=None):
         )
         
         if printer.connection_type == 'rawbt':
-            from printer.print_manager import PrinterManager
             import base64
-            hex_commands = PrinterManager.generate_print_commands(job)
             try:
-                b64_cmds = base64.b64encode(bytes.fromhex(hex_commands)).decode('utf-8')
-                return b64_cmds
+                # Bytes ya renderizados al crear el trabajo (sin pasar por hexadecimal)
+                return base64.b64encode(job.escpos_bytes).decode('utf-8')
             except Exception as e:
                 logger.error(f"Error base64 comanda: {e}")
                 
@@ -106,18 +107,14 @@ def _print_kitchen_order(pedido, request=None):
 def _print_receipt(factura, request=None):
     """Imprime ticket de venta al procesar pago"""
     try:
-        from printer.models import Printer, PrintJob, PrinterSettings
-        settings = PrinterSettings.get_settings()
+        from printer.models import PrintJob
+        from printer.enrutamiento import ruteo_impresion
+        ruteo = ruteo_impresion()  # configuración e impresora de la misma versión
+        settings = ruteo.config
         if not settings.auto_print_receipt:
             return
 
-        printer = None
-        for p in Printer.objects.filter(is_active=True):
-            cfg = p.config or {}
-            if cfg.get('prints_receipt'):
-                printer = p
-                break
-
+        printer = ruteo.impresora_para('receipt')
         if not printer:
             return
 
@@ -170,12 +167,10 @@ def _print_receipt(factura, request=None):
         )
         
         if printer.connection_type == 'rawbt':
-            from printer.print_manager import PrinterManager
             import base64
-            hex_commands = PrinterManager.generate_print_commands(job)
             try:
-                b64_cmds = base64.b64encode(bytes.fromhex(hex_commands)).decode('utf-8')
-                return b64_cmds
+                # Bytes ya renderizados al crear el trabajo (sin pasar por hexadecimal)
+                return base64.b64encode(job.escpos_bytes).decode('utf-8')
             except Exception as e:
                 logger.error(f"Error base64 ticket: {e}")
                 
@@ -185,6 +180,24 @@ def _print_receipt(factura, request=None):
         logger = logging.getLogger(__name__)
         logger.error(f"Error imprimiendo ticket: {e}")
 
+# --- GRILLA DE PRODUCTOS DEL POS ---
+def _contexto_menu_pos():
+    """
+    Productos y categorías del POS. Los querysets son perezosos: si la grilla
+    está en caché ({% cache %} por menu_version) no se consultan.
+    """
+    return {
+        'productos': Producto.objects.filter(disponible=True).select_related('categoria')
+                     .prefetch_related('variantes').order_by('categoria__nombre', 'nombre'),
+        'categorias': CategoriaProducto.objects.all().order_by('nombre'),
+        'menu_version': version_menu(),
+    }
+
+def _con_items(pedido):
+    """Carga los items del panel de la orden con su producto y variante (sin N+1)."""
+    prefetch_related_objects([pedido], Prefetch('items', queryset=DetallePedido.objects.select_related('producto', 'variante')))
+    return pedido
+
 # --- VISTAS DEL MESERO ---
 
 # 👇👇👇 ESTA ES LA VISTA NUEVA QUE FALTABA 👇👇👇
@@ -210,16 +223,12 @@ def panel_mesas(request):
             estado='borrador'
         )
         
-    productos = Producto.objects.filter(disponible=True).prefetch_related('variantes').order_by('categoria__nombre', 'nombre')
-    categorias = CategoriaProducto.objects.all().order_by('nombre')
-    
-    # Pop rawbt_b64 to trigger intent if any
-    rawbt_b64 = request.session.pop('rawbt_b64', None)
+    # Ticket pendiente (token ?rawbt= de la redirección) para disparar el intent
+    rawbt_b64 = tomar_rawbt(request)
     
     context = {
-        'pedido': pedido_activo,
-        'productos': productos,
-        'categorias': categorias,
+        **_contexto_menu_pos(),
+        'pedido': _con_items(pedido_activo),
         'mesa': None, # Pedido general directo
         'mesas_libres': Mesa.objects.filter(estado='libre').order_by('numero'),
         'rawbt_b64': rawbt_b64,
@@ -253,15 +262,13 @@ def detalle_mesa(request, mesa_id):
         # mesa.estado = 'ocupada'  <-- ELIMINADO: No ocupar hasta que haya productos
         # mesa.save()
 
-    productos = Producto.objects.filter(disponible=True).prefetch_related('variantes')
-
     # Detección manual de HTMX
     is_htmx = request.headers.get('HX-Request') == 'true' or request.META.get('HTTP_HX_REQUEST')
 
     context = {
+        **_contexto_menu_pos(),
         'mesa': mesa,
-        'pedido': pedido_activo,
-        'productos': productos,
+        'pedido': _con_items(pedido_activo),
         'is_htmx': is_htmx,
         'mesas_libres': Mesa.objects.filter(estado='libre').order_by('numero'),
     }
@@ -269,10 +276,11 @@ def detalle_mesa(request, mesa_id):
 
 @login_required
 @mesero_required
-def agregar_producto(request, pedido_id, producto_id):
+def agregar_producto(request, producto_id, pedido_id=None):
     
     # 1. Buscamos los objetos con los IDs que vienen de la URL
-    pedido = get_object_or_404(Pedido, pk=pedido_id)
+    # (desde la grilla cacheada del POS el pedido llega por POST)
+    pedido = get_object_or_404(Pedido, pk=pedido_id or request.POST.get('pedido_id'))
     producto = get_object_or_404(Producto, pk=producto_id)
 
     # 2. Lógica de inventario
@@ -283,6 +291,7 @@ def agregar_producto(request, pedido_id, producto_id):
             defaults={'precio_unitario': producto.precio}
         )
         
+        detalle.pedido = pedido  # Para que el total en memoria se actualice con el item
         if not created:
             # Validar si hay stock suficiente antes de incrementar
             if producto.stock > detalle.cantidad:
@@ -302,7 +311,7 @@ def agregar_producto(request, pedido_id, producto_id):
 
     # 3. Respuesta: Devolvemos el HTML del panel derecho actualizado
     context = {
-        'pedido': pedido,
+        'pedido': _con_items(pedido),
         'mesa': pedido.mesa,
         'mesas_libres': Mesa.objects.filter(estado='libre').order_by('numero'),
     }
@@ -331,24 +340,17 @@ def confirmar_pedido(request, pedido_id):
         
         # 1. LOG DE AUDITORÍA
         mesa_num = pedido.mesa.numero if pedido.mesa else "Directo"
-        AuditLog.objects.create(
-            user=request.user,
-            ip_address=get_client_ip(request),
-            action=f"Envió a cocina: Pedido #{pedido.id} (Mesa {mesa_num})"
-        )
+        auditar(request.user, f"Envió a cocina: Pedido #{pedido.id} (Mesa {mesa_num})", get_client_ip(request))
 
         # 2. IMPRIMIR COMANDA DE COCINA AUTOMÁTICAMENTE
         rawbt_b64 = _print_kitchen_order(pedido, request)
-        if rawbt_b64:
-            request.session['rawbt_b64'] = rawbt_b64
 
         # Redirect logic: if from history (as Gerente), refresh history.
         if request.headers.get('HX-Request'):
             url = reverse('pedidos:historial_pedidos') if request.user.rol == 'gerente' else reverse('usuarios:dashboard_mesero')
             
             if rawbt_b64:
-                # Quitamos de sesión porque ya lo vamos a procesar aquí
-                request.session.pop('rawbt_b64', None)
+                # Se imprime aquí mismo antes de redirigir
                 html = f"""
                 <script>
                     var intent_suffix = "#Intent;scheme=rawbt;package=ru.a402d.rawbtprinter;end;";
@@ -365,10 +367,11 @@ def confirmar_pedido(request, pedido_id):
             response['HX-Redirect'] = url
             return response
 
+        # La página de destino dispara la impresión con el token de la URL
         if request.user.rol == 'gerente':
-             return redirect('pedidos:historial_pedidos')
+             return redirigir_con_rawbt(request, 'pedidos:historial_pedidos', rawbt_b64)
         
-        return redirect('usuarios:dashboard_mesero')
+        return redirigir_con_rawbt(request, 'usuarios:dashboard_mesero', rawbt_b64)
     else:
         # Si no hay items, volver al pedido
         if request.headers.get('HX-Request'):
@@ -397,21 +400,23 @@ def pagar_pedido(request, pedido_id):
             pedido.mesa.save()
 
         # LOG DE AUDITORÍA
-        AuditLog.objects.create(
-            user=request.user,
-            ip_address=get_client_ip(request),
-            action=f"Cobró cuenta: Pedido #{pedido.id} - Total ${pedido.total}"
-        )
+        auditar(request.user, f"Cobró cuenta: Pedido #{pedido.id} - Total ${pedido.total}", get_client_ip(request))
     messages.success(request, f"Venta cerrada: Pedido #{pedido.id}")
     return redirect('pedidos:panel_mesas')
 
 # --- VISTAS DE COCINA ---
 
+def _pedidos_en_cocina():
+    return (Pedido.objects.filter(estado='confirmado')
+            .select_related('mesa', 'mesero')
+            .prefetch_related('items__producto')
+            .order_by('created_at'))
+
 @login_required
 @cocina_required
 def dashboard_cocina(request):
 
-    pedidos = Pedido.objects.filter(estado='confirmado').order_by('created_at')
+    pedidos = _pedidos_en_cocina()
     return render(request, 'pedidos/dashboard_cocina.html', {'pedidos': pedidos})
 
 @login_required
@@ -426,11 +431,7 @@ def terminar_pedido(request, pedido_id):
         pedido.save()
 
         # LOG DE AUDITORÍA
-        AuditLog.objects.create(
-            user=request.user,
-            ip_address=get_client_ip(request),
-            action=f"Cocina terminó: Pedido #{pedido.id}"
-        )
+        auditar(request.user, f"Cocina terminó: Pedido #{pedido.id}", get_client_ip(request))
     
     return redirect('pedidos:dashboard_cocina')
 
@@ -458,24 +459,20 @@ def modificar_cantidad_item(request, item_id, accion):
         
     # Devolvemos el HTML parcial para HTMX
     context = {
-        'pedido': pedido,
+        'pedido': _con_items(pedido),
         'mesa': pedido.mesa,
         'mesas_libres': Mesa.objects.filter(estado='libre').order_by('numero'),
     }
     return render(request, 'pedidos/partials/orden_actual.html', context)
 
 def cocina_etag(request, *args, **kwargs):
-    # Buscamos el último pedido modificado o creado
-    ultimo_pedido = Pedido.objects.filter(estado='confirmado').order_by('-updated_at').first()
-    conteo = Pedido.objects.filter(estado='confirmado').count()
-    
-    if ultimo_pedido:
-        # La huella es: Cantidad de pedidos + Fecha del último cambio
-        return str(conteo) + str(ultimo_pedido.updated_at)
-    else:
-        return "0"
+    # La huella es: Cantidad de pedidos + Fecha del último cambio (una sola consulta)
+    datos = Pedido.objects.filter(estado='confirmado').aggregate(conteo=Count('id'), ultimo=Max('updated_at'))
+    if datos['conteo']:
+        return str(datos['conteo']) + str(datos['ultimo'])
+    return "0"
 
-# Con esto logramos que la cocina se actualice cada cierto tiempo 
+# Resincronización de la cocina: la pantalla la pide al (re)conectar el WebSocket
 
 @login_required
 @etag(cocina_etag)
@@ -484,7 +481,7 @@ def actualizar_cocina(request):
    
     # Buscamos SOLO los pedidos 'confirmado' (pendientes de cocinar)
     # Ordenamos por antigüedad (el más viejo primero)
-    pedidos = Pedido.objects.filter(estado='confirmado').order_by('created_at')
+    pedidos = _pedidos_en_cocina()
     return render(request, 'pedidos/partials/lista_pedidos_cocina.html', {'pedidos': pedidos})
 
 @login_required
@@ -589,50 +586,25 @@ def procesar_pago(request, pedido_id):
         
         factura = Factura.objects.create(**datos_factura)
         
-        # ENVIAR FACTURA AL SRI DE FORMA SÍNCRONA
+        # ENVIAR FACTURA AL SRI EN SEGUNDO PLANO (Celery, con reintentos)
+        # El cajero no espera al API: la factura queda 'pendiente' hasta que responda.
         if tipo_documento == 'factura':
-            from .services.sri_api import enviar_factura_sri
-            enviar_factura_sri(factura.id)
-            factura.refresh_from_db()
+            from .tasks import encolar_envio_sri
+            encolar_envio_sri(factura)
         
         # 3. AUTOMATIZACIÓN DE INVENTARIO (PRODUCTOS Y RECETAS)
         # Este es ahora el punto ÚNICO de descuento para asegurar que la venta se realizó.
-        for item in pedido.items.all():
-            producto = item.producto
-            cantidad_vendida = item.cantidad
-            
-            # A. Descontar stock del producto directamente (si tiene stock definido)
-            if producto.stock > 0:
-                producto.stock -= cantidad_vendida
-                producto.save()
-
-            # B. Descontar ingredientes (Receta)
-            if producto.receta.exists():
-                for ingrediente in producto.receta.all():
-                    insumo = ingrediente.insumo
-                    cantidad_a_descontar = ingrediente.cantidad_necesaria * cantidad_vendida
-                    
-                    # Registramos la salida en el Kardex (El modelo Kardex descuenta el stock automáticamente al guardar)
-                    MovimientoKardex.objects.create(
-                        insumo=insumo,
-                        tipo='salida',
-                        cantidad=cantidad_a_descontar,
-                        costo_total=cantidad_a_descontar * insumo.costo_unitario, 
-                        observacion=f"Venta Final Pedido #{pedido.id}: {cantidad_vendida}x {producto.nombre}"
-                    )
+        # Todo el pedido (incluidas sub-recetas) se descuenta en lote y en una sola transacción.
+        descontar_inventario_pedido(pedido)
 
         # 4. IMPRIMIR TICKET DE VENTA AUTOMÁTICAMENTE
         rawbt_b64 = _print_receipt(factura, request)
-        if rawbt_b64:
-            request.session['rawbt_b64'] = rawbt_b64
 
         # 5. Mensaje de Éxito y Redirección
         messages.success(request, f"Venta Realizada: Pedido #{factura.pedido.id} - Total: ${factura.total}")
         
         # SI ES HTMX (Usado en el modal de cobro), devolvemos el modal de éxito
         if request.headers.get('HX-Request'):
-            # Limpiamos de la sesión para evitar doble impresión al recargar
-            request.session.pop('rawbt_b64', None)
             return render(request, 'pedidos/modals/venta_exitosa.html', {
                 'factura': factura,
                 'rawbt_b64': rawbt_b64
@@ -640,9 +612,9 @@ def procesar_pago(request, pedido_id):
         
         # Redirección inteligente (fallback para forms normales)
         if request.user.rol == 'gerente':
-             return redirect('pedidos:historial_pedidos')
+             return redirigir_con_rawbt(request, 'pedidos:historial_pedidos', rawbt_b64)
              
-        return redirect('pedidos:panel_mesas')
+        return redirigir_con_rawbt(request, 'pedidos:panel_mesas', rawbt_b64)
 
 def ver_ticket(request, factura_id):
     factura = get_object_or_404(Factura, pk=factura_id)
@@ -846,13 +818,14 @@ def gestion_mesas(request):
 def check_notificaciones(request):
 
     # Buscar pedidos listos que pertenezcan al mesero actual Y que no hayan sido vistos
-    pedidos_listos = Pedido.objects.filter(
+    # Se evalúa una sola vez (el poll corre cada pocos segundos por mesero)
+    pedidos_listos = list(Pedido.objects.filter(
         mesero=request.user, 
         estado='listo',
         notificacion_vista=False
-    )
+    ).select_related('mesa'))
     
-    if not pedidos_listos.exists():
+    if not pedidos_listos:
         return HttpResponse("")
 
     return render(request, 'pedidos/partials/notificaciones.html', {'pedidos_listos': pedidos_listos})
@@ -905,56 +878,14 @@ def reporte_tiempos_cocina(request):
     })
 
 # --- INGENIERÍA DE MENÚ (FICHA TÉCNICA) ---
-from decimal import Decimal
-
-def calcular_costo_receta(ingredientes_queryset):
-    """
-    Calcula el costo total de una lista de ingredientes (Receta),
-    manejando recursividad si hay sub-recetas.
-    Retorna: (Costo Total, Lista Detallada)
-    """
-    costo_total = Decimal(0)
-    detalle = []
-    
-    for item in ingredientes_queryset:
-        insumo = item.insumo
-        
-        # 1. Determinar Costo Unitario
-        costo_unitario = insumo.costo_unitario
-        es_subreceta = getattr(insumo, 'es_subreceta', False)
-
-        # Si es SUB-RECETA, calculamos su costo real basado en SUS ingredientes
-        if es_subreceta:
-            sub_ingredientes = insumo.ingredientes_de_receta.all()
-            if sub_ingredientes.exists():
-                costo_batch, _ = calcular_costo_receta(sub_ingredientes)
-                # El costo unitario es Costo Batch / Rendimiento
-                rendimiento = insumo.rendimiento_receta if insumo.rendimiento_receta > 0 else 1
-                costo_unitario = costo_batch / rendimiento
-
-        costo_item = item.cantidad_necesaria * costo_unitario
-        costo_total += costo_item
-        
-        detalle.append({
-            'nombre': insumo.nombre,
-            'es_subreceta': es_subreceta,
-            'unidad': insumo.get_unidad_medida_display(),
-            'cantidad': item.cantidad_necesaria,
-            'costo_unitario': costo_unitario, # Costo Real calculado
-            'costo_total': costo_item
-        })
-
-    return costo_total, detalle
 
 @login_required
 @gerente_required
 def ver_ficha_tecnica(request, producto_id):
         
     producto = get_object_or_404(Producto, pk=producto_id)
-    receta_qs = producto.receta.all()
-    
-    # Calcular Costos
-    costo_materia_prima, detalle_ingredientes = calcular_costo_receta(receta_qs)
+    # Calcular Costos (sub-recetas ya costeadas en inventario/costeo.py)
+    costo_materia_prima, detalle_ingredientes = detalle_receta(producto.receta.all())
     
     # Calcular KPIs
     precio_venta = producto.precio
@@ -973,6 +904,43 @@ def ver_ficha_tecnica(request, producto_id):
     })
 
 
+# Días que analiza la matriz de ingeniería de menú si no se indica período
+DIAS_INGENIERIA_MENU = 30
+
+@login_required
+@gerente_required
+def ingenieria_menu(request):
+    """Matriz de ingeniería de menú de todos los productos y variantes (?formato=csv para exportar)."""
+    from datetime import timedelta
+    from .services.ingenieria_menu import exportar_csv, matriz_menu
+
+    hoy = timezone.localdate()
+    hasta = _parsear_fecha(request.GET.get('hasta')) or hoy
+    desde = _parsear_fecha(request.GET.get('desde')) or hasta - timedelta(days=DIAS_INGENIERIA_MENU - 1)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    categoria_id = request.GET.get('categoria') or None
+    if categoria_id and not categoria_id.isdigit():
+        categoria_id = None
+
+    tabla = matriz_menu(periodo_dias(desde, hasta), categoria_id=categoria_id)
+
+    if request.GET.get('formato') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="ingenieria_menu_{desde}_{hasta}.csv"'
+        response.write('\ufeff')  # BOM: Excel abre bien las tildes
+        exportar_csv(tabla, response)
+        return response
+
+    return render(request, 'pedidos/ingenieria_menu.html', {
+        'filas': tabla.to_dict('records'),
+        'resumen': tabla.attrs,
+        'desde': desde,
+        'hasta': hasta,
+        'categorias': CategoriaProducto.objects.order_by('nombre'),
+        'categoria_id': int(categoria_id) if categoria_id else None,
+    })
+
 # --- GESTION DE SUB-RECETAS (Insumos que son Recetas) ---
 @login_required
 @gerente_required
@@ -1015,11 +983,22 @@ def eliminar_ingrediente_insumo(request, receta_id):
     return gestion_receta_insumo(request, insumo_id)
 
 # --- API JSON FOR CALENDAR ---
+def _pedidos_agenda(inicio, fin):
+    # Pedidos PROGRAMADOS dentro de la ventana visible del calendario (índice en fecha_entrega)
+    return Pedido.objects.filter(fecha_entrega__gte=inicio, fecha_entrega__lt=fin).exclude(estado='cancelado')
+
 @login_required
 @mesero_required
+# Los items y el cliente no tocan Pedido.updated_at: la huella incluye el último item,
+# la cantidad sumada y los clientes asignados para que editarlos invalide el ETag
+@feed_calendario(_pedidos_agenda, importe=Sum('total'), ultimo_item=Max('items__id'),
+                 cantidad_items=Sum('items__cantidad'), clientes=Sum('cliente_id'))
 def api_pedidos_agenda(request):
-    # Retorna pedidos PROGRAMADOS para FullCalendar (tienen fecha_entrega)
-    pedidos = Pedido.objects.filter(fecha_entrega__isnull=False).exclude(estado='cancelado')
+    # Retorna pedidos PROGRAMADOS para FullCalendar (solo los del rango start/end pedido)
+    inicio, fin = rango_calendario(request)
+    pedidos = _pedidos_agenda(inicio, fin).select_related('cliente', 'mesa').prefetch_related(
+        Prefetch('items', queryset=DetallePedido.objects.select_related('producto'))
+    )
     events_data = []
     
     for pedido in pedidos:
@@ -1099,18 +1078,27 @@ def crear_pedido_agendado(request):
 @mesero_required
 def editar_pedido_directo(request, pedido_id):
     pedido = get_object_or_404(Pedido, pk=pedido_id)
-    productos = Producto.objects.filter(disponible=True)
     
     # Renderizamos el template específico que no necesita mesa
     return render(request, 'pedidos/editar_pedido.html', {
+        **_contexto_menu_pos(),
         'pedido': pedido,
-        'productos': productos,
         'mesa': None, # Explícito
         'is_htmx': False 
     })
 
 
 # --- HISTORIAL DE PEDIDOS (GERENTE) ---
+def _parsear_fecha(valor):
+    try:
+        return parse_date(valor) if valor else None
+    except ValueError:
+        return None
+
+def _creados_o_pagados_en(periodo):
+    pagados = Factura.objects.filter(periodo.filtro('fecha_emision'), pedido__isnull=False).values('pedido_id')
+    return periodo.filtro('created_at') | Q(id__in=pagados)
+
 @login_required
 @gerente_required
 def historial_pedidos(request):
@@ -1124,6 +1112,10 @@ def historial_pedidos(request):
     fecha_desde = request.GET.get('fecha_desde', '')
     fecha_hasta = request.GET.get('fecha_hasta', '')
     busqueda = request.GET.get('q', '')
+    # Orden (el total está almacenado en Pedido, se ordena directo en SQL)
+    orden = request.GET.get('orden', '-created_at')
+    if orden not in ('-created_at', 'created_at', '-total', 'total'):
+        orden = '-created_at'
 
     # Si no hay filtros de fecha, por defecto mostramos HOY en la zona horaria local
     from django.utils import timezone
@@ -1141,26 +1133,18 @@ def historial_pedidos(request):
     # Base queryset
     pedidos_qs = Pedido.objects.exclude(
         estado='borrador'
-    ).select_related('mesa', 'mesero', 'cliente').prefetch_related('items__producto').order_by('-created_at')
+    ).select_related('mesa', 'mesero', 'cliente').prefetch_related('items__producto').order_by(orden)
 
     # Aplicar filtros (Sincronizado con Factura/Pago)
+    # Pedidos creados en el período O pagados en él (para que coincida con el dashboard).
+    # Rango [inicio, fin) + subconsulta de facturas: ambos lados usan índice y no hace falta distinct()
+    periodo = None
     if fecha_actual:
-        # Mostramos pedidos creados hoy O pagados hoy (para que coincida con el dashboard)
-        pedidos_qs = pedidos_qs.filter(
-            Q(created_at__date=fecha_actual) | 
-            Q(factura__fecha_emision__date=fecha_actual)
-        ).distinct()
-    elif fecha_desde:
-        pedidos_qs = pedidos_qs.filter(
-            Q(created_at__date__gte=fecha_desde) |
-            Q(factura__fecha_emision__date__gte=fecha_desde)
-        ).distinct()
-
-    if fecha_hasta:
-        pedidos_qs = pedidos_qs.filter(
-            Q(created_at__date__lte=fecha_hasta) |
-            Q(factura__fecha_emision__date__lte=fecha_hasta)
-        ).distinct()
+        periodo = periodo_dia(fecha_actual)
+    elif fecha_desde or fecha_hasta:
+        periodo = periodo_dias(_parsear_fecha(fecha_desde), _parsear_fecha(fecha_hasta))
+    if periodo:
+        pedidos_qs = pedidos_qs.filter(_creados_o_pagados_en(periodo))
 
     if estado_filtro:
         if estado_filtro == 'pendiente_pago':
@@ -1182,13 +1166,11 @@ def historial_pedidos(request):
     
     # Estadísticas rápidas del día (Sincronizadas con Dashboard)
     # Sumamos las Facturas del día para que el total de ventas siempre sea igual al dashboard
-    pedidos_hoy = Pedido.objects.filter(
-        Q(created_at__date=hoy) | Q(factura__fecha_emision__date=hoy)
-    ).exclude(estado='borrador').distinct()
+    periodo_hoy = periodo_dia(hoy)
+    pedidos_hoy = Pedido.objects.filter(_creados_o_pagados_en(periodo_hoy)).exclude(estado='borrador')
     
     # El total real de ventas es la suma de las facturas generadas hoy
-    from django.db.models import Sum
-    total_hoy = Factura.objects.filter(fecha_emision__date=hoy).aggregate(Sum('total'))['total__sum'] or 0
+    total_hoy = Factura.objects.filter(periodo_hoy.filtro('fecha_emision')).aggregate(Sum('total'))['total__sum'] or 0
 
     # === PAGINACIÓN ===
     # El usuario pidió 10 por página, agrupado por día (lo cual ya hace el filtro de fecha_actual)
@@ -1197,7 +1179,7 @@ def historial_pedidos(request):
     page_obj = paginator.get_page(page_number)
     
     # Extraer comando de impresión si venimos de confirmar un pedido
-    rawbt_b64 = request.session.pop('rawbt_b64', None)
+    rawbt_b64 = tomar_rawbt(request)
     
     return render(request, 'pedidos/historial_pedidos.html', {
         'pedidos': page_obj, # Enviamos el objeto de página
@@ -1209,6 +1191,7 @@ def historial_pedidos(request):
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
         'busqueda': busqueda,
+        'orden': orden,
         'total_pedidos': pedidos_qs.count(),
         'pedidos_hoy_count': pedidos_hoy.count(),
         'total_ventas_hoy': total_hoy,
@@ -1222,41 +1205,15 @@ def historial_pedidos(request):
 def eliminar_pedido(request, pedido_id):
     pedido = get_object_or_404(Pedido, pk=pedido_id)
     
-    # 1. SI ESTABA PAGADO, REVERTIMOS INVENTARIO
+    # 1. SI ESTABA PAGADO, REVERTIMOS INVENTARIO ("entrada" de ajuste en el Kardex)
     if pedido.estado == 'pagado':
-        for item in pedido.items.all():
-            producto = item.producto
-            cantidad_revertir = item.cantidad
-            
-            # A. Revertir stock del producto
-            if producto.stock >= 0: # Si se gestiona stock
-                producto.stock += cantidad_revertir
-                producto.save()
-            
-            # B. Revertir ingredientes (Receta) -> Crear "entrada" de ajuste
-            if producto.receta.exists():
-                for ingrediente in producto.receta.all():
-                    insumo = ingrediente.insumo
-                    cantidad_a_reponer = ingrediente.cantidad_necesaria * cantidad_revertir
-                    
-                    # Registramos el re-ingreso en el Kardex
-                    MovimientoKardex.objects.create(
-                        insumo=insumo,
-                        tipo='entrada', # Es una entrada porque devolvemos lo "consumido"
-                        cantidad=cantidad_a_reponer,
-                        costo_total=cantidad_a_reponer * insumo.costo_unitario, 
-                        observacion=f"DEVOLUCIÓN (Eliminación Pedido #{pedido.id}): {cantidad_revertir}x {producto.nombre}"
-                    )
+        revertir_inventario_pedido(pedido, "DEVOLUCIÓN (Eliminación)")
     
     # 2. ELIMINAR EL PEDIDO (Esto disparará CASCADE para DetallePedido y Factura)
     pedido.delete()
     
     # Audit Log
-    AuditLog.objects.create(
-        user=request.user,
-        ip_address=get_client_ip(request),
-        action=f"Eliminó Pedido #{pedido_id} (Historial/Devolución)"
-    )
+    auditar(request.user, f"Eliminó Pedido #{pedido_id} (Historial/Devolución)", get_client_ip(request))
     
     messages.success(request, f"Pedido #{pedido_id} eliminado y stock revertido (si aplica).")
     
@@ -1276,27 +1233,7 @@ def reabrir_pedido(request, pedido_id):
         
         # SI ESTABA PAGADO, REVERTIMOS INVENTARIO PARA QUE SE VUELVA A CALCULAR AL PAGAR DE NUEVO
         if pedido.estado == 'pagado':
-            for item in pedido.items.all():
-                producto = item.producto
-                cantidad_revertir = item.cantidad
-                
-                # A. Revertir stock del producto
-                if producto.stock >= 0:
-                    producto.stock += cantidad_revertir
-                    producto.save()
-                
-                # B. Revertir ingredientes (Receta)
-                if producto.receta.exists():
-                    for ingrediente in producto.receta.all():
-                        insumo = ingrediente.insumo
-                        cantidad_a_reponer = ingrediente.cantidad_necesaria * cantidad_revertir
-                        MovimientoKardex.objects.create(
-                            insumo=insumo,
-                            tipo='entrada',
-                            cantidad=cantidad_a_reponer,
-                            costo_total=cantidad_a_reponer * insumo.costo_unitario, 
-                            observacion=f"RE-APERTURA (Edición Pedido #{pedido.id}): {cantidad_revertir}x {producto.nombre}"
-                        )
+            revertir_inventario_pedido(pedido, "RE-APERTURA (Edición)")
             
             # ELIMINAR FACTURA ASOCIADA (CASCADE no ocurre aquí si no borramos el pedido, así que lo hacemos manual)
             if hasattr(pedido, 'factura'):
@@ -1307,20 +1244,13 @@ def reabrir_pedido(request, pedido_id):
         pedido.save()
         
         # Audit Log
-    AuditLog.objects.create(
-        user=request.user,
-        ip_address=get_client_ip(request),
-        action=f"Re-abrió para edición: Pedido #{pedido.id}"
-    )
+    auditar(request.user, f"Re-abrió para edición: Pedido #{pedido.id}", get_client_ip(request))
     
     # Si es HTMX, devolvemos el modal de edición directamente (POS)
     if request.headers.get('HX-Request'):
-        productos = Producto.objects.filter(disponible=True).order_by('categoria__nombre', 'nombre')
-        categorias = CategoriaProducto.objects.all().order_by('nombre')
         return render(request, 'pedidos/detalle_mesa_contenido.html', {
+            **_contexto_menu_pos(),
             'pedido': pedido,
-            'productos': productos,
-            'categorias': categorias,
             'mesa': pedido.mesa,
             'is_htmx': True,
             'mesas_libres': Mesa.objects.filter(estado='libre').order_by('numero'),
@@ -1395,6 +1325,7 @@ def agregar_multiples_variantes(request, pedido_id):
                 defaults={'precio_unitario': variante.precio}
             )
             
+            detalle.pedido = pedido
             if not created:
                 detalle.cantidad += cantidad
             else:
@@ -1413,7 +1344,7 @@ def agregar_multiples_variantes(request, pedido_id):
 
 # --- FACTURACIÓN SRI (GERENTE) ---
 from core.models import ConfiguracionSRI
-from .services.sri_api import enviar_factura_sri
+from .tasks import enviar_factura_bloqueada
 
 @login_required
 @gerente_required
@@ -1443,7 +1374,11 @@ def facturacion_gerente(request):
 @login_required
 @gerente_required
 def enviar_factura_sri_view(request, factura_id):
-    success, message = enviar_factura_sri(factura_id)
+    resultado = enviar_factura_bloqueada(factura_id)
+    if resultado is None:
+        messages.info(request, "La factura ya está autorizada o se está enviando en este momento.")
+        return redirect('pedidos:facturacion_gerente')
+    success, message = resultado
     if success:
         messages.success(request, f"Éxito SRI: {message}")
     else:
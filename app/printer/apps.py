@@ -10,6 +10,5 @@ class PrinterConfig(AppConfig):
         """
         Ejecutar código cuando Django inicia
         """
-        # Aquí puedes importar signals si los necesitas en el futuro
-        # import printer.signals
-        pass
\ No newline at end of file
+        # Avisos a los agentes de impresión en espera (long-poll)
+        import printer.signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,64 @@
+# 📁 printer/consumers.py
+# Long-poll del agente de impresión atendido directamente por Daphne.
+# Una vista de Django, aunque sea async, pasa por los middlewares sync y queda
+# en el único hilo thread_sensitive mientras espera: los agentes se atenderían
+# de a uno y con ellos cualquier otro request sync del proceso. Aquí la espera
+# es un await sobre la capa de canales; solo el reclamo (SKIP LOCKED) y la
+# autenticación van a un hilo.
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.http import AsyncHttpConsumer
+from django.http import QueryDict
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .services import datos_trabajos, leer_parametros, perfil_agente, reclamar_trabajos_con_espera, trabajos_pendientes
+
+logger = logging.getLogger(__name__)
+
+
+class TrabajosAgenteConsumer(AsyncHttpConsumer):
+    """GET agente/trabajos/: mismos parámetros y respuesta que views.agente_trabajos_pendientes."""
+
+    async def handle(self, body):
+        if self.scope['method'] != 'GET':
+            await self._responder(405, {'detail': f'Método "{self.scope["method"]}" no permitido.'}, [(b'Allow', b'GET')])
+            return
+        try:
+            user = await database_sync_to_async(self._autenticar)()
+        except AuthenticationFailed as e:
+            await self._responder(401, {'detail': str(e.detail)}, [(b'WWW-Authenticate', b'Token')])
+            return
+
+        es_sistema, username = perfil_agente(user)
+        espera, impresoras, formato = leer_parametros(QueryDict(self.scope['query_string']))
+        trabajos = await reclamar_trabajos_con_espera(
+            trabajos_pendientes(es_sistema, username, impresoras),
+            limite=10,
+            espera=espera,
+        )
+        trabajos_data = await database_sync_to_async(datos_trabajos)(trabajos, formato)
+        logger.info(
+            f"📥 Agente {username} consultó trabajos: "
+            f"{len(trabajos_data)} pendientes [{'SISTEMA' if es_sistema else 'NORMAL'}]"
+        )
+        await self._responder(200, {'es_sistema': es_sistema, 'trabajos': trabajos_data})
+
+    def _autenticar(self):
+        """Token del agente (igual que TokenAuthentication de DRF) o la sesión del navegador."""
+        partes = dict(self.scope['headers']).get(b'authorization', b'').split()
+        if not partes or partes[0].lower() != b'token':
+            return self.scope.get('user')
+        if len(partes) != 2:
+            raise AuthenticationFailed('Encabezado de token inválido.')
+        user, _ = TokenAuthentication().authenticate_credentials(partes[1].decode())
+        return user
+
+    async def _responder(self, estado, datos, encabezados=()):
+        await self.send_response(
+            estado,
+            json.dumps(datos).encode(),
+            headers=[(b'Content-Type', b'application/json'), *encabezados],
+        )
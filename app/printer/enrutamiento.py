@@ -0,0 +1,99 @@
+# 📁 printer/enrutamiento.py
+# Configuración de impresión y tabla de ruteo (tipo de documento -> impresora)
+# en memoria del proceso, para no consultar la BD en cada comanda o cobro.
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Tipo de documento -> bandera en Printer.config que la marca como destino
+RUTAS = {
+    'order': 'prints_command',
+    'receipt': 'prints_receipt',
+}
+
+VERSION_KEY = 'printer_config_version'
+
+
+class Ruteo(NamedTuple):
+    """Configuración y rutas de una misma versión. No se modifica: se reemplaza entera."""
+    version: int
+    revisar_en: float
+    config: object  # PrinterSettings
+    rutas: Mapping[str, object]  # tipo de documento -> Printer
+
+    def impresora_para(self, tipo_documento):
+        return self.rutas.get(tipo_documento)
+
+
+# RLock: _cargar() puede crear PrinterSettings, y su post_save vuelve a invalidar
+_lock = threading.RLock()
+_actual = None  # Ruteo vigente; solo se cambia la referencia, nunca sus campos
+
+
+def _segundos_revision():
+    # Cada cuánto se compara la versión compartida (otros procesos pudieron cambiarla)
+    return getattr(settings, 'PRINTER_CONFIG_CACHE_SECONDS', 30)
+
+
+def _cargar():
+    from .models import Printer, PrinterSettings
+
+    rutas = {}
+    for printer in Printer.objects.filter(is_active=True):
+        cfg = printer.config or {}
+        for tipo, bandera in RUTAS.items():
+            # La primera impresora activa (por nombre) gana, como antes
+            if cfg.get(bandera) and tipo not in rutas:
+                rutas[tipo] = printer
+    return PrinterSettings.get_settings(), rutas
+
+
+def ruteo_impresion():
+    """
+    Instantánea de configuración y rutas. Quien necesite ambas (¿imprime? ¿en
+    cuál?) debe tomar una sola: dos llamadas sueltas pueden caer a ambos
+    lados de una invalidación.
+    """
+    global _actual
+    ruteo = _actual
+    ahora = time.monotonic()
+    if ruteo is not None and ahora < ruteo.revisar_en:
+        return ruteo
+
+    with _lock:
+        ruteo = _actual
+        if ruteo is not None and ahora < ruteo.revisar_en:
+            return ruteo
+        version = cache.get_or_set(VERSION_KEY, 1, None)
+        if ruteo is None or version != ruteo.version:
+            config, rutas = _cargar()
+            rutas = MappingProxyType(rutas)
+        else:
+            config, rutas = ruteo.config, ruteo.rutas
+        ruteo = _actual = Ruteo(version, ahora + _segundos_revision(), config, rutas)
+    return ruteo
+
+
+def configuracion_impresion():
+    """PrinterSettings en caché. Solo lectura: para editar usar PrinterSettings.get_settings()."""
+    return ruteo_impresion().config
+
+
+def impresora_para(tipo_documento):
+    """Impresora activa que imprime ese tipo de documento ('order', 'receipt') o None."""
+    return ruteo_impresion().impresora_para(tipo_documento)
+
+
+def invalidar_cache_impresion():
+    """Descarta la caché local y avisa a los demás procesos (versión compartida)."""
+    global _actual
+    with _lock:
+        _actual = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
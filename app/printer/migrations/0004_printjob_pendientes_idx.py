@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printer', '0003_alter_printer_connection_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='printjob',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='printjob_pendientes_idx'),
+        ),
+    ]
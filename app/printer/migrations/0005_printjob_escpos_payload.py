@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printer', '0004_printjob_pendientes_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printjob',
+            name='escpos_etag',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Huella de Comandos'),
+        ),
+        migrations.AddField(
+            model_name='printjob',
+            name='escpos_payload',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Comandos ESC/POS'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+import hashlib
+import logging
 import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
 
 
 class Printer(models.Model):
@@ -302,6 +307,20 @@ class PrintJob(models.Model):
         help_text='Datos usados para generar el contenido'
     )
     
+    # Comandos ESC/POS renderizados una sola vez al crear el trabajo (comprimidos con zlib)
+    escpos_payload = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Comandos ESC/POS'
+    )
+    escpos_etag = models.CharField(
+        max_length=32,
+        blank=True,
+        editable=False,
+        verbose_name='Huella de Comandos'
+    )
+    
     # Control de caja registradora
     open_cash_drawer = models.BooleanField(
         default=False,
@@ -356,6 +375,12 @@ class PrintJob(models.Model):
             models.Index(fields=['printer', 'status']),
             models.Index(fields=['created_at', 'status']),
             models.Index(fields=['document_type', 'created_at']),
+            # Cola del agente: solo las filas pendientes, en orden de llegada
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='pending'),
+                name='printjob_pendientes_idx',
+            ),
         ]
     
     def __str__(self):
@@ -365,26 +390,39 @@ class PrintJob(models.Model):
         # Generar número de trabajo si no existe
         if not self.job_number:
             self.job_number = self.generate_job_number()
+        # Renderizar los comandos una sola vez: reintentos y reimpresiones los reutilizan
+        if self._state.adding and self.escpos_payload is None:
+            try:
+                self.render_escpos(save=False)
+            except Exception as e:
+                logger.warning(f"No se pudieron pre-renderizar los comandos del trabajo: {e}")
         super().save(*args, **kwargs)
     
+    def render_escpos(self, save=True):
+        """Renderiza y guarda los comandos ESC/POS del trabajo. Retorna los bytes."""
+        from .print_manager import PrinterManager
+        
+        raw = PrinterManager.render_job_bytes(self)
+        self.escpos_payload = zlib.compress(raw)
+        self.escpos_etag = hashlib.sha256(raw).hexdigest()[:32]
+        if save:
+            self.save(update_fields=['escpos_payload', 'escpos_etag'])
+        return raw
+    
+    @property
+    def escpos_bytes(self):
+        """Comandos ESC/POS listos para enviar (trabajos antiguos se renderizan la primera vez)"""
+        if self.escpos_payload is None:
+            return self.render_escpos()
+        return zlib.decompress(self.escpos_payload)
+    
     @staticmethod
     def generate_job_number():
-        """Genera un número de trabajo único"""
-        from datetime import datetime
-        import random
-        
-        # Formato: PRINT-YYMMDDHHMMSS-XXXX (25 chars)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')  # 14 chars
-        random_suffix = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=4))  # 4 chars
-        
-        job_number = f'PRINT-{timestamp}-{random_suffix}'  # PRINT- (6) + 14 + - (1) + 4 = 25 chars
-        
-        # Verificar unicidad (por si acaso)
-        while PrintJob.objects.filter(job_number=job_number).exists():
-            random_suffix = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=4))
-            job_number = f'PRINT-{timestamp}-{random_suffix}'
-        
-        return job_number
+        """Número de trabajo correlativo del día: PRINT-AAAAMMDD-NNNNN (una sola consulta)"""
+        from core.contadores import clave_trabajo, siguiente
+
+        hoy = timezone.localdate()
+        return f'PRINT-{hoy:%Y%m%d}-{siguiente(clave_trabajo(hoy)):05d}'
     
     def mark_as_printing(self):
         """Marca el trabajo como en impresión"""
@@ -671,6 +709,13 @@ class PrinterSettings(models.Model):
         from django.conf import settings
         return getattr(settings, 'PRINTING_CONFIG', {}).get('receipt_footer', '¡Gracias por su compra!')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # printer/signals.py invalida la caché de logos si cambia
+        instance._company_logo_original = instance.__dict__.get('company_logo')
+        return instance
+    
     @classmethod
     def get_settings(cls):
         """Obtiene la configuración global (singleton)"""
@@ -7,10 +7,39 @@ import logging
 from io import BytesIO
 from PIL import Image
 import base64
+import hashlib
 import os
 
+from django.core.cache import cache
+
 logger = logging.getLogger(__name__)
 
+# Caché de logos rasterizados
+LOGO_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+LOGO_CACHE_VERSION_KEY = 'logo_raster_version'
+# Pixel oscuro (< 128) = punto impreso (bit 1)
+LOGO_THRESHOLD_LUT = [255 if x < 128 else 0 for x in range(256)]
+
+
+def _read_logo_source(logo):
+    """Bytes del logo: archivo en disco o data URI (data:image/png;base64,...)"""
+    if logo.startswith('data:'):
+        return base64.b64decode(logo.split(',', 1)[1])
+    with open(logo, 'rb') as f:
+        return f.read()
+
+
+def _logo_cache_version():
+    return cache.get_or_set(LOGO_CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_logo_cache():
+    """Descarta los logos rasterizados (al cambiar PrinterSettings.company_logo)"""
+    try:
+        cache.incr(LOGO_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(LOGO_CACHE_VERSION_KEY, 2, None)
+
 
 class ESCPOSCommands:
     """Comandos ESC/POS estándar para impresoras térmicas"""
@@ -139,6 +168,24 @@ class PrinterManager:
     
     @staticmethod
     def generate_print_commands(print_job):
+        """
+        Comandos ESC/POS completos del trabajo en hexadecimal (compatibilidad).
+        Usa los bytes ya guardados en el trabajo, sin volver a renderizar.
+        """
+        return print_job.escpos_bytes.hex()
+
+    @staticmethod
+    def render_job_bytes(print_job):
+        """
+        Renderiza los bytes ESC/POS que se envían a la impresora del trabajo:
+        RawBT recibe el ticket con formato completo, el agente de Windows el básico.
+        """
+        if print_job.printer.connection_type == 'rawbt':
+            return PrinterManager.generate_print_bytes(print_job)
+        return PrinterManager.generate_agent_bytes(print_job)
+
+    @staticmethod
+    def generate_print_bytes(print_job):
         """
         Genera comandos ESC/POS completos para un trabajo de impresión
         
@@ -146,12 +193,12 @@ class PrinterManager:
             print_job: Objeto PrintJob
             
         Returns:
-            str: Comandos en hexadecimal
+            bytes: Comandos ESC/POS
         """
-        from .models import PrinterSettings
+        from .enrutamiento import configuracion_impresion
         
         printer = print_job.printer
-        settings = PrinterSettings.get_settings()
+        settings = configuracion_impresion()
         
         commands = bytearray()
         
@@ -160,7 +207,7 @@ class PrinterManager:
         
         # 2. LOGO (si existe en los datos del trabajo)
         logo_path = print_job.data.get('logo_path')
-        if logo_path and os.path.exists(logo_path):
+        if logo_path and (logo_path.startswith('data:') or os.path.exists(logo_path)):
             try:
                 logo_commands = PrinterManager._process_logo(logo_path, printer)
                 if logo_commands:
@@ -256,27 +303,70 @@ class PrinterManager:
                 off_time=printer.cash_drawer_off_time
             ))
         
-        # Convertir a hexadecimal
-        return commands.hex()
+        return bytes(commands)
+
+    @staticmethod
+    def generate_agent_bytes(print_job):
+        """Comandos ESC/POS básicos que imprime el agente de Windows"""
+        ESC = ESCPOSCommands.ESC
+        GS = ESCPOSCommands.GS
+        try:
+            comandos = bytearray()
+            
+            comandos.extend(ESC + b'@')
+            comandos.extend(ESC + b'a' + b'\x01')
+            comandos.extend(ESC + b'E' + b'\x01')
+            
+            try:
+                contenido = print_job.content.encode('utf-8', errors='ignore')
+            except Exception as e:
+                logger.warning(f"Error en encoding de contenido: {e}")
+                contenido = b'Error en contenido\n'
+            
+            comandos.extend(contenido)
+            comandos.extend(ESC + b'E' + b'\x00')
+            comandos.extend(b'\n\n\n')
+            comandos.extend(GS + b'V' + b'\x41' + b'\x00')
+            
+            printer = print_job.printer
+            if print_job.open_cash_drawer and printer and printer.has_cash_drawer:
+                try:
+                    pin = printer.cash_drawer_pin if printer.cash_drawer_pin is not None else 0
+                    on_time = printer.cash_drawer_on_time if printer.cash_drawer_on_time is not None else 50
+                    off_time = printer.cash_drawer_off_time if printer.cash_drawer_off_time is not None else 50
+                    
+                    pin = max(0, min(255, pin))
+                    on_time = max(0, min(255, on_time))
+                    off_time = max(0, min(255, off_time))
+                    
+                    comandos.extend(ESC + b'p' + bytes([pin, on_time, off_time]))
+                    logger.debug(f"Comando abrir caja agregado: pin={pin}, on={on_time}, off={off_time}")
+                    
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo agregar comando de caja: {e}")
+            
+            return bytes(comandos)
+            
+        except Exception as e:
+            logger.error(f"❌ Error generando comandos ESC/POS: {e}")
+            return ESC + b'@' + b'Error generando ticket\n\n\n'
     
     @staticmethod
     def _process_logo(logo_path, printer):
         """
-        Procesa y convierte logo a comandos ESC/POS
+        Procesa y convierte logo a comandos ESC/POS.
+        El bloque GS v 0 ya rasterizado se guarda en caché por
+        (huella del logo, ancho máximo), así solo se calcula una vez.
         
         Args:
-            logo_path: Ruta del archivo de imagen
+            logo_path: Ruta del archivo de imagen o data URI en base64
             printer: Objeto Printer
             
         Returns:
             bytes: Comandos ESC/POS para imprimir el logo
         """
         try:
-            # Abrir imagen
-            image = Image.open(logo_path)
-            
-            # Convertir a escala de grises
-            image = image.convert('L')
+            source = _read_logo_source(logo_path)
             
             # Redimensionar según ancho de papel
             if printer.paper_width >= 80:
@@ -286,70 +376,51 @@ class PrinterManager:
             else:
                 max_width = 256
             
-            if image.width > max_width:
-                aspect_ratio = image.height / image.width
-                new_width = max_width
-                new_height = int(new_width * aspect_ratio)
-                image = image.resize((new_width, new_height), Image.LANCZOS)
-            
-            # Convertir a 1-bit (blanco y negro)
-            image = image.point(lambda x: 0 if x < 128 else 255, '1')
-            
-            # Convertir a formato de bits para impresora
-            width = image.width
-            height = image.height
-            
-            # La imagen debe ser múltiplo de 8 en ancho
-            if width % 8 != 0:
-                new_width = ((width // 8) + 1) * 8
-                new_image = Image.new('1', (new_width, height), 1)
-                new_image.paste(image, (0, 0))
-                image = new_image
-                width = new_width
-            
-            # Convertir pixels a bytes
-            image_data = bytearray()
-            pixels = list(image.getdata())
-            
-            for y in range(height):
-                row_data = []
-                for x in range(0, width, 8):
-                    byte = 0
-                    for bit in range(8):
-                        if x + bit < width:
-                            pixel_index = y * width + x + bit
-                            if pixel_index < len(pixels):
-                                if pixels[pixel_index] == 0:  # Negro
-                                    byte |= (1 << (7 - bit))
-                        row_data.append(byte)
-                image_data.extend(row_data)
-            
-            # Generar comandos ESC/POS para imagen
-            commands = bytearray()
-            
-            # Centrar imagen
-            commands.extend(ESCPOSCommands.ALIGN_CENTER)
-            
-            # Comando GS v 0 (imprimir imagen raster)
-            width_bytes = width // 8
-            xl = width_bytes & 0xFF
-            xh = (width_bytes >> 8) & 0xFF
-            yl = height & 0xFF
-            yh = (height >> 8) & 0xFF
-            
-            commands.extend(ESCPOSCommands.GS + b'v' + b'0' + b'\x00')
-            commands.extend(bytes([xl, xh, yl, yh]))
-            commands.extend(image_data)
-            
-            # Volver a alineación izquierda
-            commands.extend(ESCPOSCommands.ALIGN_LEFT)
-            
-            return bytes(commands)
+            cache_key = 'logo_raster:{}:{}:{}'.format(
+                _logo_cache_version(), hashlib.sha1(source).hexdigest(), max_width
+            )
+            commands = cache.get(cache_key)
+            if commands is None:
+                commands = PrinterManager._rasterize_logo(source, max_width)
+                cache.set(cache_key, commands, LOGO_CACHE_TIMEOUT)
+            return commands
             
         except Exception as e:
             logger.error(f"Error procesando logo: {str(e)}")
             return None
     
+    @staticmethod
+    def _rasterize_logo(source, max_width):
+        """Convierte la imagen a un bloque GS v 0 (1 bit por punto, 1 = negro)"""
+        image = Image.open(BytesIO(source)).convert('L')
+        
+        if image.width > max_width:
+            aspect_ratio = image.height / image.width
+            new_width = max_width
+            new_height = int(new_width * aspect_ratio)
+            image = image.resize((new_width, new_height), Image.LANCZOS)
+        
+        # Umbral con tabla (sin lambda por pixel); en modo '1' Pillow empaqueta
+        # 8 puntos por byte, MSB primero, completando cada fila con ceros (blanco)
+        image = image.point(LOGO_THRESHOLD_LUT, '1')
+        width_bytes = (image.width + 7) // 8
+        height = image.height
+        
+        commands = bytearray()
+        
+        # Centrar imagen
+        commands.extend(ESCPOSCommands.ALIGN_CENTER)
+        
+        # Comando GS v 0 (imprimir imagen raster)
+        commands.extend(ESCPOSCommands.GS + b'v' + b'0' + b'\x00')
+        commands.extend(bytes([width_bytes & 0xFF, (width_bytes >> 8) & 0xFF, height & 0xFF, (height >> 8) & 0xFF]))
+        commands.extend(image.tobytes())
+        
+        # Volver a alineación izquierda
+        commands.extend(ESCPOSCommands.ALIGN_LEFT)
+        
+        return bytes(commands)
+    
     @staticmethod
     def generate_open_drawer_commands(printer):
         """
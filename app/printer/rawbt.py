@@ -0,0 +1,44 @@
+# 📁 printer/rawbt.py
+# Entrega del ticket RawBT (ESC/POS en base64) a la página siguiente.
+# El payload se guarda unos segundos en la caché bajo un token de un solo uso
+# que viaja en la URL de la redirección (?rawbt=...), en vez de escribirlo en
+# la sesión: así la sesión no carga bytes de impresión ni se reescribe por ellos.
+import secrets
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.shortcuts import redirect
+from django.urls import reverse
+
+PARAMETRO = 'rawbt'
+RAWBT_TTL = 120
+
+
+def _clave(usuario_id, token):
+    # El token solo sirve para el usuario que generó la impresión
+    return f'rawbt:{usuario_id}:{token}'
+
+
+def guardar_rawbt(request, rawbt_b64):
+    """Guarda el payload y devuelve su token."""
+    token = secrets.token_urlsafe(16)
+    cache.set(_clave(request.user.pk, token), rawbt_b64, RAWBT_TTL)
+    return token
+
+
+def tomar_rawbt(request):
+    """Payload del token recibido en ?rawbt= (una sola vez), o None."""
+    token = request.GET.get(PARAMETRO)
+    if not token or not request.user.is_authenticated:
+        return None
+    clave = _clave(request.user.pk, token)
+    rawbt_b64 = cache.get(clave)
+    cache.delete(clave)
+    return rawbt_b64
+
+
+def redirigir_con_rawbt(request, vista, rawbt_b64=None):
+    """redirect() a `vista` llevando el token del ticket si hay algo que imprimir."""
+    if not rawbt_b64:
+        return redirect(vista)
+    return redirect(f"{reverse(vista)}?{urlencode({PARAMETRO: guardar_rawbt(request, rawbt_b64)})}")
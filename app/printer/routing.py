@@ -0,0 +1,11 @@
+from django.urls import re_path
+
+from channels.auth import AuthMiddlewareStack
+
+from . import consumers
+
+# Mismas rutas que urls.py (con y sin prefijo) y que el location del long-poll en Nginx
+http_urlpatterns = [
+    re_path(r'^(?:api/printer/|api/hardware/)?agente/trabajos/$',
+            AuthMiddlewareStack(consumers.TrabajosAgenteConsumer.as_asgi())),
+]
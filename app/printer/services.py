@@ -0,0 +1,144 @@
+# 📁 printer/services.py
+# Entrega de trabajos al agente de Windows: reclamo atómico + espera larga (long-poll)
+import asyncio
+import base64
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PrintJob
+
+logger = logging.getLogger(__name__)
+
+GRUPO_AGENTES = 'impresion_agentes'
+ESPERA_MAXIMA = 25  # segundos; por debajo del proxy_read_timeout de Nginx
+
+
+def perfil_agente(user):
+    """(es_sistema, username) del agente; sin autenticar se trata como el agente del sistema."""
+    if user is None or not user.is_authenticated:
+        return True, 'system'
+    return user.is_superuser or user.is_staff, user.username
+
+
+def leer_parametros(query):
+    """espera, impresoras y formato desde los parámetros GET (QueryDict)."""
+    try:
+        espera = max(0, int(query.get('espera', 0)))
+    except ValueError:
+        espera = 0
+    impresoras = [n.strip() for n in query.get('impresoras', '').split(',') if n.strip()]
+    formato = 'base64' if query.get('formato') == 'base64' else 'hex'
+    return espera, impresoras, formato
+
+
+def trabajos_pendientes(es_sistema, username, impresoras=None):
+    """Trabajos pendientes visibles para un agente (sistema = todos, si no solo los suyos)."""
+    qs = PrintJob.objects.filter(status='pending')
+    if not es_sistema:
+        qs = qs.filter(created_by=username)
+    if impresoras:
+        qs = qs.filter(printer__name__in=impresoras)
+    return qs.order_by('created_at')
+
+
+def reclamar_trabajos(queryset, limite=10):
+    """
+    Pasa a 'printing' hasta `limite` trabajos del queryset y los retorna.
+    Las filas se bloquean con SKIP LOCKED: dos agentes consultando a la vez
+    nunca reciben el mismo ticket.
+    """
+    with transaction.atomic():
+        ids = list(
+            queryset.select_for_update(skip_locked=True, of=('self',))
+            .values_list('id', flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        PrintJob.objects.filter(id__in=ids).update(status='printing', started_at=timezone.now())
+
+    return list(PrintJob.objects.filter(id__in=ids).select_related('printer').order_by('created_at'))
+
+
+async def reclamar_trabajos_con_espera(queryset, limite=10, espera=0):
+    """
+    Como reclamar_trabajos, pero si no hay nada mantiene el request abierto
+    hasta `espera` segundos y reclama en cuanto se crea un trabajo nuevo.
+    La espera es un await sobre la capa de canales: solo el reclamo ocupa un hilo.
+    """
+    reclamar = database_sync_to_async(reclamar_trabajos)
+    trabajos = await reclamar(queryset, limite)
+    capa = get_channel_layer()
+    if trabajos or espera <= 0 or capa is None:
+        return trabajos
+
+    canal = await capa.new_channel()
+    await capa.group_add(GRUPO_AGENTES, canal)
+    try:
+        fin = time.monotonic() + min(espera, ESPERA_MAXIMA)
+        # Se reintenta ya suscritos: un trabajo creado justo antes no se pierde
+        trabajos = await reclamar(queryset, limite)
+        while not trabajos:
+            restante = fin - time.monotonic()
+            if restante <= 0 or not await _esperar_aviso(capa, canal, restante):
+                break
+            trabajos = await reclamar(queryset, limite)
+    finally:
+        await capa.group_discard(GRUPO_AGENTES, canal)
+    return trabajos
+
+
+async def _esperar_aviso(capa, canal, segundos):
+    try:
+        await asyncio.wait_for(capa.receive(canal), timeout=segundos)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+def datos_trabajos(trabajos, formato='hex'):
+    """Trabajos reclamados tal como los recibe el agente; los que no se pueden preparar quedan fallidos."""
+    datos = []
+    for trabajo in trabajos:
+        try:
+            if not trabajo.printer:
+                logger.warning(f"⚠️ Trabajo {trabajo.id} sin impresora asignada, marcando como fallido")
+                trabajo.mark_as_failed("Impresora no asignada")
+                continue
+
+            comandos = trabajo.escpos_bytes
+
+            datos.append({
+                'id': str(trabajo.id),
+                'impresora': trabajo.printer.name,
+                'comandos': base64.b64encode(comandos).decode('ascii') if formato == 'base64' else comandos.hex(),
+                'formato': formato,
+                'etag': trabajo.escpos_etag,
+                'tipo': trabajo.document_type,
+                'copias': trabajo.copies,
+                'usuario': trabajo.created_by or 'Sistema',
+                'abrir_caja': trabajo.open_cash_drawer
+            })
+
+        except Exception as e:
+            logger.error(f"❌ Error procesando trabajo {trabajo.id}: {e}")
+            trabajo.mark_as_failed(f"Error al preparar impresión: {str(e)}")
+            continue
+    return datos
+
+
+def avisar_agentes():
+    """Despierta a los agentes en espera (se llama al confirmar un trabajo pendiente)."""
+    capa = get_channel_layer()
+    if capa is None:
+        return
+    try:
+        async_to_sync(capa.group_send)(GRUPO_AGENTES, {'type': 'trabajo.nuevo'})
+    except Exception:
+        # Sin aviso el agente igual recibe el trabajo en su siguiente consulta
+        logger.exception("No se pudo avisar a los agentes de impresión")
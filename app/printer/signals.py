@@ -0,0 +1,39 @@
+# 📁 printer/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .enrutamiento import invalidar_cache_impresion
+from .models import Printer, PrintJob, PrinterSettings
+from .print_manager import invalidate_logo_cache
+from .services import avisar_agentes
+
+
+@receiver(post_save, sender=PrintJob)
+def trabajo_guardado(sender, instance, **kwargs):
+    # Nuevo trabajo o reintento: los agentes en long-poll lo reclaman al instante
+    if instance.status == 'pending':
+        transaction.on_commit(avisar_agentes)
+
+
+@receiver(post_save, sender=PrinterSettings)
+def configuracion_guardada(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_company_logo_original', None)
+    instance._company_logo_original = instance.company_logo
+    if not created and anterior != instance.company_logo:
+        invalidate_logo_cache()
+    _invalidar_ruteo()
+
+
+@receiver(post_delete, sender=PrinterSettings)
+@receiver(post_save, sender=Printer)
+@receiver(post_delete, sender=Printer)
+def impresora_modificada(sender, **kwargs):
+    _invalidar_ruteo()
+
+
+def _invalidar_ruteo():
+    # Recalcular la tabla de ruteo (tipo de documento -> impresora). También al
+    # confirmar: otro request pudo recargar la versión vieja antes del commit.
+    invalidar_cache_impresion()
+    transaction.on_commit(invalidar_cache_impresion)
@@ -1,3 +1,296 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import threading
+import time
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import HttpCommunicator
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+
+from core.pruebas import PresupuestoConsultasMixin
+from usuarios.models import Usuario
+
+from .enrutamiento import configuracion_impresion, impresora_para, invalidar_cache_impresion, ruteo_impresion
+from .models import Printer, PrintJob, PrinterSettings
+from .print_manager import ESCPOSCommands, PrinterManager
+from .rawbt import guardar_rawbt, redirigir_con_rawbt, tomar_rawbt
+from .services import GRUPO_AGENTES, reclamar_trabajos, reclamar_trabajos_con_espera
+
+CAPA_EN_MEMORIA = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def crear_trabajo(printer, texto='Ticket'):
+    return PrintJob.objects.create(printer=printer, document_type='order', content=texto, status='pending')
+
+
+@override_settings(CHANNEL_LAYERS=CAPA_EN_MEMORIA)
+class EntregaTrabajosAgenteTest(TestCase):
+
+    def setUp(self):
+        self.cocina = Printer.objects.create(name='Cocina', connection_string='COCINA')
+        self.caja = Printer.objects.create(name='Caja', connection_string='CAJA')
+
+    def test_reclamo_marca_printing_y_no_se_repite(self):
+        """Un trabajo reclamado no vuelve a entregarse"""
+        trabajo = crear_trabajo(self.cocina)
+        # SELECT ... FOR UPDATE SKIP LOCKED, UPDATE y SELECT final (+ SAVEPOINT/RELEASE del test)
+        with self.assertNumQueries(5):
+            entregados = reclamar_trabajos(PrintJob.objects.filter(status='pending'))
+        self.assertEqual([t.id for t in entregados], [trabajo.id])
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.status, 'printing')
+        self.assertIsNotNone(trabajo.started_at)
+        self.assertEqual(reclamar_trabajos(PrintJob.objects.filter(status='pending')), [])
+
+    def test_endpoint_filtra_por_impresoras(self):
+        crear_trabajo(self.cocina, 'Comanda')
+        crear_trabajo(self.caja, 'Recibo')
+
+        respuesta = self.client.get('/api/printer/agente/trabajos/', {'impresoras': 'Cocina'})
+        trabajos = respuesta.json()['trabajos']
+        self.assertEqual([t['impresora'] for t in trabajos], ['Cocina'])
+        self.assertEqual(PrintJob.objects.filter(status='pending').count(), 1)
+
+    def test_nuevo_trabajo_despierta_agentes(self):
+        capa = get_channel_layer()
+        canal = async_to_sync(capa.new_channel)()
+        async_to_sync(capa.group_add)(GRUPO_AGENTES, canal)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_trabajo(self.cocina)
+
+        async def recibir():
+            return await asyncio.wait_for(capa.receive(canal), timeout=1)
+        self.assertEqual(async_to_sync(recibir)()['type'], 'trabajo.nuevo')
+
+
+class ReclamoConcurrenteTest(TransactionTestCase):
+
+    def test_filas_bloqueadas_por_otro_agente_se_saltan(self):
+        """Dos agentes a la vez nunca reciben el mismo ticket"""
+        printer = Printer.objects.create(name='Barra', connection_string='BARRA')
+        ocupado = crear_trabajo(printer, 'Primero')
+        libre = crear_trabajo(printer, 'Segundo')
+
+        bloqueado, liberar = threading.Event(), threading.Event()
+
+        def otro_agente():
+            try:
+                with transaction.atomic():
+                    list(PrintJob.objects.select_for_update().filter(pk=ocupado.pk))
+                    bloqueado.set()
+                    liberar.wait(5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=otro_agente)
+        hilo.start()
+        try:
+            self.assertTrue(bloqueado.wait(5))
+            entregados = reclamar_trabajos(PrintJob.objects.filter(status='pending'))
+            self.assertEqual([t.id for t in entregados], [libre.id])
+        finally:
+            liberar.set()
+            hilo.join()
+
+
+@override_settings(CHANNEL_LAYERS=CAPA_EN_MEMORIA)
+class LongPollAsgiTest(TransactionTestCase):
+    """El long-poll por Daphne: la espera no ocupa el hilo de las vistas sync"""
+
+    def _comunicador(self, ruta, headers=None):
+        from restaurante.asgi import application
+        return HttpCommunicator(application, 'GET', ruta, headers=headers)
+
+    async def test_espera_vence_sin_trabajos(self):
+        """Sin trabajos el long-poll responde vacío al vencer la espera"""
+        inicio = time.monotonic()
+        self.assertEqual(await reclamar_trabajos_con_espera(PrintJob.objects.filter(status='pending'), espera=1), [])
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.9)
+
+    async def test_esperas_concurrentes_no_se_serializan(self):
+        agentes = [self._comunicador('/api/printer/agente/trabajos/?espera=1') for _ in range(3)]
+        inicio = time.monotonic()
+        respuestas = await asyncio.gather(*(a.get_response(timeout=5) for a in agentes))
+        transcurrido = time.monotonic() - inicio
+
+        self.assertEqual([r['status'] for r in respuestas], [200] * 3)
+        self.assertEqual([json.loads(r['body'])['trabajos'] for r in respuestas], [[]] * 3)
+        # En serie serían 3 s; en paralelo todas vencen a la vez
+        self.assertLess(transcurrido, 2)
+
+    async def test_trabajo_nuevo_responde_la_espera(self):
+        printer = await Printer.objects.acreate(name='Cocina', connection_string='COCINA')
+        agente = self._comunicador('/agente/trabajos/?espera=5')
+        respuesta = asyncio.ensure_future(agente.get_response(timeout=5))
+        await asyncio.sleep(0.3)
+        trabajo = await database_sync_to_async(crear_trabajo)(printer)
+
+        datos = json.loads((await respuesta)['body'])
+        self.assertEqual([t['id'] for t in datos['trabajos']], [str(trabajo.id)])
+
+    async def test_token_invalido_401(self):
+        agente = self._comunicador('/api/hardware/agente/trabajos/', headers=[(b'authorization', b'Token nope')])
+        respuesta = await agente.get_response()
+        self.assertEqual(respuesta['status'], 401)
+
+
+class ComandosPreRenderizadosTest(TestCase):
+
+    def setUp(self):
+        self.printer = Printer.objects.create(name='Cocina', connection_string='COCINA')
+
+    def test_se_renderiza_una_vez_al_crear(self):
+        trabajo = crear_trabajo(self.printer, 'Mesa 4\n2x Seco de pollo')
+        self.assertIsNotNone(trabajo.escpos_payload)
+        self.assertEqual(len(trabajo.escpos_etag), 32)
+
+        trabajo = PrintJob.objects.get(pk=trabajo.pk)
+        with mock.patch('printer.print_manager.PrinterManager.render_job_bytes') as renderizar:
+            comandos = trabajo.escpos_bytes
+        renderizar.assert_not_called()
+        self.assertTrue(comandos.startswith(b'\x1b@'))
+        self.assertIn(b'Seco de pollo', comandos)
+
+    def test_endpoint_binario_con_etag(self):
+        trabajo = crear_trabajo(self.printer)
+        url = f'/api/printer/agente/trabajos/{trabajo.id}/comandos/'
+
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+        self.assertEqual(respuesta.content, trabajo.escpos_bytes)
+
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_agente_recibe_base64(self):
+        trabajo = crear_trabajo(self.printer)
+        datos = self.client.get('/api/printer/agente/trabajos/', {'formato': 'base64'}).json()['trabajos'][0]
+        self.assertEqual(base64.b64decode(datos['comandos']), trabajo.escpos_bytes)
+        self.assertEqual(datos['etag'], trabajo.escpos_etag)
+
+
+class LogoRasterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.printer = Printer.objects.create(name='Caja', connection_string='CAJA', paper_width=80)
+        # 10x2: fila 0 con 3 puntos negros a la izquierda, fila 1 negra completa
+        imagen = Image.new('L', (10, 2), 255)
+        for x in range(3):
+            imagen.putpixel((x, 0), 0)
+        for x in range(10):
+            imagen.putpixel((x, 1), 40)
+        buffer = BytesIO()
+        imagen.save(buffer, format='PNG')
+        self.logo = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    def test_bloque_gs_v0(self):
+        comandos = PrinterManager._process_logo(self.logo, self.printer)
+        cabecera = ESCPOSCommands.ALIGN_CENTER + ESCPOSCommands.GS + b'v0\x00' + bytes([2, 0, 2, 0])
+        self.assertEqual(comandos, cabecera + bytes([0b11100000, 0, 0xFF, 0b11000000]) + ESCPOSCommands.ALIGN_LEFT)
+
+    def test_cache_e_invalidacion_por_logo(self):
+        with mock.patch('printer.print_manager.PrinterManager._rasterize_logo', return_value=b'LOGO') as rasterizar:
+            PrinterManager._process_logo(self.logo, self.printer)
+            PrinterManager._process_logo(self.logo, self.printer)
+            self.assertEqual(rasterizar.call_count, 1)
+
+            config = PrinterSettings.get_settings()
+            config.company_logo = self.logo
+            config.save()
+            PrinterManager._process_logo(self.logo, self.printer)
+            self.assertEqual(rasterizar.call_count, 2)
+
+
+class RuteoImpresionTest(TestCase):
+
+    def setUp(self):
+        invalidar_cache_impresion()
+        self.addCleanup(invalidar_cache_impresion)
+        self.caja = Printer.objects.create(name='Caja', connection_string='CAJA', config={'prints_receipt': True})
+        self.cocina = Printer.objects.create(name='Cocina', connection_string='COCINA', config={'prints_command': True})
+
+    def test_sin_consultas_una_vez_cargado(self):
+        self.assertEqual(impresora_para('receipt'), self.caja)
+        with self.assertNumQueries(0):
+            self.assertEqual(impresora_para('order'), self.cocina)
+            self.assertTrue(configuracion_impresion().auto_print_receipt)
+
+    def test_se_invalida_al_guardar(self):
+        self.assertEqual(impresora_para('order'), self.cocina)
+
+        self.cocina.is_active = False
+        self.cocina.save()
+        self.assertIsNone(impresora_para('order'))
+
+        config = PrinterSettings.get_settings()
+        config.auto_print_receipt = False
+        config.save()
+        self.assertFalse(configuracion_impresion().auto_print_receipt)
+
+
+    def test_instantanea_no_cambia_al_invalidar(self):
+        """Quien ya tomó la configuración no ve un estado a medias si otro hilo invalida"""
+        ruteo = ruteo_impresion()
+        invalidar_cache_impresion()
+        self.assertIsNotNone(ruteo.config)
+        self.assertEqual((ruteo.impresora_para('order'), ruteo.impresora_para('receipt')), (self.cocina, self.caja))
+        with self.assertRaises(TypeError):
+            ruteo.rutas['order'] = self.caja
+        self.assertIsNot(ruteo_impresion(), ruteo)
+
+
+class TokenRawbtTest(TestCase):
+
+    def setUp(self):
+        self.mesero = Usuario.objects.create_user(username='mesero_rawbt', email='mesero_rawbt@test.com', password='x', rol='mesero')
+        self.otro = Usuario.objects.create_user(username='otro_rawbt', email='otro_rawbt@test.com', password='x', rol='mesero')
+
+    def _request(self, usuario, **params):
+        request = RequestFactory().get('/', params)
+        request.user = usuario
+        return request
+
+    def test_token_de_un_solo_uso_y_por_usuario(self):
+        token = guardar_rawbt(self._request(self.mesero), 'G0BA')
+
+        self.assertIsNone(tomar_rawbt(self._request(self.otro, rawbt=token)))
+        self.assertEqual(tomar_rawbt(self._request(self.mesero, rawbt=token)), 'G0BA')
+        self.assertIsNone(tomar_rawbt(self._request(self.mesero, rawbt=token)))
+
+        respuesta = redirigir_con_rawbt(self._request(self.mesero), 'usuarios:dashboard_mesero', 'G0BA')
+        self.assertIn('?rawbt=', respuesta.url)
+        self.assertNotIn('?', redirigir_con_rawbt(self._request(self.mesero), 'usuarios:dashboard_mesero').url)
+
+    def test_la_pagina_de_destino_recibe_el_ticket(self):
+        token = guardar_rawbt(self._request(self.mesero), 'G0BA')
+        self.client.force_login(self.mesero)
+        respuesta = self.client.get(reverse('usuarios:dashboard_mesero'), {'rawbt': token})
+        self.assertEqual(respuesta.context['rawbt_b64'], 'G0BA')
+        self.assertNotIn('rawbt_b64', self.client.session)
+
+
+class PresupuestoAgenteTest(PresupuestoConsultasMixin, TestCase):
+
+    def setUp(self):
+        self.impresoras = [Printer.objects.create(name=n, connection_string=n.upper()) for n in ('Cocina', 'Caja', 'Barra')]
+
+    def _pedir(self, cantidad):
+        # Hasta el límite de 10 por llamada, repartidos entre las impresoras
+        for i in range(cantidad):
+            crear_trabajo(self.impresoras[i % len(self.impresoras)], f'Ticket {i}')
+        return self.medir_consultas(lambda: self.client.get('/api/printer/agente/trabajos/'))
+
+    def test_agente_trabajos_pendientes(self):
+        self.assertPresupuestoConsultas(5, self._pedir(2), self._pedir(9))
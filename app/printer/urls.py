@@ -17,6 +17,7 @@ urlpatterns = [
     # ============================================================================
     path('agente/registrar/', views.agente_registrar, name='agente-registrar'),
     path('agente/trabajos/', views.agente_trabajos_pendientes, name='agente-trabajos'),
+    path('agente/trabajos/<uuid:trabajo_id>/comandos/', views.agente_comandos_trabajo, name='agente-comandos'),
     path('agente/resultado/', views.agente_reportar_resultado, name='agente-resultado'),
     path('agente/estado/', views.agente_estado, name='agente-estado'),
     path('agente/abrir-caja/', views.agente_abrir_caja, name='agente-abrir-caja'),
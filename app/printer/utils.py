@@ -21,8 +21,8 @@ class TemplateRenderer:
     
     def get_settings(self):
         """Obtiene configuración global"""
-        from .models import PrinterSettings
-        return PrinterSettings.get_settings()
+        from .enrutamiento import configuracion_impresion
+        return configuracion_impresion()
     
     def render(self):
         """Renderiza la plantilla con los datos"""
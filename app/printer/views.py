@@ -1,4 +1,5 @@
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt  # ← AGREGADO
 from rest_framework import viewsets, status, generics, mixins
 from rest_framework.decorators import action, api_view, permission_classes
@@ -9,9 +10,9 @@ from django.utils import timezone
 from django.db import transaction
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
+from asgiref.sync import async_to_sync
 import json
 import logging
-import base64
 from io import BytesIO
 from PIL import Image
 
@@ -24,7 +25,11 @@ from .serializers import (
     AgenteRegistroSerializer,
     AgenteResultadoSerializer,
 )
+from .enrutamiento import configuracion_impresion
 from .print_manager import PrinterManager
+from .services import (
+    datos_trabajos, leer_parametros, perfil_agente, reclamar_trabajos, reclamar_trabajos_con_espera, trabajos_pendientes,
+)
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -335,47 +340,28 @@ def agente_registrar(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def agente_trabajos_pendientes(request):
-    """Endpoint para obtener trabajos pendientes"""
-    es_sistema = (request.user.is_superuser or request.user.is_staff) if request.user.is_authenticated else True
-    
-    if es_sistema:
-        trabajos = PrintJob.objects.filter(
-            status='pending'
-        ).select_related('printer').order_by('created_at')[:10]
+    """
+    Endpoint para obtener trabajos pendientes.
+
+    Parámetros opcionales:
+      - espera: segundos (máx. 25) que el request queda abierto si no hay
+        trabajos; responde apenas se crea uno (long-poll).
+      - impresoras: nombres separados por coma para recibir solo sus trabajos.
+      - formato: 'hex' (por defecto) o 'base64' para los comandos.
+
+    Detrás de Nginx esta URL la atiende Daphne con consumers.TrabajosAgenteConsumer;
+    esta vista queda para WSGI (runserver, Gunicorn sin proxy).
+    """
+    es_sistema, username = perfil_agente(request.user)
+    espera, impresoras, formato = leer_parametros(request.query_params)
+
+    pendientes = trabajos_pendientes(es_sistema, username, impresoras)
+    if espera:
+        trabajos = async_to_sync(reclamar_trabajos_con_espera)(pendientes, limite=10, espera=espera)
     else:
-        trabajos = PrintJob.objects.filter(
-            status='pending',
-            created_by=request.user.username
-        ).select_related('printer').order_by('created_at')[:10]
-    
-    trabajos_data = []
-    for trabajo in trabajos:
-        try:
-            if not trabajo.printer:
-                logger.warning(f"⚠️ Trabajo {trabajo.id} sin impresora asignada, marcando como fallido")
-                trabajo.mark_as_failed("Impresora no asignada")
-                continue
-            
-            trabajo.mark_as_printing()
-            
-            comandos_hex = generar_comandos_escpos(trabajo)
-            
-            trabajos_data.append({
-                'id': str(trabajo.id),
-                'impresora': trabajo.printer.name,
-                'comandos': comandos_hex,
-                'tipo': trabajo.document_type,
-                'copias': trabajo.copies,
-                'usuario': trabajo.created_by or 'Sistema',
-                'abrir_caja': trabajo.open_cash_drawer
-            })
-            
-        except Exception as e:
-            logger.error(f"❌ Error procesando trabajo {trabajo.id}: {e}")
-            trabajo.mark_as_failed(f"Error al preparar impresión: {str(e)}")
-            continue
-    
-    username = request.user.username if request.user.is_authenticated else 'system'
+        trabajos = reclamar_trabajos(pendientes, limite=10)
+    trabajos_data = datos_trabajos(trabajos, formato)
+
     logger.info(
         f"📥 Agente {username} consultó trabajos: "
         f"{len(trabajos_data)} pendientes [{'SISTEMA' if es_sistema else 'NORMAL'}]"
@@ -387,6 +373,25 @@ def agente_trabajos_pendientes(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def agente_comandos_trabajo(request, trabajo_id):
+    """
+    Comandos ESC/POS de un trabajo como bytes crudos (application/octet-stream).
+    Responde 304 si el agente ya tiene esa versión (If-None-Match).
+    """
+    trabajo = get_object_or_404(PrintJob.objects.only('id', 'escpos_payload', 'escpos_etag'), id=trabajo_id)
+    comandos = trabajo.escpos_bytes
+    etag = f'"{trabajo.escpos_etag}"'
+    
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        respuesta = HttpResponse(status=304)
+    else:
+        respuesta = HttpResponse(comandos, content_type='application/octet-stream')
+    respuesta['ETag'] = etag
+    return respuesta
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @csrf_exempt  # ← AGREGADO
@@ -533,51 +538,8 @@ def agente_abrir_caja(request):
 # ============================================================================
 
 def generar_comandos_escpos(trabajo):
-    """Genera comandos ESC/POS en hexadecimal para el trabajo de impresión"""
-    try:
-        ESC = b'\x1b'
-        GS = b'\x1d'
-        
-        comandos = bytearray()
-        
-        comandos.extend(ESC + b'@')
-        comandos.extend(ESC + b'a' + b'\x01')
-        comandos.extend(ESC + b'E' + b'\x01')
-        
-        try:
-            contenido = trabajo.content.encode('utf-8', errors='ignore')
-        except Exception as e:
-            logger.warning(f"Error en encoding de contenido: {e}")
-            contenido = b'Error en contenido\n'
-        
-        comandos.extend(contenido)
-        comandos.extend(ESC + b'E' + b'\x00')
-        comandos.extend(b'\n\n\n')
-        comandos.extend(GS + b'V' + b'\x41' + b'\x00')
-        
-        if trabajo.open_cash_drawer and trabajo.printer and trabajo.printer.has_cash_drawer:
-            try:
-                pin = trabajo.printer.cash_drawer_pin if trabajo.printer.cash_drawer_pin is not None else 0
-                on_time = trabajo.printer.cash_drawer_on_time if trabajo.printer.cash_drawer_on_time is not None else 50
-                off_time = trabajo.printer.cash_drawer_off_time if trabajo.printer.cash_drawer_off_time is not None else 50
-                
-                pin = max(0, min(255, pin))
-                on_time = max(0, min(255, on_time))
-                off_time = max(0, min(255, off_time))
-                
-                comandos.extend(ESC + b'p' + bytes([pin, on_time, off_time]))
-                logger.debug(f"Comando abrir caja agregado: pin={pin}, on={on_time}, off={off_time}")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ No se pudo agregar comando de caja: {e}")
-        
-        return comandos.hex()
-        
-    except Exception as e:
-        logger.error(f"❌ Error generando comandos ESC/POS: {e}")
-        ESC = b'\x1b'
-        comando_emergencia = ESC + b'@' + b'Error generando ticket\n\n\n'
-        return comando_emergencia.hex()
+    """Comandos ESC/POS del trabajo en hexadecimal (ya renderizados al crearlo)"""
+    return trabajo.escpos_bytes.hex()
 
 
 def generar_comando_abrir_caja(printer):
@@ -760,7 +722,7 @@ class PrintReceiptView(APIView):
     
     def generate_receipt_content(self, printer, order_data):
         """Genera el contenido formateado para el ticket"""
-        settings = PrinterSettings.get_settings()
+        settings = configuracion_impresion()
         chars_per_line = printer.characters_per_line or 42
     
         lines = []
@@ -0,0 +1,77 @@
+# 📁 usuarios/actividad.py
+# Última actividad de cada usuario (Online / Offline).
+# Cada request autenticado deja su marca en la caché; a la base solo se escribe
+# Usuario.last_activity una vez cada ACTIVIDAD_FLUSH_SEGUNDOS por usuario, así
+# los polls de cocina y notificaciones no generan un UPDATE por request.
+# Las lecturas combinan la base con la marca en caché (la más reciente gana).
+# Si Redis no responde (IGNORE_EXCEPTIONS: add() devuelve None) la ventana se
+# lleva en memoria del proceso, así la base sigue al día y nadie figura Offline.
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Usuario
+
+ACTIVIDAD_FLUSH_SEGUNDOS = getattr(settings, 'ACTIVIDAD_FLUSH_SEGUNDOS', 60)
+MINUTOS_EN_LINEA = 5
+# La marca en caché solo hace falta mientras la base pueda estar atrasada
+ACTIVIDAD_TTL = 60 * 60
+
+
+_volcados_locales = {}  # usuario_id -> time.monotonic() del último UPDATE sin caché
+
+
+def _clave(usuario_id):
+    return f'actividad:{usuario_id}'
+
+
+def _toca_volcar(usuario_id):
+    # add() solo tiene éxito si la llave no existe: una escritura por ventana y usuario
+    agregado = cache.add(f'actividad_volcada:{usuario_id}', 1, ACTIVIDAD_FLUSH_SEGUNDOS)
+    if agregado is not None:
+        return agregado
+    ahora = time.monotonic()
+    if ahora - _volcados_locales.get(usuario_id, float('-inf')) < ACTIVIDAD_FLUSH_SEGUNDOS:
+        return False
+    _volcados_locales[usuario_id] = ahora
+    return True
+
+
+def registrar_actividad(usuario_id, momento=None):
+    """Marca actividad; devuelve True si además se escribió en la base."""
+    momento = momento or timezone.now()
+    cache.set(_clave(usuario_id), momento, ACTIVIDAD_TTL)
+    if _toca_volcar(usuario_id):
+        Usuario.objects.filter(pk=usuario_id).update(last_activity=momento)
+        return True
+    return False
+
+
+def umbral_en_linea():
+    return timezone.now() - datetime.timedelta(minutes=MINUTOS_EN_LINEA)
+
+
+def anotar_actividad(usuarios):
+    """Lista de usuarios con last_activity al día según la caché (una lectura para todos)."""
+    usuarios = list(usuarios)
+    marcas = cache.get_many([_clave(u.pk) for u in usuarios])
+    for usuario in usuarios:
+        marca = marcas.get(_clave(usuario.pk))
+        if marca and (usuario.last_activity is None or marca > usuario.last_activity):
+            usuario.last_activity = marca
+    return usuarios
+
+
+def usuarios_en_linea():
+    """
+    Ids de usuarios activos en los últimos MINUTOS_EN_LINEA. En la base la
+    actividad se atrasa a lo sumo ACTIVIDAD_FLUSH_SEGUNDOS, así que basta con
+    revisar en caché a los candidatos de ese margen.
+    """
+    umbral = umbral_en_linea()
+    candidatos = Usuario.objects.filter(
+        last_activity__gte=umbral - datetime.timedelta(seconds=ACTIVIDAD_FLUSH_SEGUNDOS))
+    return {u.pk for u in anotar_actividad(candidatos.only('id', 'last_activity')) if u.last_activity >= umbral}
@@ -3,6 +3,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import Usuario, AuditLog
+from .auditoria import auditar
 
 # Función auxiliar para obtener la IP del usuario
 def get_client_ip(request):
@@ -63,11 +64,7 @@ class CustomUserAdmin(UserAdmin):
         detalle = f"{tipo_accion} de usuario: {obj.username} ({obj.get_rol_display()})"
         
         # Creamos el registro en el AuditLog
-        AuditLog.objects.create(
-            user=request.user, # El admin que hizo la acción
-            ip_address=get_client_ip(request),
-            action=detalle
-        )
+        auditar(request.user, detalle, get_client_ip(request))
 
     # --- ACCIONES PERSONALIZADAS ---
     actions = ['desactivar_usuarios', 'activar_usuarios']
@@ -78,11 +75,7 @@ class CustomUserAdmin(UserAdmin):
         
         # Registramos la acción en el log para cada usuario desactivado
         for usuario in queryset:
-             AuditLog.objects.create(
-                user=request.user,
-                ip_address=get_client_ip(request),
-                action=f"Desactivación de usuario: {usuario.username}"
-            )
+            auditar(request.user, f"Desactivación de usuario: {usuario.username}", get_client_ip(request))
             
         self.message_user(request, f"{rows_updated} usuario(s) fueron desactivados.")
 
@@ -92,11 +85,7 @@ class CustomUserAdmin(UserAdmin):
         
         # Registramos la acción en el log
         for usuario in queryset:
-             AuditLog.objects.create(
-                user=request.user,
-                ip_address=get_client_ip(request),
-                action=f"Reactivación de usuario: {usuario.username}"
-            )
+            auditar(request.user, f"Reactivación de usuario: {usuario.username}", get_client_ip(request))
 
         self.message_user(request, f"{rows_updated} usuario(s) fueron reactivados.")
 
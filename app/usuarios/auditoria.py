@@ -0,0 +1,150 @@
+# 📁 usuarios/auditoria.py
+# Registro de auditoría sin un INSERT por request.
+# Las vistas llaman a auditar(); con AUDITORIA_ASINCRONA las entradas se
+# acumulan en memoria del proceso y un hilo las escribe con bulk_create:
+#   - cuando se juntan AUDITORIA_LOTE entradas, o
+#   - cada AUDITORIA_FLUSH_SEGUNDOS, o
+#   - al terminar el proceso (atexit; gunicorn cierra sus workers con SIGTERM):
+#     cerrar() detiene el hilo, espera el lote que esté escribiendo y guarda
+#     (o respalda en archivo) lo que quede.
+# Solo se encola lo que llegó a confirmarse (transaction.on_commit), igual que
+# antes un rollback deshacía el AuditLog.create(). Si la base no responde, el
+# lote vuelve a la cola para el siguiente intento; lo que no cabe en memoria
+# (MAX_PENDIENTES) se respalda en AUDITORIA_RESPALDO (JSON por línea).
+# Sin AUDITORIA_ASINCRONA (por defecto, y siempre en los tests) se escribe en el momento.
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDIENTES = 10000  # tope si la base no responde por mucho tiempo
+
+
+class EscritorAuditoria:
+
+    def __init__(self, lote=100, flush_segundos=2.0, respaldo=None):
+        self.lote = lote
+        self.flush_segundos = flush_segundos
+        self.respaldo = respaldo
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._vaciando = threading.Lock()  # un solo vaciado a la vez, de principio a fin
+        self._hay_lote = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+    def agregar(self, entrada):
+        with self._lock:
+            self._pendientes.append(entrada)
+            lleno = len(self._pendientes) >= self.lote
+        self._asegurar_hilo()
+        if lleno:
+            self._hay_lote.set()
+
+    def vaciar(self):
+        """Escribe todo lo pendiente; devuelve cuántas entradas se guardaron."""
+        with self._vaciando:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, []
+            if not pendientes:
+                return 0
+            try:
+                AuditLog.objects.bulk_create(pendientes, batch_size=self.lote)
+            except (IntegrityError, DataError):
+                # Una entrada inválida (p. ej. su usuario ya no existe) no debe trabar al resto
+                return self._guardar_una_a_una(pendientes)
+            except DatabaseError:
+                with self._lock:
+                    pendientes += self._pendientes
+                    sobrantes, self._pendientes = pendientes[:-MAX_PENDIENTES], pendientes[-MAX_PENDIENTES:]
+                logger.exception('No se pudo escribir la auditoría; %d entradas quedan pendientes', len(self._pendientes))
+                if sobrantes:
+                    self._respaldar(sobrantes)
+                return 0
+            return len(pendientes)
+
+    def cerrar(self):
+        """
+        Al terminar el proceso. Sin esperar, un lote a medio bulk_create en el
+        hilo (daemon) se perdería: vaciar() toma el mismo lock y espera a que
+        termine. Lo que la base no acepte queda en el archivo de respaldo.
+        """
+        self._detener.set()
+        self._hay_lote.set()
+        self.vaciar()
+        with self._lock:
+            restantes, self._pendientes = self._pendientes, []
+        if restantes:
+            self._respaldar(restantes)
+
+    def _respaldar(self, entradas):
+        """Las entradas más viejas que no caben en memoria van a un archivo, nunca se pierden en silencio."""
+        try:
+            os.makedirs(os.path.dirname(self.respaldo), exist_ok=True)
+            with open(self.respaldo, 'a', encoding='utf-8') as archivo:
+                for e in entradas:
+                    archivo.write(json.dumps({'user_id': e.user_id, 'ip_address': e.ip_address, 'action': e.action,
+                                              'timestamp': e.timestamp.isoformat()}, ensure_ascii=False) + '\n')
+            logger.error('%d entradas de auditoría respaldadas en %s (la base no responde)', len(entradas), self.respaldo)
+        except (OSError, TypeError):
+            logger.exception('No se pudo respaldar la auditoría; se descartan %d entradas:', len(entradas))
+            for e in entradas:
+                logger.error('Auditoría descartada: usuario=%s ip=%s %s %s', e.user_id, e.ip_address, e.timestamp, e.action)
+
+    def _guardar_una_a_una(self, entradas):
+        guardadas = 0
+        for entrada in entradas:
+            try:
+                with transaction.atomic():
+                    entrada.save()
+                guardadas += 1
+            except (IntegrityError, DataError):
+                logger.exception('Entrada de auditoría descartada: %s', entrada.action)
+        return guardadas
+
+    def _asegurar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._ciclo, name='auditoria', daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            self._hay_lote.wait(self.flush_segundos)
+            self._hay_lote.clear()
+            if self._detener.is_set():
+                break  # el resto lo escribe cerrar()
+            close_old_connections()
+            self.vaciar()
+
+
+escritor = EscritorAuditoria(
+    lote=getattr(settings, 'AUDITORIA_LOTE', 100),
+    flush_segundos=getattr(settings, 'AUDITORIA_FLUSH_SEGUNDOS', 2.0),
+    respaldo=getattr(settings, 'AUDITORIA_RESPALDO', os.path.join(settings.BASE_DIR, 'logs', 'auditoria_pendiente.jsonl')),
+)
+atexit.register(escritor.cerrar)
+
+
+def auditar(user, action, ip_address=None):
+    """Registra una acción en el AuditLog (en lote si AUDITORIA_ASINCRONA)."""
+    entrada = AuditLog(user=user, ip_address=ip_address, action=action[:100], timestamp=timezone.now())
+    if not getattr(settings, 'AUDITORIA_ASINCRONA', False):
+        entrada.save()
+        return
+    transaction.on_commit(lambda: escritor.agregar(entrada))
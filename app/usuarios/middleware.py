@@ -1,5 +1,4 @@
-from django.utils import timezone
-from .models import Usuario
+from .actividad import registrar_actividad
 
 class UpdateLastActivityMiddleware:
     def __init__(self, get_response):
@@ -9,7 +8,7 @@ class UpdateLastActivityMiddleware:
         response = self.get_response(request)
         
         if request.user.is_authenticated:
-            # Actualizamos last_activity sin disparar el save() completo para optimizar
-            Usuario.objects.filter(pk=request.user.pk).update(last_activity=timezone.now())
+            # Marca en caché; la base se actualiza como mucho cada ACTIVIDAD_FLUSH_SEGUNDOS por usuario
+            registrar_actividad(request.user.pk)
             
         return response
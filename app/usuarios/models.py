@@ -4,6 +4,7 @@
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.utils import timezone
 
 class UsuarioManager(BaseUserManager):
     
@@ -68,7 +69,8 @@ class AuditLog(models.Model):
     user = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     action = models.CharField(max_length=100)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Hora de la acción, no de la escritura (usuarios/auditoria.py escribe en lote)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         user_display = self.user.username if self.user else "Anonymous"
@@ -1,3 +1,183 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.pruebas import PresupuestoConsultasMixin
+from pedidos.models import DetallePedido, Factura, Pedido, Producto
+
+from .actividad import _volcados_locales, registrar_actividad, usuarios_en_linea
+from .auditoria import EscritorAuditoria, auditar
+from .models import AuditLog, Usuario
+
+
+class ActividadUsuarioTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gerente = Usuario.objects.create_user(username='gerente_act', email='gerente_act@test.com', password='x', rol='gerente')
+        self.mesero = Usuario.objects.create_user(username='mesero_act', email='mesero_act@test.com', password='x', rol='mesero')
+
+    def _updates_de_actividad(self, consultas):
+        return [q for q in consultas if q['sql'].startswith('UPDATE') and 'last_activity' in q['sql']]
+
+    def test_una_escritura_por_ventana(self):
+        self.client.force_login(self.mesero)
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(5):
+                self.client.get(reverse('pedidos:check_notificaciones'))
+        self.assertEqual(len(self._updates_de_actividad(consultas)), 1)
+        self.mesero.refresh_from_db()
+        self.assertIsNotNone(self.mesero.last_activity)
+
+    def test_en_linea_lee_la_marca_en_cache(self):
+        self.client.force_login(self.mesero)
+        self.client.get(reverse('pedidos:check_notificaciones'))
+        self.assertEqual(usuarios_en_linea(), {self.mesero.pk})
+
+        self.client.force_login(self.gerente)
+        self.client.get(reverse('usuarios:dashboard_gerente'))  # la marca se deja al terminar el request
+        respuesta = self.client.get(reverse('usuarios:lista_usuarios'))
+        self.assertEqual(respuesta.context['usuarios'][0].pk, self.gerente.pk)
+        respuesta = self.client.get(reverse('usuarios:dashboard_gerente'))
+        self.assertEqual(respuesta.context['usuarios_activos'], 2)
+
+    def test_sin_cache_escribe_en_la_base_una_vez_por_ventana(self):
+        """Con Redis caído (IGNORE_EXCEPTIONS) la actividad igual llega a la base y el usuario figura en línea"""
+        _volcados_locales.clear()
+        self.addCleanup(_volcados_locales.clear)
+        with mock.patch('usuarios.actividad.cache') as caida:
+            caida.add.return_value = None
+            caida.get_many.return_value = {}
+            self.assertTrue(registrar_actividad(self.mesero.pk))
+            self.assertFalse(registrar_actividad(self.mesero.pk))
+            self.assertEqual(usuarios_en_linea(), {self.mesero.pk})
+
+
+@override_settings(AUDITORIA_ASINCRONA=True)
+class AuditoriaEnLoteTest(TestCase):
+
+    def setUp(self):
+        self.mesero = Usuario.objects.create_user(username='mesero_aud', email='mesero_aud@test.com', password='x', rol='mesero')
+        # Sin hilo: el test decide cuándo se vacía
+        self.escritor = EscritorAuditoria(lote=3, flush_segundos=3600)
+        self.escritor._asegurar_hilo = lambda: None
+        parche = mock.patch('usuarios.auditoria.escritor', self.escritor)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_se_escribe_en_lote_con_la_hora_de_la_accion(self):
+        antes = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            auditar(self.mesero, 'Envió a cocina: Pedido #1', '10.0.0.1')
+            auditar(self.mesero, 'Cobró cuenta: Pedido #1')
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertFalse(self.escritor._hay_lote.is_set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            auditar(self.mesero, 'Cocina terminó: Pedido #2')
+        self.assertTrue(self.escritor._hay_lote.is_set())  # lote completo: el hilo despierta
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.escritor.vaciar(), 3)
+        self.assertEqual(len(consultas), 1)
+        log = AuditLog.objects.get(action='Envió a cocina: Pedido #1')
+        self.assertEqual((log.user, log.ip_address), (self.mesero, '10.0.0.1'))
+        self.assertLess(log.timestamp, timezone.now())
+        self.assertGreaterEqual(log.timestamp, antes)
+
+    def test_rollback_no_deja_registro(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    auditar(self.mesero, 'Eliminó Pedido #5')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.escritor.vaciar(), 0)
+
+    def test_sin_base_lo_que_no_cabe_se_respalda_en_archivo(self):
+        self.escritor.respaldo = os.path.join(tempfile.mkdtemp(), 'auditoria.jsonl')
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                auditar(self.mesero, f'Pedido #{n}')
+        with mock.patch('usuarios.auditoria.MAX_PENDIENTES', 2), \
+                mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError), \
+                self.assertLogs('usuarios.auditoria', 'ERROR'):
+            self.assertEqual(self.escritor.vaciar(), 0)
+
+        with open(self.escritor.respaldo, encoding='utf-8') as archivo:
+            respaldadas = [json.loads(linea) for linea in archivo]
+        self.assertEqual([(r['user_id'], r['action']) for r in respaldadas], [(self.mesero.id, 'Pedido #0')])
+        # Lo que cabe en memoria se escribe cuando la base vuelve
+        self.assertEqual(self.escritor.vaciar(), 2)
+
+    def test_cierre_espera_el_lote_en_curso(self):
+        """Al salir, un lote a medio escribir en el hilo no se pierde: se guarda o se respalda"""
+        self.escritor.respaldo = os.path.join(tempfile.mkdtemp(), 'auditoria.jsonl')
+        with self.captureOnCommitCallbacks(execute=True):
+            auditar(self.mesero, 'Pedido #1')
+            auditar(self.mesero, 'Pedido #2')
+
+        escribiendo, soltar = threading.Event(), threading.Event()
+
+        def escritura_lenta(*args, **kwargs):
+            escribiendo.set()
+            soltar.wait(5)
+            raise OperationalError
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=escritura_lenta), \
+                self.assertLogs('usuarios.auditoria', 'ERROR'):
+            hilo = threading.Thread(target=self.escritor.vaciar)
+            hilo.start()
+            self.assertTrue(escribiendo.wait(5))
+            cierre = threading.Thread(target=self.escritor.cerrar)
+            cierre.start()
+            cierre.join(0.3)
+            self.assertTrue(cierre.is_alive())  # espera al bulk_create en curso
+            soltar.set()
+            hilo.join(5)
+            cierre.join(5)
+
+        with open(self.escritor.respaldo, encoding='utf-8') as archivo:
+            self.assertEqual([json.loads(linea)['action'] for linea in archivo], ['Pedido #1', 'Pedido #2'])
+
+    def test_modo_sincrono(self):
+        with self.settings(AUDITORIA_ASINCRONA=False):
+            auditar(self.mesero, 'Re-abrió para edición: Pedido #7')
+        self.assertTrue(AuditLog.objects.filter(action='Re-abrió para edición: Pedido #7').exists())
+
+
+class PresupuestoDashboardGerenteTest(PresupuestoConsultasMixin, TestCase):
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create_user(username='gerente_budget', email='gerente_budget@test.com', password='x', rol='gerente')
+        self.client.force_login(self.gerente)
+        self.sembrados = 0
+        self.sembrar(2)
+
+    def sembrar(self, cantidad):
+        """Meseros en línea con su log, productos y facturas del día."""
+        for _ in range(cantidad):
+            self.sembrados += 1
+            n = self.sembrados
+            mesero = Usuario.objects.create_user(username=f'mesero_{n}', email=f'mesero_{n}@test.com', password='x',
+                                                 rol='mesero', last_activity=timezone.now())
+            AuditLog.objects.create(user=mesero, action=f'Pedido #{n}')
+            producto = Producto.objects.create(nombre=f'Producto {n}', precio='2.00', stock=50)
+            pedido = Pedido.objects.create(mesero=mesero, estado='entregado')
+            DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=n)
+            pedido.refresh_from_db()
+            Factura.objects.create(pedido=pedido, subtotal=pedido.total, total=pedido.total,
+                                   razon_social='CONSUMIDOR FINAL', ruc_ci='9999999999999')
+
+    def test_dashboard_gerente(self):
+        self.comparar_consultas(11, self.sembrar, lambda: self.client.get(reverse('usuarios:dashboard_gerente')))
@@ -16,6 +16,7 @@ urlpatterns = [
     path('dashboard/gerente/reportes/', views.reportes_ventas, name='reportes_ventas'),
     path('dashboard/gerente/inventario/', views.gestion_inventario, name='gestion_inventario'),
     path('dashboard/gerente/agenda/', views.agenda_pedidos, name='agenda_pedidos'),
+    path('dashboard/gerente/consultas/', views.perfil_consultas, name='perfil_consultas'),
     path('dashboard/gerente/impresoras/', views.configuracion_impresoras, name='configuracion_impresoras'),
     path('dashboard/gerente/impresoras/<uuid:printer_id>/test_print/', views.impresora_test_print, name='impresora_test_print'),
     path('dashboard/gerente/impresoras/<uuid:printer_id>/test_drawer/', views.impresora_test_drawer, name='impresora_test_drawer'),
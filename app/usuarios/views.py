@@ -10,7 +10,11 @@ from django.db.models import Q, Sum, F
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone 
 from .models import Usuario, AuditLog
-from pedidos.models import Pedido, Mesa, Producto, Factura, DetallePedido
+from .actividad import anotar_actividad, umbral_en_linea, usuarios_en_linea
+from printer.rawbt import tomar_rawbt
+from pedidos.models import Pedido, Mesa, Producto, DetallePedido, VentaProductoDiaria
+from pedidos.services.ventas import productos_vendidos, ventas_por_dia
+from core.periodos import inicio_dia, periodo_dias
 from inventario.models import Insumo
 from caja.models import SesionCaja, Gasto
 from django.utils.dateparse import parse_date
@@ -83,7 +87,7 @@ def dashboard_mesero(request):
     if request.user.rol != 'mesero':
         return redirect('usuarios:login')
     mesas = Mesa.objects.all().order_by('numero')
-    rawbt_b64 = request.session.pop('rawbt_b64', None)
+    rawbt_b64 = tomar_rawbt(request)
     return render(request, 'usuarios/dashboard_mesero.html', {'mesas': mesas, 'rawbt_b64': rawbt_b64})
 
 # 4. DASHBOARD GERENTE (LA QUE FALTABA)
@@ -96,40 +100,35 @@ def dashboard_gerente(request):
     total_usuarios = Usuario.objects.count()
     
     # Usuarios ONLINE (Actividad en últimos 5 minutos)
-    hace_5_minutos = timezone.now() - timezone.timedelta(minutes=5)
-    usuarios_online = Usuario.objects.filter(last_activity__gte=hace_5_minutos).count()
+    usuarios_online = len(usuarios_en_linea())
     usuarios_activos = usuarios_online # Reemplazamos la variable para el template
     
-    # Ventas de HOY
+    # Ventas de HOY (resumen diario: se mantiene al crear / borrar facturas)
     hoy = timezone.localdate()
-    # Modificado: Usamos Factura.fecha_emision para sumar lo que realmente se facturó/cobró hoy
-    facturas_hoy = Factura.objects.filter(fecha_emision__date=hoy)
-    total_ventas_hoy = facturas_hoy.aggregate(Sum('total'))['total__sum'] or 0
     
     # Logs
     ultimos_logs = AuditLog.objects.select_related('user').order_by('-timestamp')[:10]
 
     # --- DATOS PARA GRÁFICOS ---
     
-    # 1. Ventas de la Semana (Últimos 7 días)
+    # 1. Ventas de la Semana (Últimos 7 días): una sola consulta a VentaDiaria
+    ventas_semana = ventas_por_dia(hoy - timezone.timedelta(days=6), hoy)
+    total_ventas_hoy, facturas_hoy_count = ventas_semana.get(hoy, (0, 0))
+
     fechas_grafico = []
     ventas_grafico = []
-    # hoy ya está definido arriba como timezone.localdate()
-    # hoy = timezone.now().date() <-- ELIMINADO
-    
     for i in range(6, -1, -1):
         fecha = hoy - timezone.timedelta(days=i)
-        # Filtramos facturas de ese día
-        venta_dia = Factura.objects.filter(fecha_emision__date=fecha).aggregate(Sum('total'))['total__sum'] or 0
+        venta_dia = ventas_semana.get(fecha, (0, 0))[0]
         
         # Formato fecha: "Lun 12"
         fechas_grafico.append(fecha.strftime("%d/%m")) 
         ventas_grafico.append(float(venta_dia))
 
-    top_productos_q = DetallePedido.objects.filter(pedido__estado='pagado') \
-        .values('producto__nombre') \
+    top_productos_q = list(VentaProductoDiaria.objects.values('producto__nombre') \
         .annotate(total_vendido=Sum('cantidad')) \
-        .order_by('-total_vendido')[:5]
+        .filter(total_vendido__gt=0) \
+        .order_by('-total_vendido')[:5])
 
     top_labels = [item['producto__nombre'] for item in top_productos_q]
     top_data = [item['total_vendido'] for item in top_productos_q]
@@ -139,7 +138,7 @@ def dashboard_gerente(request):
         'usuarios_activos': usuarios_activos,
         'total_ventas_hoy': total_ventas_hoy,
         'ultimos_logs': ultimos_logs,
-        'pedidos_completados_hoy': facturas_hoy.count(), # Corregido: Usamos facturas_hoy
+        'pedidos_completados_hoy': facturas_hoy_count,
         
         # Datos JSON para JS
         'fechas_grafico': fechas_grafico,
@@ -158,8 +157,10 @@ def lista_usuarios(request):
     if request.user.rol != 'gerente' and request.user.rol != 'admin':
         return redirect('usuarios:login')
         
-    usuarios = Usuario.objects.all().order_by('-last_activity')
-    time_threshold = timezone.now() - timezone.timedelta(minutes=5)
+    # last_activity al día con las marcas en caché (la base puede ir hasta un minuto atrás)
+    usuarios = anotar_actividad(Usuario.objects.all())
+    usuarios.sort(key=lambda u: u.last_activity or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), reverse=True)
+    time_threshold = umbral_en_linea()
 
     return render(request, 'usuarios/lista_usuarios.html', {
         'usuarios': usuarios,
@@ -226,49 +227,34 @@ def reportes_ventas(request):
             fecha_inicio = parse_date(fecha_inicio_str)
             fecha_fin = parse_date(fecha_fin_str)
             
-    # Query Base: Detalles de Pedidos Pagados
-    detalles = DetallePedido.objects.filter(pedido__estado='pagado')
-
-    # Aplicar Filtros de fechas en base a la factura asociada
     if sesion_filtrada:
-        # Si filtramos por turno (caja), usamos sus datetimes exactos
-        if sesion_filtrada.fecha_cierre:
-            detalles = detalles.filter(
-                pedido__factura__fecha_emision__gte=sesion_filtrada.fecha_apertura,
-                pedido__factura__fecha_emision__lte=sesion_filtrada.fecha_cierre
-            )
-        else:
-            # Caja aún abierta
-            detalles = detalles.filter(
-                pedido__factura__fecha_emision__gte=sesion_filtrada.fecha_apertura
-            )
-    elif fecha_inicio and fecha_fin:
-        detalles = detalles.filter(pedido__factura__fecha_emision__date__range=[fecha_inicio, fecha_fin])
-        
-    # Obtener el reporte resumido de Productos Vendidos
-    from django.db.models import F
-    reporte_productos = detalles.values('producto__nombre', 'precio_unitario').annotate(
-        cantidad_vendida=Sum('cantidad'),
-        total=Sum(F('cantidad') * F('precio_unitario'))
-    ).order_by('-cantidad_vendida')
+        # Si filtramos por turno (caja), usamos las facturas cobradas en ese turno
+        detalles = DetallePedido.objects.filter(
+            pedido__factura__sesion_caja=sesion_filtrada,
+            pedido__estado='pagado',
+        )
+        reporte_productos = detalles.values('producto__nombre', 'precio_unitario').annotate(
+            cantidad_vendida=Sum('cantidad'),
+            total=Sum(F('cantidad') * F('precio_unitario'))
+        ).order_by('-cantidad_vendida')
+    else:
+        # Por días (o todo el historial): resumen diario por producto
+        reporte_productos = productos_vendidos(fecha_inicio, fecha_fin)
     
     total_ingresos = sum([item['total'] for item in reporte_productos])
     
     # --- PROCESAR GASTOS (NUEVO) ---
     gastos_query = Gasto.objects.filter(modulo='restaurante')
     if sesion_filtrada:
-        if sesion_filtrada.fecha_cierre:
-            gastos_query = gastos_query.filter(fecha__gte=sesion_filtrada.fecha_apertura, fecha__lte=sesion_filtrada.fecha_cierre)
-        else:
-            gastos_query = gastos_query.filter(fecha__gte=sesion_filtrada.fecha_apertura)
+        gastos_query = gastos_query.filter(sesion_caja=sesion_filtrada)
     elif fecha_inicio and fecha_fin:
-        gastos_query = gastos_query.filter(fecha__date__range=[fecha_inicio, fecha_fin])
+        gastos_query = gastos_query.filter(periodo_dias(fecha_inicio, fecha_fin).filtro('fecha'))
     
     total_gastos = gastos_query.aggregate(Sum('monto'))['monto__sum'] or 0
     ganancia_neta = total_ingresos - total_gastos
     
     # Obtener las Cajas Recientes para el Sidebar (Solo de hoy y ayer)
-    cajas_recientes = SesionCaja.objects.filter(fecha_apertura__date__gte=ayer).order_by('-fecha_apertura')
+    cajas_recientes = SesionCaja.objects.filter(fecha_apertura__gte=inicio_dia(ayer)).order_by('-fecha_apertura')
 
     return render(request, 'usuarios/reportes.html', {
         'total_ingresos': total_ingresos,
@@ -430,6 +416,23 @@ def agenda_pedidos(request):
     return render(request, 'usuarios/agenda.html')
 
 
+@login_required
+def perfil_consultas(request):
+    """Reporte JSON del perfilador de consultas (core/perfilador.py); POST lo reinicia."""
+    if not es_gerente(request.user):
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    from django.conf import settings
+    from core.perfilador import reiniciar, reporte
+
+    if request.method == 'POST':
+        reiniciar()
+    return JsonResponse({
+        'activo': settings.PERFILADOR_CONSULTAS,
+        'muestreo': settings.PERFILADOR_MUESTREO,
+        'vistas': reporte(),
+    })
+
+
 # ============================================================================
 # CONFIGURACIÓN DE IMPRESORAS (Panel Gerente)
 # ============================================================================
@@ -522,9 +525,8 @@ def impresora_test_print(request, printer_id):
         job = printer.print_jobs.order_by('-created_at').first()
         if job:
             import base64
-            hex_commands = PrinterManager.generate_print_commands(job)
             try:
-                b64_cmds = base64.b64encode(bytes.fromhex(hex_commands)).decode('utf-8')
+                b64_cmds = base64.b64encode(job.escpos_bytes).decode('utf-8')
                 print("RAWBT BASE64:", b64_cmds)  # Añadido para debug
                 response_data['rawbt_b64'] = b64_cmds
             except Exception as e:
@@ -10,7 +10,25 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurante.settings')
 
-application = get_asgi_application()
+# Django debe inicializarse antes de importar consumers / modelos
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from pedidos.routing import websocket_urlpatterns  # noqa: E402
+from printer.routing import http_urlpatterns as printer_http_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    # El long-poll del agente de impresión espera sin ocupar el hilo de las vistas sync
+    'http': URLRouter(printer_http_urlpatterns + [re_path(r'', django_asgi_app)]),
+    # Pantallas de cocina en tiempo real (usa la sesión de Django para autenticar)
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    ),
+})
@@ -0,0 +1,18 @@
+"""
+Configuración de Celery para el proyecto restaurante.
+
+Las tareas en segundo plano (envío de facturas al SRI, etc.) se definen en el
+módulo ``tasks.py`` de cada app y se descubren automáticamente.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurante.settings')
+
+app = Celery('restaurante')
+
+# Lee todas las variables CELERY_* de settings.py
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'axes',
     'core',
     'usuarios',
@@ -65,6 +66,7 @@ INSTALLED_APPS = [
     'printer',
     'rest_framework',
     'rest_framework.authtoken',
+    'channels',
 ]
 
 REST_FRAMEWORK = {
@@ -77,6 +79,7 @@ REST_FRAMEWORK = {
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # <--- Para servir archivos estáticos en producción
+    'core.middleware.PerfiladorConsultasMiddleware', # Solo activo con PERFILADOR_CONSULTAS=True
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -105,6 +108,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'restaurante.wsgi.application'
+ASGI_APPLICATION = 'restaurante.asgi.application'
 
 # Axes para restrer y blockear el acceso
 AUTHENTICATION_BACKENDS = [
@@ -335,3 +339,121 @@ PRINTING_CONFIG = {
     'characters_per_line': 42,
     'paper_width_mm': 80,
 }
+
+# Configuración de impresión y ruteo a impresoras en memoria de cada proceso.
+# Se invalida al guardar Printer/PrinterSettings; los demás procesos lo notan
+# en este intervalo (segundos) al comparar la versión compartida en caché.
+PRINTER_CONFIG_CACHE_SECONDS = int(os.getenv('PRINTER_CONFIG_CACHE_SECONDS', '30'))
+
+# =============================
+# Tareas en segundo plano (Celery)
+# =============================
+# Sin broker configurado las tareas se ejecutan en el mismo proceso (modo eager),
+# igual que antes. En producción apuntar CELERY_BROKER_URL a Redis.
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', '')
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False' if CELERY_BROKER_URL else 'True') == 'True'
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TIMEZONE = TIME_ZONE
+
+CELERY_BEAT_SCHEDULE = {
+    # Reencola facturas que quedaron sin enviar (broker caído, reintentos agotados)
+    'reenviar-facturas-sri-pendientes': {
+        'task': 'pedidos.tasks.reenviar_facturas_pendientes',
+        'schedule': 600.0,
+    },
+}
+
+# Facturación electrónica SRI (Fronteratech)
+SRI_API_TIMEOUT = int(os.getenv('SRI_API_TIMEOUT', '20'))  # segundos por petición
+SRI_MAX_REINTENTOS = int(os.getenv('SRI_MAX_REINTENTOS', '8'))
+
+# =============================
+# Caché compartida (Redis)
+# =============================
+# Los workers de Gunicorn, Daphne y Celery comparten registro de agentes,
+# throttles y fragmentos cacheados. Sin REDIS_CACHE_URL (desarrollo / tests)
+# se usa memoria local del proceso.
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL', '')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'postor',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # Si Redis cae, la caché falla en silencio (se consulta la BD)
+                'IGNORE_EXCEPTIONS': True,
+            },
+        },
+    }
+    DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+
+# Sesiones en Redis: con SESSION_SAVE_EVERY_REQUEST cada request (incluidos los
+# polls HTMX) renueva los 15 min de inactividad con un SET en lugar de reescribir
+# una fila de django_session. Van en un Redis propio (REDIS_SESSION_URL, sin
+# expulsión por memoria) y sin IGNORE_EXCEPTIONS: la caché de arriba puede
+# perder claves o fallar en silencio, una sesión no (sería cerrar la sesión de
+# todos). Sin Redis de sesiones: cached_db (lecturas de la caché, la BD manda);
+# sin ningún Redis, solo la BD (la memoria local no se comparte entre workers).
+REDIS_SESSION_URL = os.getenv('REDIS_SESSION_URL', '')
+if REDIS_SESSION_URL:
+    CACHES['sesiones'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_SESSION_URL,
+        'KEY_PREFIX': 'postor',
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+    }
+    SESSION_CACHE_ALIAS = 'sesiones'
+    _SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+elif REDIS_CACHE_URL:
+    _SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    _SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', _SESSION_ENGINE)
+
+# Cada cuántos segundos como máximo se escribe Usuario.last_activity por usuario
+# (entre medio la actividad queda en la caché; ver usuarios/actividad.py)
+ACTIVIDAD_FLUSH_SEGUNDOS = int(os.getenv('ACTIVIDAD_FLUSH_SEGUNDOS', '60'))
+
+# Auditoría en lote (ver usuarios/auditoria.py): las entradas se escriben con
+# bulk_create cada AUDITORIA_FLUSH_SEGUNDOS o al juntar AUDITORIA_LOTE. Apagada
+# por defecto (se escribe en el momento); el runner de tests la fuerza a False.
+# Si la base no responde y la cola se llena, lo más viejo va a AUDITORIA_RESPALDO.
+AUDITORIA_ASINCRONA = os.getenv('AUDITORIA_ASINCRONA', 'False') == 'True'
+AUDITORIA_LOTE = int(os.getenv('AUDITORIA_LOTE', '100'))
+AUDITORIA_FLUSH_SEGUNDOS = float(os.getenv('AUDITORIA_FLUSH_SEGUNDOS', '2'))
+AUDITORIA_RESPALDO = os.getenv('AUDITORIA_RESPALDO', os.path.join(BASE_DIR, 'logs', 'auditoria_pendiente.jsonl'))
+TEST_RUNNER = 'core.pruebas.EjecutorPruebas'
+
+# Perfilador de consultas por vista (ver core/perfilador.py). Apagado por defecto;
+# PERFILADOR_MUESTREO es la fracción de requests medidos (0.1 = uno de cada diez)
+# y las consultas que superen PERFILADOR_LENTA_MS se registran en el log.
+PERFILADOR_CONSULTAS = os.getenv('PERFILADOR_CONSULTAS', 'False') == 'True'
+PERFILADOR_MUESTREO = float(os.getenv('PERFILADOR_MUESTREO', '0.1'))
+PERFILADOR_LENTA_MS = float(os.getenv('PERFILADOR_LENTA_MS', '200'))
+
+# =============================
+# WebSockets (Django Channels) — pantalla de cocina en vivo
+# =============================
+# Gunicorn (HTTP) y Daphne (WebSocket) corren en procesos distintos, así que en
+# producción la capa debe ser Redis. Sin CHANNEL_LAYER_URL se usa memoria local
+# (desarrollo con un solo proceso y tests).
+CHANNEL_LAYER_URL = os.getenv('CHANNEL_LAYER_URL', '')
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_LAYER_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }